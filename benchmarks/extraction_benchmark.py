@@ -0,0 +1,192 @@
+"""
+Extraction Latency Benchmark
+============================
+
+This script measures the cost of our own extraction code, separately from model
+latency, by running victim messages through update_victim_json,
+json_cleaner.process_json_response and upload_victim_info against the local
+mock model server of victim_tools.mock_llm_server.
+
+Key Features:
+    - Messages taken from datasets/health_check_descriptions.csv
+    - Compact and full prompt modes of update_victim_json
+    - Configurable mock latency, malformed JSON and server error rates
+    - Per-stage mean, p50 and p95 latency, and our overhead around the HTTP call
+    - Throughput and failure counts, appended to a JSONL file per run
+
+Dependencies:
+    - numpy / pandas: For statistics and result tables
+    - streamlit: Session state used by the victim tools (works outside streamlit run)
+    - victim_tools: Extraction code, JSON cleaner and mock server
+
+Notes:
+    The HTTP time is measured around the request made by the model router, so
+    update_victim_json overhead covers prompt building, routing, parsing and
+    merging. The LLM cache is cleared before every message unless --cache is set.
+
+Usage:
+    python -m benchmarks.extraction_benchmark --messages 200 --mode compact full
+    python -m benchmarks.extraction_benchmark --latency 0.3 --malformed-rate 0.1
+"""
+
+import argparse
+import copy
+import datetime
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from victim_tools import json_cleaner, vital_data
+from victim_tools.llm_utils import schema
+from victim_tools.mock_llm_server import MockLLM, start_server
+from victim_tools.model_router import Backend, ModelRouter
+from victim_tools.victim_schema import to_template
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), 'extraction_results.jsonl')
+MESSAGES_PATH = 'datasets/health_check_descriptions.csv'
+STAGES = ('http', 'update_victim_json', 'overhead', 'process_json_response', 'upload_victim_info')
+
+
+def load_messages(n_messages: int, path: str = MESSAGES_PATH) -> List[str]:
+    """Victim descriptions, repeated up to n_messages."""
+    descriptions = pd.read_csv(path)['description'].dropna().astype(str).tolist()
+    return [descriptions[i % len(descriptions)] for i in range(n_messages)]
+
+
+def run_mode(mode: str, messages: List[str], base_url: str, template: Dict, use_cache: bool = False) -> dict:
+    """
+    Runs every message through the extraction stages in one prompt mode.
+
+    Returns:
+        dict: Latency statistics per stage (ms), throughput and failure counts
+    """
+    http_times = []
+
+    def timed(message, **kwargs):
+        start = time.perf_counter()
+        try:
+            return vital_data.send_message(message, **kwargs)
+        finally:
+            http_times.append(time.perf_counter() - start)
+
+    vital_data.url = f"{base_url}/openai/v1/chat/completions"
+    vital_data.extraction_router = ModelRouter([
+        Backend('mock/groq', functools.partial(timed, model=vital_data.GROQ_MODEL), tasks=('update', 'extraction')),
+    ], max_attempts=1)
+
+    times = {stage: [] for stage in STAGES}
+    failures = {'update_victim_json': 0, 'process_json_response': 0}
+    start = time.perf_counter()
+    for message in messages:
+        if not use_cache:
+            vital_data.shared_cache.clear()
+        st.session_state['victim_info'] = copy.deepcopy(template)
+        st.session_state['json_template'] = template
+        http_before = len(http_times)
+
+        t0 = time.perf_counter()
+        updated = vital_data.update_victim_json(message, mode=mode)
+        t1 = time.perf_counter()
+        http = sum(http_times[http_before:])
+        times['http'].append(http)
+        times['update_victim_json'].append(t1 - t0)
+        times['overhead'].append(t1 - t0 - http)
+        if updated is None:
+            failures['update_victim_json'] += 1
+            continue
+
+        try:
+            t0 = time.perf_counter()
+            json_cleaner.process_json_response(updated, schema)
+            times['process_json_response'].append(time.perf_counter() - t0)
+        except Exception:
+            failures['process_json_response'] += 1
+            continue
+        t0 = time.perf_counter()
+        json_cleaner.upload_victim_info(updated, schema)
+        times['upload_victim_info'].append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    record = {'mode': mode, 'messages': len(messages), 'throughput_msg_s': len(messages) / elapsed}
+    for stage, values in times.items():
+        values = np.array(values) * 1000
+        record[f'{stage}_mean_ms'] = float(values.mean()) if len(values) else None
+        record[f'{stage}_p50_ms'] = float(np.percentile(values, 50)) if len(values) else None
+        record[f'{stage}_p95_ms'] = float(np.percentile(values, 95)) if len(values) else None
+    record.update({f'{stage}_failures': count for stage, count in failures.items()})
+    return record
+
+
+def run_benchmark(n_messages: int = 100, modes: List[str] = ('compact', 'full'), latency: float = 0.0,
+                  malformed_rate: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                  use_cache: bool = False, output: Optional[str] = DEFAULT_OUTPUT) -> pd.DataFrame:
+    """
+    Benchmarks the extraction stages against a fresh mock server.
+
+    Args:
+        n_messages (int): Messages per mode
+        modes (List[str]): update_victim_json prompt modes to run
+        latency (float): Mock model latency in seconds
+        malformed_rate (float): Share of mock answers with corrupted JSON
+        error_rate (float): Share of mock requests answered with HTTP 503
+        seed (int): Seed of the mock server
+        use_cache (bool): Keep the LLM cache between messages
+        output (str, optional): JSONL file the records are appended to
+
+    Returns:
+        pd.DataFrame: One row per mode
+    """
+    template = to_template()
+    messages = load_messages(n_messages)
+    run = {
+        'run_id': datetime.datetime.now().strftime('%Y%m%dT%H%M%S'),
+        'python': sys.version.split()[0],
+        'latency_s': latency,
+        'malformed_rate': malformed_rate,
+        'error_rate': error_rate,
+    }
+
+    server, base_url = start_server(MockLLM(latency, 0.0, malformed_rate, error_rate, seed=seed))
+    try:
+        records = [{**run, **run_mode(mode, messages, base_url, template, use_cache)} for mode in modes]
+    finally:
+        server.shutdown()
+
+    if output:
+        with open(output, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+    return pd.DataFrame(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark victim extraction stages against a mock model")
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--mode', nargs='+', choices=['compact', 'full'], default=['compact', 'full'])
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', action='store_true', help="Keep the LLM cache between messages")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    # Failures are counted, their log messages would drown the report
+    logging.getLogger('victim_tools').setLevel(logging.CRITICAL)
+    results = run_benchmark(args.messages, args.mode, args.latency, args.malformed_rate, args.error_rate,
+                            args.seed, args.cache, args.output)
+    columns = ['mode', 'throughput_msg_s'] + [f'{stage}_p50_ms' for stage in STAGES] + \
+              ['update_victim_json_failures', 'process_json_response_failures']
+    print(results[columns].T.to_string(header=False))
+
+
+if __name__ == '__main__':
+    main()
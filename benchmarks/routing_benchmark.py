@@ -0,0 +1,355 @@
+"""
+Routing Benchmark Suite
+=======================
+
+This script measures the speed and quality of the available routing strategies on
+reproducible synthetic victim sets inside San Francisco, against the local OSRM
+stand-in of rescue_tools.local_router, and appends the results to a JSONL file so
+runs can be compared over time.
+
+Key Features:
+    - Seeded victim sets of any size with a fixed risk level distribution
+    - Uniform and clustered (hotspot) layouts
+    - Strategies: single OSRM trip, cluster decomposition and the local solver
+    - Wall time, peak memory, tour length and priority-weighted lateness per run
+    - Comparison of the latest run with the previous one
+
+Dependencies:
+    - numpy / pandas: For scenario generation and result tables
+    - tracemalloc: For peak memory measurement
+    - rescue_tools: Routing strategies, local router and route scoring
+
+Notes:
+    Every strategy is scored with the same straight-line travel time estimate the
+    local router uses, so tour lengths and lateness are comparable across
+    strategies. The router runs in-process, so the time and memory of the OSRM
+    strategies include the routing work itself. Memory is measured in a separate
+    run from timing because tracemalloc slows allocation heavy code.
+
+Usage:
+    python -m benchmarks.routing_benchmark --sizes 10 100 1000 10000
+    python -m benchmarks.routing_benchmark --compare
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from rescue_tools import path_optimizer
+from rescue_tools.local_router import LocalRouter, start_server
+from rescue_tools.rescue_path_opt import (
+    DEFAULT_SPEED_KMH,
+    RISK_WINDOW_HOURS,
+    Coordinates,
+    Victim,
+    estimate_leg_travel_times,
+    solve_route,
+)
+from rescue_tools.route_scoring import priority_weights, route_from_geojson, score_route_legs
+
+SF_BOUNDS = {
+    'min_lat': 37.708,
+    'max_lat': 37.812,
+    'min_lon': -122.515,
+    'max_lon': -122.357,
+}
+# Share of victims per risk level (1 = most_urgent)
+RISK_DISTRIBUTION = {1: 0.10, 2: 0.15, 3: 0.25, 4: 0.30, 5: 0.20}
+# American Red Cross, first center of datasets/sf_rescue_dep.csv
+DEPOT = Coordinates(latitude=37.7749, longitude=-122.4194)
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+LAYOUTS = ['uniform', 'clustered']
+HOTSPOTS = 6
+HOTSPOT_SPREAD_DEG = 0.006
+DEFAULT_OUTPUT = os.path.join('benchmarks', 'routing_results.jsonl')
+
+
+@dataclass
+class Scenario:
+    """
+    A reproducible routing problem.
+
+    Attributes:
+        layout (str): 'uniform' or 'clustered'
+        seed (int): Seed the scenario was generated from
+        depot (Coordinates): Rescue center the tour starts from and returns to
+        victims (List[Victim]): Victims to visit
+    """
+    layout: str
+    seed: int
+    depot: Coordinates
+    victims: List[Victim]
+
+    @property
+    def coordinates(self) -> List[list]:
+        """[longitude, latitude] pairs of the victims, as expected by path_optimizer."""
+        return [[v.coordinates.longitude, v.coordinates.latitude] for v in self.victims]
+
+    @property
+    def deadlines(self) -> np.ndarray:
+        """Deadline of every victim in seconds after departure."""
+        return np.array([RISK_WINDOW_HOURS[v.risk_nb] * 3600.0 for v in self.victims])
+
+
+def generate_scenario(n_victims: int, seed: int = 0, layout: str = 'uniform') -> Scenario:
+    """
+    Generates victims inside the San Francisco bounds.
+
+    The same (n_victims, seed, layout) always yields the same victims, and
+    different sizes are drawn independently.
+
+    Args:
+        n_victims (int): Number of victims
+        seed (int): Random seed
+        layout (str): 'uniform' spreads victims over the city, 'clustered' draws
+            them around a few incident hotspots
+
+    Returns:
+        Scenario: Victims with risk levels drawn from RISK_DISTRIBUTION
+
+    Example:
+        >>> scenario = generate_scenario(100, seed=1)
+        >>> len(scenario.victims), scenario.victims[0].id
+        (100, 'victim_0')
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r}, expected one of {LAYOUTS}")
+    rng = np.random.default_rng([seed, n_victims, LAYOUTS.index(layout)])
+    low = np.array([SF_BOUNDS['min_lat'], SF_BOUNDS['min_lon']])
+    high = np.array([SF_BOUNDS['max_lat'], SF_BOUNDS['max_lon']])
+
+    if layout == 'uniform':
+        points = rng.uniform(low, high, size=(n_victims, 2))
+    else:
+        centers = rng.uniform(low, high, size=(HOTSPOTS, 2))
+        points = centers[rng.integers(HOTSPOTS, size=n_victims)]
+        points = np.clip(points + rng.normal(0.0, HOTSPOT_SPREAD_DEG, size=(n_victims, 2)), low, high)
+
+    levels = rng.choice(list(RISK_DISTRIBUTION), size=n_victims, p=list(RISK_DISTRIBUTION.values()))
+    victims = [
+        Victim(id=f'victim_{i}', coordinates=Coordinates(latitude=lat, longitude=lon), risk_nb=int(level))
+        for i, ((lat, lon), level) in enumerate(zip(points.tolist(), levels))
+    ]
+    return Scenario(layout, seed, DEPOT, victims)
+
+
+# ----------------------------------------------------------------------
+# Strategies: each returns the visiting order as victim indices, or None
+
+def osrm_trip(scenario: Scenario, base_url: str) -> Optional[np.ndarray]:
+    """Single OSRM Trip request for the whole victim set."""
+    route = path_optimizer.get_osrm_trip(
+        scenario.coordinates,
+        api_url=f'{base_url}/trip/v1/driving/',
+        rescue_center=[scenario.depot.longitude, scenario.depot.latitude],
+        max_waypoints=sys.maxsize
+    )
+    return None if route is None else route_from_geojson(route)
+
+
+def decomposed(scenario: Scenario, base_url: str) -> Optional[np.ndarray]:
+    """Cluster decomposition into OSRM sized sub-trips."""
+    route = path_optimizer.get_osrm_trip_decomposed(
+        scenario.coordinates,
+        api_url=f'{base_url}/trip/v1/driving/',
+        rescue_center=[scenario.depot.longitude, scenario.depot.latitude]
+    )
+    return None if route is None else route_from_geojson(route)
+
+
+def local_solver(scenario: Scenario, base_url: str) -> Optional[np.ndarray]:
+    """Nearest neighbour and 2-opt solver of rescue_path_opt, without a router."""
+    index = {victim.id: i for i, victim in enumerate(scenario.victims)}
+    return np.array([index[v.id] for v in solve_route(scenario.depot, scenario.victims)])
+
+
+STRATEGIES: Dict[str, Callable[[Scenario, str], Optional[np.ndarray]]] = {
+    'osrm_trip': osrm_trip,
+    'decomposed': decomposed,
+    'local_solver': local_solver,
+}
+
+
+def evaluate(scenario: Scenario, order: np.ndarray) -> dict:
+    """
+    Measures tour length and lateness of a visiting order.
+
+    Returns:
+        dict: tour_length_km, tour_duration_s, weighted_lateness, late_victims and max_lateness_s
+    """
+    order = np.asarray(order, dtype=np.intp)
+    if not np.array_equal(np.sort(order), np.arange(len(scenario.victims))):
+        raise ValueError("The route does not visit every victim exactly once")
+    points = [scenario.depot] + [scenario.victims[i].coordinates for i in order] + [scenario.depot]
+    legs = estimate_leg_travel_times(points)
+    scores = score_route_legs(order, legs, scenario.deadlines, priority_weights(scenario.victims))
+    return {
+        'tour_length_km': float(legs.sum() * DEFAULT_SPEED_KMH / 3600),
+        'tour_duration_s': float(scores.duration[0]),
+        'weighted_lateness': float(scores.weighted_lateness[0]),
+        'late_victims': int(scores.late_victims[0]),
+        'max_lateness_s': float(scores.max_lateness[0]),
+    }
+
+
+def run_case(name: str, scenario: Scenario, base_url: str,
+             repeat: int = 1, measure_memory: bool = True) -> dict:
+    """
+    Runs one strategy on one scenario.
+
+    Returns:
+        dict: status ('ok' or 'failed'), best wall time over repeat runs, peak
+        traced memory and the evaluate() metrics
+    """
+    strategy = STRATEGIES[name]
+    record = {'status': 'ok', 'wall_time_s': None, 'peak_memory_mb': None}
+
+    times = []
+    order = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        order = strategy(scenario, base_url)
+        times.append(time.perf_counter() - start)
+    if order is None:
+        record['status'] = 'failed'
+        return record
+    record['wall_time_s'] = min(times)
+
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            strategy(scenario, base_url)
+            record['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+
+    record.update(evaluate(scenario, order))
+    return record
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes: List[int] = DEFAULT_SIZES, layouts: List[str] = LAYOUTS,
+                  strategies: Optional[List[str]] = None, seed: int = 0, repeat: int = 1,
+                  measure_memory: bool = True, output: Optional[str] = DEFAULT_OUTPUT,
+                  max_trip_size: int = 1000, local_max: int = 1000) -> pd.DataFrame:
+    """
+    Runs every strategy on every scenario and appends the records to output.
+
+    Args:
+        sizes (List[int]): Victim counts to benchmark
+        layouts (List[str]): Scenario layouts
+        strategies (List[str], optional): Names from STRATEGIES, defaults to all
+        seed (int): Scenario seed
+        repeat (int): Timing runs per case, the fastest is recorded
+        measure_memory (bool): Whether to run each case once more under tracemalloc
+        output (str, optional): JSONL file the records are appended to
+        max_trip_size (int): Largest victim set sent as a single trip. Larger osrm_trip
+            cases are recorded as skipped, as a real OSRM deployment would reject them
+        local_max (int): Largest victim set given to the local solver
+
+    Returns:
+        pd.DataFrame: One row per case
+    """
+    strategies = strategies or list(STRATEGIES)
+    limits = {'osrm_trip': max_trip_size, 'local_solver': local_max}
+    run = {
+        'run_id': datetime.datetime.now().strftime('%Y%m%dT%H%M%S'),
+        'commit': _commit(),
+        'python': sys.version.split()[0],
+        'seed': seed,
+    }
+
+    server, base_url = start_server(LocalRouter(max_trip_size=max_trip_size + 1))
+    records = []
+    try:
+        for layout in layouts:
+            for n_victims in sizes:
+                scenario = generate_scenario(n_victims, seed, layout)
+                for name in strategies:
+                    case = {**run, 'strategy': name, 'layout': layout, 'n_victims': n_victims}
+                    if n_victims > limits.get(name, n_victims):
+                        record = {'status': 'skipped'}
+                    else:
+                        record = run_case(name, scenario, base_url, repeat, measure_memory)
+                    records.append({**case, **record})
+                    print(f"{layout:>9} {n_victims:>6} {name:<13} {record['status']:<7} "
+                          f"{record.get('wall_time_s') or 0:9.3f}s "
+                          f"lateness={record.get('weighted_lateness', float('nan')):.0f}")
+    finally:
+        server.shutdown()
+
+    if output:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+    return pd.DataFrame(records)
+
+
+def compare_runs(output: str = DEFAULT_OUTPUT) -> pd.DataFrame:
+    """
+    Compares the latest run recorded in output with the run before it.
+
+    Returns:
+        pd.DataFrame: Wall time and weighted lateness of both runs per case, with
+        their ratios (latest / previous)
+    """
+    results = pd.read_json(output, lines=True)
+    runs = sorted(results['run_id'].astype(str).unique())
+    if len(runs) < 2:
+        raise ValueError(f"{output} holds fewer than two runs")
+    keys = ['strategy', 'layout', 'n_victims']
+    columns = keys + ['wall_time_s', 'weighted_lateness']
+    previous = results[results['run_id'].astype(str) == runs[-2]][columns]
+    latest = results[results['run_id'].astype(str) == runs[-1]][columns]
+    merged = latest.merge(previous, on=keys, suffixes=('', '_previous'))
+    merged['time_ratio'] = merged['wall_time_s'] / merged['wall_time_s_previous']
+    merged['lateness_ratio'] = merged['weighted_lateness'] / merged['weighted_lateness_previous']
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark routing strategies on synthetic victim sets")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=LAYOUTS)
+    parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc run")
+    parser.add_argument('--max-trip-size', type=int, default=1000)
+    parser.add_argument('--local-max', type=int, default=1000)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', action='store_true',
+                        help="Compare the two latest runs in --output instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare_runs(args.output).to_string(index=False))
+        return
+
+    results = run_benchmark(args.sizes, args.layouts, args.strategies, args.seed, args.repeat,
+                            not args.no_memory, args.output, args.max_trip_size, args.local_max)
+    print(results[['layout', 'n_victims', 'strategy', 'status', 'wall_time_s', 'peak_memory_mb',
+                   'tour_length_km', 'weighted_lateness']].to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -18,6 +18,9 @@ from streamlit_keplergl import keplergl_static
 from keplergl import KeplerGl
 
 from rescue_tools import path_optimizer
+from rescue_tools import rescue_path_opt
+from rescue_tools import geometry
+from rescue_tools.center_planner import RoutePlanCache, dataset_version
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import db
@@ -94,6 +97,8 @@ if 'date_loaded' not in st.session_state:
 
 if "datasets" not in st.session_state:
     st.session_state.datasets = []
+if 'route_plans' not in st.session_state:
+    st.session_state['route_plans'] = RoutePlanCache()
 
 
 
@@ -533,6 +538,13 @@ if my_dataset is not None :
         )
     
     left__, mid__, right__  = st.columns([.3, .3, .3])
+    with right__:
+        # Routes and neighbourhoods are simplified to the precision visible at this zoom level
+        route_zoom = st.slider('Map Detail (zoom)', 6, 18, 12)
+        if st.toggle('Show Neighbourhoods', False):
+            map_1.add_data(
+                data=geometry.load_neighbourhoods('SF_neighbourhood.csv', route_zoom), name='sf_neighbourhoods'
+            )
     with left__:
         if st.toggle('Show Optimized Paths', False):
             rescue_centers = rescue[['longitude', 'latitude']].values.tolist()[0]
@@ -540,19 +552,47 @@ if my_dataset is not None :
             rescue_centers_coordinates = rescue[rescue['name'] == rescue_name][['longitude', 'latitude']].values.tolist()[0]
             #fleet_capacity = st.slider('Fleet Capacity', 1, 10, 5)
             synth_coord = synth_data[['longitude', 'latitude']]
+            auto_assign = st.toggle('Auto-assign Rescue Centers', False)
+            if auto_assign:
+                # Route only the victims assigned to the selected center
+                victims = rescue_path_opt.load_victim_data('datasets/health_check_descriptions.csv')
+                teams = rescue_path_opt.load_rescue_team_data('datasets/sf_rescue_dep.csv')
+                assignments = rescue_path_opt.assign_rescue_teams(
+                    victims, teams, rescue_path_opt.create_time_windows(victims)
+                )
+                st.dataframe(pd.DataFrame(
+                    [(team_id, len(victim_ids)) for team_id, victim_ids in assignments.items() if victim_ids],
+                    columns=['rescue_center', 'assigned_victims']
+                ))
+                synth_coord = synth_coord.loc[[int(victim_id) for victim_id in assignments[rescue_name]]]
             #actual_coords = parser.dropna(subset=['location.lat', 'location.lon'])[['location.lon', 'location.lat']].rename(columns={'location.lon': 'longitude', 'location.lat': 'latitude'})[-1:]
             #merged_dataset = pd.concat([synth_coord, actual_coords], axis=0)
 
             #st.dataframe(merged_dataset)
             # Plan the unweighted route
-            unweighted_route = path_optimizer.get_osrm_trip(
-                coordinates=synth_coord.values.tolist(),
-                weights=None,
-                rescue_center=rescue_centers_coordinates
-            )
+            if auto_assign:
+                unweighted_route = path_optimizer.get_osrm_trip(
+                    coordinates=synth_coord.values.tolist(),
+                    weights=None,
+                    rescue_center=rescue_centers_coordinates
+                )
+                route_key = dataset_version(rescue[rescue['name'] == rescue_name], synth_coord.values.tolist())
+            else:
+                # Routes of every center are computed once per dataset version,
+                # so switching centers reuses the cached trips
+                plans = st.session_state['route_plans'].get(
+                    rescue, synth_coord.values.tolist(), (synth_data['risk_nb'] >= 4).tolist()
+                )
+                st.write(f"Fastest to critical victims: {plans.fastest_center}")
+                st.dataframe(plans.ranking)
+                unweighted_route = plans.routes[rescue_name]
+                route_key = (plans.version, rescue_name)
             # Add the unweighted route to the map
-            map_1.add_data(unweighted_route, name='optimal_path')
-            base_config['config']['visState']['layers'].extend([layer for layer in itinerary_config['config']['visState']['layers']])
+            if unweighted_route is None:
+                st.warning(f"No route available for {rescue_name}, the routing service did not answer.")
+            else:
+                map_1.add_data(geometry.simplify_geojson(unweighted_route, route_zoom, key=route_key), name='optimal_path')
+                base_config['config']['visState']['layers'].extend([layer for layer in itinerary_config['config']['visState']['layers']])
 
     with mid__:
         if st.toggle('Dark Mode', True):
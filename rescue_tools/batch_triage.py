@@ -0,0 +1,415 @@
+"""
+Batch Triage of Free-Text Victim Reports
+========================================
+
+This module assigns a risk label to a backlog of free-text reports such as
+datasets/health_check_descriptions.csv. Several descriptions are packed into
+each LLM request with a structured JSON answer, and batches run concurrently
+under a request and token rate limiter.
+
+Key Features:
+    - Packing of descriptions into batches bounded by item count and prompt tokens
+    - Concurrent requests under a token bucket limiter (requests and tokens per minute)
+    - Structured JSON output validated against the known risk labels
+    - Retries with exponential backoff on rate limits and server errors
+    - JSONL checkpoint of every labelled report, so an interrupted run resumes
+    - risk and risk_nb columns written back to the CSV atomically
+
+Dependencies:
+    - requests: For the OpenAI compatible chat completions API
+    - pandas: For reading and writing report tables
+
+Notes:
+    Labels use the scale of health_check_descriptions.csv, where risk_nb 4 is
+    the most urgent (RISK_LABELS). Any OpenAI compatible endpoint works, e.g. Groq
+    through Helicone (the default, as in victim_tools.vital_data) or a local mock
+    server, via --url or the triage_api_url environment variable.
+
+Example:
+    >>> triage_file("datasets/health_check_descriptions.csv", output_path="triaged.csv")  # doctest: +SKIP
+    {'labelled': 36, 'skipped': 0, 'failed': 0, ...}
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import requests
+
+from victim_tools import json_repair
+from victim_tools.llm_metrics import shared_metrics
+
+logger = logging.getLogger(__name__)
+
+# risk_nb of every label, as in health_check_descriptions.csv
+RISK_LABELS = {
+    'most_urgent': 4,
+    'urgent': 3,
+    'less_urgent': 2,
+    'minor': 1,
+}
+
+DEFAULT_URL = os.getenv('triage_api_url', 'https://groq.helicone.ai/openai/v1/chat/completions')
+DEFAULT_MODEL = os.getenv('triage_model', 'llama-3.1-70b-versatile')
+
+# Requests are retried on these status codes
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+INSTRUCTIONS = (
+    "You triage messages sent by disaster victims. For every report, assign one risk label:\n"
+    "- most_urgent: life-threatening now (cannot breathe, heavy bleeding, unconscious, trapped and injured)\n"
+    "- urgent: serious injury or danger that will worsen without help soon\n"
+    "- less_urgent: injury or distress that can wait a few hours\n"
+    "- minor: no injury or only minor discomfort\n"
+    'Answer with a JSON object {"results": [{"id": <report id>, "risk": <label>}, ...]} '
+    "containing every report id exactly once."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (4 characters per token) used for batching and rate limiting."""
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """
+    Token bucket limiting requests and tokens per minute across threads.
+
+    Args:
+        requests_per_minute: Maximum request rate, None for no limit
+        tokens_per_minute: Maximum token rate, None for no limit
+
+    Example:
+        >>> limiter = RateLimiter(requests_per_minute=600)
+        >>> limiter.acquire(tokens=100)  # returns at once while the bucket is full
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self._available = [limit or 0.0 for limit in self.limits]
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> None:
+        """
+        Blocks until one request of the given number of tokens fits in both buckets.
+        Requests larger than the token bucket wait for a full bucket.
+        """
+        needed = (1.0, float(tokens))
+        while True:
+            with self._lock:
+                self._refill()
+                waits = [
+                    (min(need, limit) - available) * 60.0 / limit
+                    for need, limit, available in zip(needed, self.limits, self._available)
+                    if limit and available < min(need, limit)
+                ]
+                if not waits:
+                    for i, (need, limit) in enumerate(zip(needed, self.limits)):
+                        if limit:
+                            self._available[i] -= need
+                    return
+            time.sleep(max(waits))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        for i, limit in enumerate(self.limits):
+            if limit:
+                self._available[i] = min(limit, self._available[i] + elapsed * limit / 60.0)
+
+
+def pack_batches(reports: Iterable[Tuple[str, str]], max_items: int = 20,
+                 max_tokens: int = 2000) -> List[List[Tuple[str, str]]]:
+    """
+    Packs (id, description) pairs into batches of at most max_items reports and
+    about max_tokens prompt tokens. A report longer than max_tokens gets its own batch.
+
+    Example:
+        >>> [len(batch) for batch in pack_batches([(str(i), "x" * 40) for i in range(5)], max_items=2)]
+        [2, 2, 1]
+    """
+    batches, batch, size = [], [], 0
+    for report in reports:
+        tokens = estimate_tokens(report[1]) + 8
+        if batch and (len(batch) >= max_items or size + tokens > max_tokens):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(report)
+        size += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_prompt(batch: List[Tuple[str, str]]) -> str:
+    """Lists the reports of a batch with their ids."""
+    return "\n".join(json.dumps({"id": report_id, "report": text}, ensure_ascii=False)
+                     for report_id, text in batch)
+
+
+def parse_labels(content: str, batch: List[Tuple[str, str]]) -> Dict[str, str]:
+    """
+    Reads the labels of a batch from a model answer.
+
+    Unknown ids and labels are ignored, so the reports without a valid label are
+    those missing from the result.
+
+    Example:
+        >>> parse_labels('{"results": [{"id": "3", "risk": "Urgent"}, {"id": "9", "risk": "minor"}]}',
+        ...              [("3", "..."), ("4", "...")])
+        {'3': 'urgent'}
+    """
+    try:
+        # Partial: labels of a reply cut by max_tokens are kept, the rest is retried
+        data = json_repair.loads(content, partial=True)
+    except json_repair.JSONRepairError:
+        return {}
+    results = data.get('results', []) if isinstance(data, dict) else data
+    ids = {report_id for report_id, _ in batch}
+    labels = {}
+    for item in results if isinstance(results, list) else []:
+        if not isinstance(item, dict):
+            continue
+        report_id = str(item.get('id'))
+        risk = str(item.get('risk', '')).strip().lower().replace(' ', '_')
+        if report_id in ids and risk in RISK_LABELS:
+            labels[report_id] = risk
+    return labels
+
+
+class TriageClient:
+    """
+    Sends batches to an OpenAI compatible chat completions endpoint.
+
+    Args:
+        url: Chat completions URL
+        model: Model name
+        headers: Request headers, defaults to the Helicone/Groq headers for the
+            default URL and a bearer token from triage_api_key otherwise
+        limiter: Shared rate limiter
+        max_retries: Attempts per batch on rate limits, server and network errors
+        timeout: Seconds per request
+    """
+
+    def __init__(self, url: str = DEFAULT_URL, model: str = DEFAULT_MODEL,
+                 headers: Optional[Dict[str, str]] = None, limiter: Optional[RateLimiter] = None,
+                 max_retries: int = 4, timeout: float = 60.0):
+        self.url = url
+        self.model = model
+        self.headers = headers if headers is not None else default_headers(url)
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def classify(self, batch: List[Tuple[str, str]]) -> Dict[str, str]:
+        """
+        Labels a batch of (id, description) pairs.
+
+        Returns:
+            Dict[str, str]: Risk label by report id, for the reports the model labelled
+        """
+        prompt = build_prompt(batch)
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": INSTRUCTIONS},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0,
+            "max_tokens": 24 * len(batch) + 32,
+            "response_format": {"type": "json_object"},
+            "stream": False,
+        }
+        tokens = estimate_tokens(INSTRUCTIONS + prompt) + data["max_tokens"]
+        with shared_metrics.track('triage', self.model, 'triage', prompt=INSTRUCTIONS + prompt) as call:
+            for attempt in range(self.max_retries):
+                self.limiter.acquire(tokens)
+                try:
+                    response = self._session.post(self.url, headers=self.headers, json=data, timeout=self.timeout)
+                    if response.status_code in RETRY_STATUS:
+                        raise requests.exceptions.HTTPError(f"{response.status_code} from {self.url}")
+                    response.raise_for_status()
+                    body = response.json()
+                    call.set_response_usage(body)
+                    return parse_labels(body['choices'][0]['message']['content'], batch)
+                except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                    if attempt == self.max_retries - 1:
+                        raise
+                    call.retry()
+                    delay = 2 ** attempt
+                    logger.warning(f"Triage request failed ({e}), retrying in {delay}s")
+                    time.sleep(delay)
+        return {}
+
+
+def default_headers(url: str) -> Dict[str, str]:
+    """Helicone/Groq headers for the Helicone gateway, bearer token headers otherwise."""
+    if 'helicone' in url:
+        return {
+            'Content-Type': 'application/json',
+            'Authorization': f"Bearer {os.getenv('groq_api')}",
+            'Helicone-Auth': f"Bearer {os.getenv('helicone_api')}",
+            'Helicone-Target-URL': 'https://api.groq.com',
+        }
+    headers = {'Content-Type': 'application/json'}
+    if os.getenv('triage_api_key'):
+        headers['Authorization'] = f"Bearer {os.getenv('triage_api_key')}"
+    return headers
+
+
+class Checkpoint:
+    """
+    Append-only JSONL record of labelled reports.
+
+    Every line holds {"id", "risk", "risk_nb"}. Lines are flushed as soon as a
+    batch completes, so a run interrupted at any point loses at most the
+    batches in flight.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.labels: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # last line of an interrupted write
+                    self.labels[str(entry['id'])] = entry['risk']
+
+    def record(self, labels: Dict[str, str]) -> None:
+        with self._lock:
+            with open(self.path, 'a') as f:
+                for report_id, risk in labels.items():
+                    f.write(json.dumps({"id": report_id, "risk": risk, "risk_nb": RISK_LABELS[risk]}) + "\n")
+            self.labels.update(labels)
+
+
+def triage_reports(reports: List[Tuple[str, str]], client: TriageClient, checkpoint: Checkpoint,
+                   batch_size: int = 20, max_batch_tokens: int = 2000, concurrency: int = 4) -> Dict[str, int]:
+    """
+    Labels every report not in the checkpoint yet.
+
+    Reports the model leaves out of its answer are retried once in a batch of
+    their own size; those still unlabelled are counted as failed.
+
+    Args:
+        reports: (id, description) pairs
+        client: Client used for the requests
+        checkpoint: Checkpoint receiving the labels
+        batch_size: Maximum reports per request
+        max_batch_tokens: Approximate maximum prompt tokens per request
+        concurrency: Number of requests in flight
+
+    Returns:
+        Dict[str, int]: Counts of labelled, skipped (already checkpointed) and failed reports
+    """
+    pending = [(report_id, text) for report_id, text in reports if report_id not in checkpoint.labels]
+    stats = {'labelled': 0, 'skipped': len(reports) - len(pending), 'failed': 0}
+
+    def run(batches: List[List[Tuple[str, str]]]) -> List[Tuple[str, str]]:
+        missing = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(client.classify, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    labels = future.result()
+                except Exception as e:
+                    logger.error(f"Batch of {len(batch)} reports failed: {e}")
+                    labels = {}
+                checkpoint.record(labels)
+                stats['labelled'] += len(labels)
+                missing.extend(report for report in batch if report[0] not in labels)
+        return missing
+
+    missing = run(pack_batches(pending, batch_size, max_batch_tokens))
+    if missing:
+        logger.info(f"Retrying {len(missing)} unlabelled reports")
+        missing = run(pack_batches(missing, max(1, batch_size // 4), max_batch_tokens))
+    stats['failed'] = len(missing)
+    return stats
+
+
+def triage_file(input_path: str, output_path: Optional[str] = None, checkpoint_path: Optional[str] = None,
+                text_column: str = 'description', only_missing: bool = False,
+                client: Optional[TriageClient] = None, **options) -> Dict[str, int]:
+    """
+    Labels the reports of a CSV file and writes risk and risk_nb columns back.
+
+    Args:
+        input_path: CSV with one report per row
+        output_path: CSV to write, defaults to input_path
+        checkpoint_path: JSONL checkpoint, defaults to <output_path>.triage.jsonl
+        text_column: Column holding the report text
+        only_missing: Only label rows without a risk label yet
+        client: Client used for the requests, defaults to TriageClient()
+        **options: batch_size, max_batch_tokens and concurrency for triage_reports
+
+    Returns:
+        Dict[str, int]: Counts of labelled, skipped and failed reports, and the
+        elapsed time in seconds
+    """
+    start = time.perf_counter()
+    output_path = output_path or input_path
+    checkpoint = Checkpoint(checkpoint_path or f"{output_path}.triage.jsonl")
+    data = pd.read_csv(input_path)
+    ids = data['id'].astype(str) if 'id' in data.columns else data.index.astype(str)
+
+    rows = data[text_column].notna()
+    if only_missing and 'risk' in data.columns:
+        rows &= ~data['risk'].isin(list(RISK_LABELS))
+    reports = list(zip(ids[rows], data.loc[rows, text_column].astype(str)))
+    stats = triage_reports(reports, client or TriageClient(), checkpoint, **options)
+
+    labels = ids.map(checkpoint.labels)
+    labelled = rows & labels.notna()
+    if 'risk' not in data.columns:
+        data['risk'] = None
+    data.loc[labelled, 'risk'] = labels[labelled]
+    data['risk_nb'] = data['risk'].map(RISK_LABELS).astype('Int64')
+
+    temporary = f"{output_path}.tmp"
+    data.to_csv(temporary, index=False)
+    os.replace(temporary, output_path)
+    stats['elapsed_s'] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Label free-text victim reports with risk levels")
+    parser.add_argument("input", help="CSV file with a description column")
+    parser.add_argument("--output", help="CSV file to write, defaults to the input file")
+    parser.add_argument("--checkpoint", help="JSONL checkpoint, defaults to <output>.triage.jsonl")
+    parser.add_argument("--text-column", default="description")
+    parser.add_argument("--only-missing", action="store_true", help="Skip rows that already have a risk label")
+    parser.add_argument("--url", default=DEFAULT_URL, help="OpenAI compatible chat completions URL")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--max-batch-tokens", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=30, help="Requests per minute")
+    parser.add_argument("--tpm", type=float, default=6000, help="Tokens per minute")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    client = TriageClient(args.url, args.model, limiter=RateLimiter(args.rpm, args.tpm))
+    stats = triage_file(args.input, args.output, args.checkpoint, args.text_column, args.only_missing,
+                        client, batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens,
+                        concurrency=args.concurrency)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Concurrent Route Planning for All Rescue Centers
+===============================================
+
+This module computes the optimized trip of every rescue center at once, so the
+dashboard can switch between centers instantly and show which center reaches the
+critical victims fastest.
+
+Key Features:
+    - asyncio based planning with a cap on concurrent OSRM requests
+    - Results cached per dataset version (victim locations and rescue centers)
+    - Ranking of centers by time needed to reach every critical victim
+
+Dependencies:
+    - asyncio: For concurrent planning
+    - pandas: For center data and rankings
+    - path_optimizer: For OSRM trips
+    - route_scoring / rescue_path_opt: For arrival time estimates
+
+Notes:
+    Arrival times along a trip are estimated from straight-line travel times and
+    scaled so that the whole tour matches the duration OSRM reported for it.
+"""
+
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from rescue_tools import path_optimizer
+from rescue_tools.rescue_path_opt import Coordinates, estimate_travel_time_matrix
+from rescue_tools.route_scoring import route_from_geojson, score_routes
+
+
+@dataclass
+class CenterPlans:
+    """
+    Trips of every rescue center for one dataset version.
+
+    Attributes:
+        version (str): Dataset version the plans were computed for
+        routes (Dict[str, dict]): Trip GeoJSON per center name (None if the request failed)
+        ranking (pd.DataFrame): Centers sorted by time to reach all critical victims
+    """
+    version: str
+    routes: Dict[str, Optional[dict]] = field(default_factory=dict)
+    ranking: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    @property
+    def fastest_center(self) -> Optional[str]:
+        """Center reaching the critical victims first, if any trip succeeded."""
+        reachable = self.ranking.dropna(subset=['critical_reached_s'])
+        return None if reachable.empty else reachable.iloc[0]['center']
+
+
+def dataset_version(centers: pd.DataFrame, coordinates: list, critical: Optional[list] = None) -> str:
+    """
+    Stable fingerprint of the planning inputs.
+
+    Args:
+        centers (pd.DataFrame): Rescue centers with name, longitude and latitude columns
+        coordinates (list): [longitude, latitude] pairs of the victims
+        critical (list, optional): Critical flag per victim
+
+    Returns:
+        str: Hex digest changing whenever any input changes
+    """
+    payload = {
+        'centers': centers[['name', 'longitude', 'latitude']].values.tolist(),
+        'victims': [[float(lon), float(lat)] for lon, lat in coordinates],
+        'critical': [bool(flag) for flag in critical] if critical is not None else None,
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def plan_center_routes(centers: pd.DataFrame, coordinates: list,
+                             max_concurrency: int = 4,
+                             api_url: str = "http://router.project-osrm.org/trip/v1/driving/") -> Dict[str, Optional[dict]]:
+    """
+    Requests the trip of every center concurrently.
+
+    Args:
+        centers (pd.DataFrame): Rescue centers with name, longitude and latitude columns
+        coordinates (list): [longitude, latitude] pairs of the victims
+        max_concurrency (int): Maximum number of trips requested at the same time
+        api_url (str): OSRM API endpoint URL
+
+    Returns:
+        Dict[str, Optional[dict]]: Trip GeoJSON per center name
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def plan(center: list) -> Optional[dict]:
+        async with semaphore:
+            # get_osrm_trip inserts the rescue center into its input list
+            return await asyncio.to_thread(
+                path_optimizer.get_osrm_trip,
+                [list(coordinate) for coordinate in coordinates],
+                None,
+                api_url,
+                list(center)
+            )
+
+    names = centers['name'].tolist()
+    results = await asyncio.gather(
+        *(plan(center) for center in centers[['longitude', 'latitude']].values.tolist()),
+        return_exceptions=True
+    )
+    return {name: (None if isinstance(result, BaseException) else result)
+            for name, result in zip(names, results)}
+
+
+def rank_centers(centers: pd.DataFrame, coordinates: list, routes: Dict[str, Optional[dict]],
+                 critical: Optional[list] = None) -> pd.DataFrame:
+    """
+    Ranks centers by how fast their trip reaches every critical victim.
+
+    Args:
+        centers (pd.DataFrame): Rescue centers with name, longitude and latitude columns
+        coordinates (list): [longitude, latitude] pairs of the victims
+        routes (Dict[str, Optional[dict]]): Trip GeoJSON per center name
+        critical (list, optional): Critical flag per victim, defaults to all victims
+
+    Returns:
+        pd.DataFrame: center, duration_s, distance_m, critical_reached_s (arrival at the
+        last critical victim) and critical_mean_s, fastest center first
+    """
+    critical = np.ones(len(coordinates), dtype=bool) if critical is None else np.asarray(critical, dtype=bool)
+    victims = [Coordinates(latitude=lat, longitude=lon) for lon, lat in coordinates]
+    rows = []
+    for name, lon, lat in centers[['name', 'longitude', 'latitude']].values.tolist():
+        route = routes.get(name)
+        row = {'center': name, 'duration_s': np.nan, 'distance_m': np.nan,
+               'critical_reached_s': np.nan, 'critical_mean_s': np.nan}
+        if route is not None:
+            properties = route['features'][0]['properties']
+            durations = estimate_travel_time_matrix([Coordinates(latitude=lat, longitude=lon)] + victims)
+            scores = score_routes(route_from_geojson(route), durations, np.full(len(victims), np.inf))
+            scale = properties['duration'] / scores.duration[0] if scores.duration[0] > 0 else 1.0
+            arrival = scores.arrival[0] * scale
+            row.update(duration_s=properties['duration'], distance_m=properties['distance'])
+            if critical.any():
+                row.update(critical_reached_s=arrival[critical].max(),
+                           critical_mean_s=arrival[critical].mean())
+        rows.append(row)
+    return pd.DataFrame(rows).sort_values(['critical_reached_s', 'duration_s']).reset_index(drop=True)
+
+
+class RoutePlanCache:
+    """
+    Keeps the plans of the most recent dataset versions.
+
+    Example:
+        >>> cache = RoutePlanCache()
+        >>> plans = cache.get(centers, coordinates, critical)  # doctest: +SKIP
+        >>> plans.routes[plans.fastest_center]  # doctest: +SKIP
+    """
+
+    def __init__(self, max_versions: int = 4, max_concurrency: int = 4,
+                 api_url: str = "http://router.project-osrm.org/trip/v1/driving/"):
+        self.max_versions = max_versions
+        self.max_concurrency = max_concurrency
+        self.api_url = api_url
+        self._plans: "OrderedDict[str, CenterPlans]" = OrderedDict()
+
+    def get(self, centers: pd.DataFrame, coordinates: list,
+            critical: Optional[list] = None) -> CenterPlans:
+        """
+        Returns the plans for the given inputs, computing them on the first request.
+        Centers whose trip request failed are planned again on the next request.
+        """
+        version = dataset_version(centers, coordinates, critical)
+        if version in self._plans:
+            self._plans.move_to_end(version)
+            plans = self._plans[version]
+            failed = [name for name, route in plans.routes.items() if route is None]
+            if failed:
+                plans.routes.update(asyncio.run(plan_center_routes(
+                    centers[centers['name'].isin(failed)], coordinates, self.max_concurrency, self.api_url)))
+                plans.ranking = rank_centers(centers, coordinates, plans.routes, critical)
+            return plans
+
+        routes = asyncio.run(plan_center_routes(centers, coordinates,
+                                                self.max_concurrency, self.api_url))
+        plans = CenterPlans(version, routes, rank_centers(centers, coordinates, routes, critical))
+        self._plans[version] = plans
+        while len(self._plans) > self.max_versions:
+            self._plans.popitem(last=False)
+        return plans
@@ -14,7 +14,6 @@ Key Features:
 
 Dependencies:
     - firebase_admin: For Firebase operations
-    - json: For JSON data handling
     - datetime: For timestamp management
     - os: For file operations
 
@@ -25,10 +24,11 @@ Configuration:
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import db
-import json
 import os
 import datetime
 
+from victim_tools.victim_schema import to_template
+
 # Get current timestamp
 time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -148,6 +148,25 @@ def update_(victim_id: str, json_data: dict) -> None:
             'low_priority'
         )
 
-# Load JSON template for victim data
-with open('configs/victim_json_template_flat.json', 'r') as f:
-    json_template = json.load(f)
+def patch_(victim_id: str, updates: dict) -> None:
+    """
+    Updates only the given fields of a victim in the database.
+    
+    Args:
+        victim_id (str): Unique identifier for the victim
+        updates (dict): Values by slash-separated path, None to delete a field
+            (see victim_tools.victim_merge.to_update_paths)
+        
+    Example:
+        >>> patch_("victim123", {"victim_info/personal_info/age": 34})
+    """
+    ref = db.reference(f'rescue_team_dataset/', 
+                      app=firebase_admin.get_app(name='RescueTeam_RealTimeDatabase'))
+    # Multi-path update: fields not listed are left untouched
+    ref.child(victim_id).update({
+        **updates,
+        'last_updated': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+# Blank victim data template, generated from the victim schema
+json_template = to_template()
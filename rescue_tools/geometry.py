@@ -0,0 +1,355 @@
+"""
+Geometry Simplification for Map Layers
+=====================================
+
+This module reduces the size of route and neighbourhood geometries before they are
+sent to Kepler. Lines and polygons are simplified to a tolerance derived from the
+map zoom level, coordinates are quantized to the precision that tolerance needs,
+and results are cached per zoom band.
+
+Key Features:
+    - Douglas-Peucker and Visvalingam-Whyatt line simplification
+    - Coordinate quantization with removal of repeated points
+    - GeoJSON (LineString, MultiLineString, Polygon, MultiPolygon) support
+    - WKT MULTIPOLYGON parsing and writing for SF_neighbourhood.csv
+    - Zoom band based tolerances with a bounded result cache, keyed by dataset
+      version or route id when the caller has one
+
+Dependencies:
+    - numpy: For vectorized distance and area computations
+    - pandas: For neighbourhood CSV handling
+
+Notes:
+    Tolerances are half a screen pixel at the lower zoom of each band, so the
+    simplified geometry differs from the original by less than one pixel on screen.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Zoom levels are grouped in bands of this width for caching
+ZOOM_BAND_WIDTH = 2
+MAX_ZOOM = 20
+
+_cache: "OrderedDict[tuple, object]" = OrderedDict()
+CACHE_SIZE = 256
+
+
+def zoom_band(zoom: float) -> int:
+    """
+    Lowest zoom level of the band containing zoom.
+    """
+    zoom = min(max(int(zoom), 0), MAX_ZOOM)
+    return zoom - zoom % ZOOM_BAND_WIDTH
+
+
+def tolerance_for_zoom(zoom: float) -> float:
+    """
+    Simplification tolerance in degrees for a web mercator zoom level.
+
+    Args:
+        zoom (float): Map zoom level
+
+    Returns:
+        float: Half the width of a 256 px tile pixel at the band's lowest zoom, in degrees
+    """
+    return 0.5 * 360.0 / (256 * 2 ** zoom_band(zoom))
+
+
+def precision_for_tolerance(tolerance: float) -> int:
+    """
+    Number of decimals needed so that rounding error stays below a tenth of the tolerance.
+    """
+    return max(0, min(7, math.ceil(-math.log10(tolerance / 10))))
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplifies a polyline with the Douglas-Peucker algorithm.
+
+    Args:
+        points (np.ndarray): (n, 2) coordinates
+        tolerance (float): Maximum distance between the original and simplified line
+
+    Returns:
+        np.ndarray: Retained coordinates, first and last point always kept
+
+    Example:
+        >>> douglas_peucker(np.array([[0, 0], [1, 0.01], [2, 0]]), 0.1).tolist()
+        [[0.0, 0.0], [2.0, 0.0]]
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        inner = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.extend([(start, split), (split, end)])
+    return points[keep]
+
+
+def visvalingam(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplifies a polyline with the Visvalingam-Whyatt algorithm.
+
+    Points are removed in order of the smallest triangle they form with their
+    neighbours until every remaining triangle exceeds tolerance squared / 2.
+
+    Args:
+        points (np.ndarray): (n, 2) coordinates
+        tolerance (float): Linear tolerance, converted to an area threshold
+
+    Returns:
+        np.ndarray: Retained coordinates, first and last point always kept
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n < 3:
+        return points
+    min_area = tolerance * tolerance / 2
+
+    def area(i: int, j: int, k: int) -> float:
+        (x1, y1), (x2, y2), (x3, y3) = points[i], points[j], points[k]
+        return abs((x2 - x1) * (y3 - y1) - (x3 - x1) * (y2 - y1)) / 2
+
+    previous = list(range(-1, n - 1))
+    following = list(range(1, n + 1))
+    areas = [math.inf] * n
+    heap = []
+    for i in range(1, n - 1):
+        areas[i] = area(i - 1, i, i + 1)
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+
+    removed = np.zeros(n, dtype=bool)
+    while heap:
+        value, i = heapq.heappop(heap)
+        if removed[i] or value != areas[i]:
+            continue
+        if value >= min_area:
+            break
+        removed[i] = True
+        before, after = previous[i], following[i]
+        following[before], previous[after] = after, before
+        # Neighbours never get a smaller area than the point just removed
+        for j in (before, after):
+            if 0 < j < n - 1:
+                areas[j] = max(area(previous[j], j, following[j]), value)
+                heapq.heappush(heap, (areas[j], j))
+    return points[~removed]
+
+
+def quantize(points: np.ndarray, decimals: int) -> np.ndarray:
+    """
+    Rounds coordinates and drops points repeated after rounding.
+    """
+    points = np.round(np.asarray(points, dtype=float), decimals)
+    if len(points) < 2:
+        return points
+    changed = np.r_[True, np.any(points[1:] != points[:-1], axis=1)]
+    return points[changed]
+
+
+SIMPLIFIERS = {
+    'douglas_peucker': douglas_peucker,
+    'visvalingam': visvalingam,
+}
+
+
+def simplify_line(points, tolerance: float, method: str = 'douglas_peucker') -> list:
+    """
+    Simplifies and quantizes an open line.
+
+    Returns:
+        list: [longitude, latitude] pairs
+    """
+    simplified = SIMPLIFIERS[method](np.asarray(points, dtype=float), tolerance)
+    return quantize(simplified, precision_for_tolerance(tolerance)).tolist()
+
+
+def simplify_ring(points, tolerance: float, method: str = 'douglas_peucker') -> list:
+    """
+    Simplifies and quantizes a closed polygon ring, keeping it valid (at least 4 points).
+
+    Returns:
+        list: [longitude, latitude] pairs, first point repeated at the end
+    """
+    points = np.asarray(points, dtype=float)
+    simplified = quantize(SIMPLIFIERS[method](points, tolerance), precision_for_tolerance(tolerance))
+    if len(simplified) < 4:
+        simplified = quantize(points, precision_for_tolerance(tolerance))
+    if len(simplified) and np.any(simplified[0] != simplified[-1]):
+        simplified = np.vstack([simplified, simplified[:1]])
+    return simplified.tolist()
+
+
+def simplify_geometry(geometry: dict, tolerance: float, method: str = 'douglas_peucker') -> dict:
+    """
+    Simplifies a GeoJSON geometry. Point geometries are returned unchanged.
+    """
+    kind = geometry.get('type')
+    coordinates = geometry.get('coordinates')
+    if kind == 'LineString':
+        coordinates = simplify_line(coordinates, tolerance, method)
+    elif kind == 'MultiLineString':
+        coordinates = [simplify_line(line, tolerance, method) for line in coordinates]
+    elif kind == 'Polygon':
+        coordinates = [simplify_ring(ring, tolerance, method) for ring in coordinates]
+    elif kind == 'MultiPolygon':
+        coordinates = [[simplify_ring(ring, tolerance, method) for ring in polygon]
+                       for polygon in coordinates]
+    else:
+        return geometry
+    return {**geometry, 'coordinates': coordinates}
+
+
+def simplify_geojson(geojson: dict, zoom: float, method: str = 'douglas_peucker',
+                     key: Optional[Hashable] = None) -> dict:
+    """
+    Simplifies every feature of a GeoJSON FeatureCollection for a zoom level.
+
+    Results are cached per zoom band, so repeated renders of the same route reuse
+    the reduced geometry.
+
+    Args:
+        geojson (dict): FeatureCollection, e.g. the output of path_optimizer.get_osrm_trip
+        zoom (float): Map zoom level the layer is displayed at
+        method (str): 'douglas_peucker' or 'visvalingam'
+        key (Hashable, optional): Identifies the geometry in the cache, e.g. a dataset
+            version and route id; without it the GeoJSON is hashed on every call
+
+    Returns:
+        dict: FeatureCollection with simplified geometries and unchanged properties
+    """
+    if geojson is None:
+        return None
+    key = ('geojson', key if key is not None else _fingerprint(geojson), zoom_band(zoom), method)
+    if key not in _cache:
+        tolerance = tolerance_for_zoom(zoom)
+        _remember(key, {
+            **geojson,
+            'features': [
+                {**feature, 'geometry': simplify_geometry(feature['geometry'], tolerance, method)}
+                for feature in geojson['features']
+            ]
+        })
+    _cache.move_to_end(key)
+    return _cache[key]
+
+
+def parse_wkt_multipolygon(wkt: str) -> List[List[np.ndarray]]:
+    """
+    Parses a WKT MULTIPOLYGON (or POLYGON) into polygons of coordinate rings.
+
+    Returns:
+        List[List[np.ndarray]]: For each polygon, its rings as (n, 2) arrays
+    """
+    body = wkt[wkt.index('('):].strip()
+    if wkt.lstrip().upper().startswith('MULTIPOLYGON'):
+        body = body[1:-1].strip()
+    polygons = []
+    for polygon in re.split(r'\)\s*\)\s*,\s*\(\s*\(', body[2:-2]):
+        polygons.append([
+            np.array(ring.replace(',', ' ').split(), dtype=float).reshape(-1, 2)
+            for ring in re.split(r'\)\s*,\s*\(', polygon)
+        ])
+    return polygons
+
+
+def to_wkt_multipolygon(polygons: List[List[list]]) -> str:
+    """
+    Writes polygons of coordinate rings as a WKT MULTIPOLYGON.
+    """
+    return 'MULTIPOLYGON (' + ', '.join(
+        '(' + ', '.join(
+            '(' + ', '.join(f'{x!r} {y!r}' for x, y in ring) + ')'
+            for ring in polygon
+        ) + ')'
+        for polygon in polygons
+    ) + ')'
+
+
+def simplify_wkt(wkt: str, zoom: float, method: str = 'douglas_peucker') -> str:
+    """
+    Simplifies a WKT MULTIPOLYGON for a zoom level, with per-band caching.
+    """
+    key = ('wkt', hashlib.sha1(wkt.encode()).hexdigest(), zoom_band(zoom), method)
+    if key not in _cache:
+        tolerance = tolerance_for_zoom(zoom)
+        _remember(key, to_wkt_multipolygon([
+            [simplify_ring(ring, tolerance, method) for ring in polygon]
+            for polygon in parse_wkt_multipolygon(wkt)
+        ]))
+    _cache.move_to_end(key)
+    return _cache[key]
+
+
+def simplify_neighbourhoods(data: pd.DataFrame, zoom: float, column: str = 'the_geom',
+                            method: str = 'douglas_peucker', key: Optional[Hashable] = None) -> pd.DataFrame:
+    """
+    Simplifies the WKT geometries of a neighbourhood table such as SF_neighbourhood.csv.
+
+    Args:
+        key (Hashable, optional): Identifies the table in the cache, e.g. its file
+            version; without it every geometry is hashed on every call
+
+    Returns:
+        pd.DataFrame: Copy of data with the geometry column simplified
+    """
+    if key is not None:
+        key = ('neighbourhoods', key, column, zoom_band(zoom), method)
+        if key not in _cache:
+            _remember(key, simplify_neighbourhoods(data, zoom, column, method))
+        _cache.move_to_end(key)
+        return _cache[key]
+    simplified = data.copy()
+    simplified[column] = [simplify_wkt(wkt, zoom, method) for wkt in data[column]]
+    return simplified
+
+
+def load_neighbourhoods(path: str = 'SF_neighbourhood.csv', zoom: float = 12,
+                        method: str = 'douglas_peucker') -> pd.DataFrame:
+    """
+    Reads and simplifies a neighbourhood table, keyed in the cache by the file's
+    path and modification time so reruns neither re-read nor re-hash it.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if ('table', key) not in _cache:
+        _remember(('table', key), pd.read_csv(path))
+    _cache.move_to_end(('table', key))
+    return simplify_neighbourhoods(_cache[('table', key)], zoom, method=method, key=key)
+
+
+def _fingerprint(geojson: dict) -> str:
+    return hashlib.sha1(json.dumps(geojson, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _remember(key: tuple, value) -> None:
+    _cache[key] = value
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
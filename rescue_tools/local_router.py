@@ -0,0 +1,330 @@
+"""
+Local Stand-in for the OSRM Routing Service
+==========================================
+
+This module serves the subset of the OSRM HTTP API used by the rescue tools
+(Trip and Table services) from straight-line travel time estimates, so routing
+code can be benchmarked and developed without the public OSRM server.
+
+Key Features:
+    - OSRM compatible /trip and /table responses
+    - Round trips and open trips with fixed source and destination
+    - Nearest-neighbour construction with vectorized 2-opt improvement
+    - Configurable request size limits and simulated network latency
+    - Threaded HTTP server that can run in the background of a script
+
+Dependencies:
+    - numpy: For travel time matrices and tour improvement
+    - http.server: For serving requests
+    - rescue_path_opt: For Haversine based travel time estimates
+
+Notes:
+    Distances are great circle distances multiplied by ROAD_DETOUR_FACTOR and
+    durations assume DEFAULT_SPEED_KMH, so results are comparable with the local
+    solver in rescue_path_opt. Geometries are straight lines between waypoints.
+
+Example:
+    >>> server, url = start_server()  # doctest: +SKIP
+    >>> path_optimizer.get_osrm_trip(coordinates, api_url=f"{url}/trip/v1/driving/")  # doctest: +SKIP
+    >>> server.shutdown()  # doctest: +SKIP
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from rescue_tools.rescue_path_opt import (
+    DEFAULT_SPEED_KMH,
+    Coordinates,
+    estimate_travel_time_matrix,
+)
+
+# Defaults of osrm-routed (--max-trip-size and --max-table-size)
+MAX_TRIP_SIZE = 100
+MAX_TABLE_SIZE = 100
+
+
+class RoutingError(Exception):
+    """Request rejected with an OSRM error code."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class LocalRouter:
+    """
+    Computes OSRM style Trip and Table responses.
+
+    Attributes:
+        speed_kmh (float): Average driving speed used for durations
+        max_trip_size (int): Largest number of coordinates accepted by trip()
+        max_table_size (int): Largest number of coordinates accepted by table()
+        max_passes (int): Maximum number of 2-opt improvement passes per trip
+
+    Example:
+        >>> router = LocalRouter()
+        >>> trip = router.trip([[-122.42, 37.77], [-122.40, 37.79], [-122.41, 37.78]])
+        >>> [w["waypoint_index"] for w in trip["waypoints"]]
+        [0, 2, 1]
+    """
+
+    def __init__(self, speed_kmh: float = DEFAULT_SPEED_KMH,
+                 max_trip_size: int = MAX_TRIP_SIZE,
+                 max_table_size: int = MAX_TABLE_SIZE,
+                 max_passes: int = 10):
+        self.speed_kmh = speed_kmh
+        self.max_trip_size = max_trip_size
+        self.max_table_size = max_table_size
+        self.max_passes = max_passes
+
+    def durations(self, coordinates: List[list]) -> np.ndarray:
+        """
+        Travel times in seconds between every pair of [longitude, latitude] pairs.
+        """
+        return estimate_travel_time_matrix(
+            [Coordinates(latitude=lat, longitude=lon) for lon, lat in coordinates],
+            self.speed_kmh
+        )
+
+    def trip(self, coordinates: List[list], roundtrip: bool = True,
+             source: str = "any", destination: str = "any") -> dict:
+        """
+        Solves a trip the way the OSRM Trip service does.
+
+        Args:
+            coordinates (List[list]): [longitude, latitude] pairs
+            roundtrip (bool): Whether the trip returns to its first stop
+            source (str): 'first' or 'any'. The first coordinate always starts the
+                trip, which is a valid answer for both
+            destination (str): 'last' to end an open trip at the last coordinate
+
+        Returns:
+            dict: OSRM Trip response with one trip and the input waypoints
+
+        Raises:
+            RoutingError: If there are too many or too few coordinates
+        """
+        n = len(coordinates)
+        if n > self.max_trip_size:
+            raise RoutingError("TooBig", "Number of entries is too large")
+        if n < 2:
+            raise RoutingError("InvalidValue", "At least two coordinates are required")
+        if not roundtrip and (source != "first" or destination != "last"):
+            raise RoutingError("NotImplemented", "Open trips need source=first and destination=last")
+
+        durations = self.durations(coordinates)
+        tour = _nearest_neighbour(durations, fixed_end=not roundtrip)
+        if roundtrip:
+            tour = np.append(tour, 0)
+        tour = _two_opt(tour, durations, self.max_passes)
+        stops = tour[:-1] if roundtrip else tour
+
+        legs = durations[tour[:-1], tour[1:]]
+        duration = float(legs.sum())
+        distance = duration * self.speed_kmh / 3.6
+        waypoint_index = np.empty(n, dtype=int)
+        waypoint_index[stops] = np.arange(n)
+        return {
+            "code": "Ok",
+            "trips": [{
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [list(coordinates[i]) for i in tour]
+                },
+                "legs": [{"duration": float(leg), "distance": float(leg) * self.speed_kmh / 3.6}
+                         for leg in legs],
+                "distance": distance,
+                "duration": duration,
+                "weight": duration,
+                "weight_name": "duration"
+            }],
+            "waypoints": [
+                {"location": list(coordinates[i]), "name": "", "distance": 0.0,
+                 "trips_index": 0, "waypoint_index": int(waypoint_index[i])}
+                for i in range(n)
+            ]
+        }
+
+    def table(self, coordinates: List[list], sources: Optional[List[int]] = None,
+              destinations: Optional[List[int]] = None) -> dict:
+        """
+        Computes a travel time and distance table like the OSRM Table service.
+
+        Args:
+            coordinates (List[list]): [longitude, latitude] pairs
+            sources (List[int], optional): Indices of the row coordinates, defaults to all
+            destinations (List[int], optional): Indices of the column coordinates, defaults to all
+
+        Returns:
+            dict: OSRM Table response with durations (s) and distances (m)
+        """
+        if len(coordinates) > self.max_table_size:
+            raise RoutingError("TooBig", "Number of entries is too large")
+        sources = list(range(len(coordinates))) if sources is None else sources
+        destinations = list(range(len(coordinates))) if destinations is None else destinations
+        if any(not 0 <= i < len(coordinates) for i in list(sources) + list(destinations)):
+            raise RoutingError("InvalidOptions", "Source or destination index out of range")
+
+        durations = self.durations(coordinates)[np.ix_(sources, destinations)]
+        return {
+            "code": "Ok",
+            "durations": durations.tolist(),
+            "distances": (durations * self.speed_kmh / 3.6).tolist(),
+            "sources": [{"location": list(coordinates[i]), "name": "", "distance": 0.0} for i in sources],
+            "destinations": [{"location": list(coordinates[i]), "name": "", "distance": 0.0}
+                             for i in destinations]
+        }
+
+
+def _nearest_neighbour(durations: np.ndarray, fixed_end: bool = False) -> np.ndarray:
+    """
+    Nearest-neighbour order starting at 0, optionally ending at the last index.
+    """
+    n = len(durations)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    if fixed_end:
+        visited[-1] = True
+    tour = [0]
+    for _ in range(n - 1 - int(fixed_end)):
+        distances = np.where(visited, np.inf, durations[tour[-1]])
+        nearest = int(np.argmin(distances))
+        visited[nearest] = True
+        tour.append(nearest)
+    if fixed_end:
+        tour.append(n - 1)
+    return np.array(tour)
+
+
+def _two_opt(tour: np.ndarray, durations: np.ndarray, max_passes: int) -> np.ndarray:
+    """
+    Improves a path with 2-opt moves, keeping its first and last node in place.
+
+    For each segment start, every segment end is evaluated at once and the best
+    improving reversal is applied.
+    """
+    tour = tour.copy()
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(tour) - 2):
+            a, b = tour[i - 1], tour[i]
+            c, d = tour[i + 1:-1], tour[i + 2:]
+            gain = durations[a, b] + durations[c, d] - durations[a, c] - durations[b, d]
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                j = i + 1 + best
+                tour[i:j + 1] = tour[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return tour
+
+
+def _parse_coordinates(path: str) -> List[list]:
+    return [[float(value) for value in pair.split(",")] for pair in path.split(";") if pair]
+
+
+def _parse_indices(value: Optional[str]) -> Optional[List[int]]:
+    if value is None or value == "all":
+        return None
+    return [int(i) for i in value.split(";")]
+
+
+def make_handler(router: LocalRouter, latency: float = 0.0) -> type:
+    """
+    Builds an HTTP request handler serving /trip/v1/<profile>/ and /table/v1/<profile>/.
+
+    Args:
+        router (LocalRouter): Router answering the requests
+        latency (float): Seconds to wait before answering, to emulate a remote server
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            url = urlsplit(self.path)
+            parts = url.path.strip("/").split("/")
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                if len(parts) != 4 or parts[1] != "v1":
+                    raise RoutingError("InvalidUrl", f"URL string malformed: {url.path}")
+                coordinates = _parse_coordinates(parts[3])
+                if parts[0] == "trip":
+                    body = router.trip(coordinates,
+                                       roundtrip=query.get("roundtrip", "true") == "true",
+                                       source=query.get("source", "any"),
+                                       destination=query.get("destination", "any"))
+                elif parts[0] == "table":
+                    body = router.table(coordinates,
+                                        sources=_parse_indices(query.get("sources")),
+                                        destinations=_parse_indices(query.get("destinations")))
+                else:
+                    raise RoutingError("InvalidService", f"Service {parts[0]} not found!")
+                status = 200
+            except RoutingError as error:
+                body, status = {"code": error.code, "message": error.message}, 400
+            except ValueError as error:
+                body, status = {"code": "InvalidQuery", "message": str(error)}, 400
+
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(router: Optional[LocalRouter] = None, host: str = "127.0.0.1",
+                 port: int = 0, latency: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serves a router from a background thread.
+
+    Args:
+        router (LocalRouter, optional): Router to serve, defaults to LocalRouter()
+        host (str): Interface to bind
+        port (int): Port to bind, 0 picks a free port
+        latency (float): Simulated network latency per request in seconds
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The running server (call shutdown() to stop
+        it) and its base URL, e.g. http://127.0.0.1:5000
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(router or LocalRouter(), latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the OSRM Trip and Table API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--max-trip-size", type=int, default=MAX_TRIP_SIZE)
+    parser.add_argument("--max-table-size", type=int, default=MAX_TABLE_SIZE)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    args = parser.parse_args()
+
+    router = LocalRouter(max_trip_size=args.max_trip_size, max_table_size=args.max_table_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(router, args.latency))
+    print(f"Serving OSRM stand-in on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
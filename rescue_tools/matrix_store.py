@@ -0,0 +1,350 @@
+"""
+Persistent Travel Time Matrix Store
+==================================
+
+This module keeps the travel time matrix between victims and rescue teams on
+disk and extends it incrementally. When locations are added only the missing
+rows and columns are requested from the router, and rescued victims are evicted
+so their slots can be reused.
+
+Key Features:
+    - Matrix keyed by stable location IDs (victim and rescue team IDs)
+    - Compact float32 storage in a memory-mapped file with a JSON index
+    - Incremental extension: O(new x total) router work instead of O(total^2)
+    - Refresh of locations whose coordinates changed
+    - Eviction with slot reuse, capacity growth by doubling and compaction
+    - Pluggable fetchers: OSRM Table API (chunked) or straight-line estimates
+
+Dependencies:
+    - numpy: For the memory-mapped matrix
+    - path_optimizer: For OSRM Table requests
+    - rescue_path_opt: For straight-line travel time estimates
+
+Notes:
+    The matrix lives in <path>.f32 and the ID to slot index in <path>.json. Both
+    are rewritten on flush(), which also runs after every add() and evict(), so a
+    store reopened from the same path resumes without any router requests.
+"""
+
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from rescue_tools import path_optimizer
+from rescue_tools.rescue_path_opt import DEFAULT_SPEED_KMH, Coordinates, estimate_travel_time_matrix
+
+# Travel times between sources and destinations, both given as [longitude, latitude] pairs
+Fetcher = Callable[[List[list], List[list]], np.ndarray]
+
+INITIAL_CAPACITY = 64
+# Coordinates closer than this (in degrees) are treated as the same location
+COORDINATE_TOLERANCE = 1e-6
+
+
+def estimate_fetcher(speed_kmh: float = DEFAULT_SPEED_KMH) -> Fetcher:
+    """
+    Builds a fetcher from the straight-line travel time estimate, for use without a router.
+    """
+    def fetch(sources: List[list], destinations: List[list]) -> np.ndarray:
+        return estimate_travel_time_matrix(
+            [Coordinates(latitude=lat, longitude=lon) for lon, lat in sources],
+            speed_kmh,
+            [Coordinates(latitude=lat, longitude=lon) for lon, lat in destinations]
+        )
+
+    return fetch
+
+
+def osrm_fetcher(api_url: str = "http://router.project-osrm.org/table/v1/driving/",
+                 max_table_size: int = 100) -> Fetcher:
+    """
+    Builds a fetcher backed by the OSRM Table API.
+
+    Requests are split into blocks so that no request holds more than
+    max_table_size coordinates, the default limit of osrm-routed.
+
+    Args:
+        api_url (str, optional): OSRM Table API endpoint URL, or the one of
+            local_router for offline use
+        max_table_size (int, optional): Coordinate limit of a single request
+
+    Returns:
+        Callable: Fetcher raising RuntimeError if any request fails
+    """
+    if max_table_size < 2:
+        raise ValueError("max_table_size must allow one source and one destination")
+    block = max_table_size // 2
+
+    def fetch(sources: List[list], destinations: List[list]) -> np.ndarray:
+        durations = np.empty((len(sources), len(destinations)))
+        for row in range(0, len(sources), block):
+            row_block = sources[row:row + block]
+            for column in range(0, len(destinations), block):
+                column_block = destinations[column:column + block]
+                table = path_optimizer.get_osrm_table(
+                    row_block + column_block,
+                    sources=list(range(len(row_block))),
+                    destinations=list(range(len(row_block), len(row_block) + len(column_block))),
+                    api_url=api_url
+                )
+                if table is None:
+                    raise RuntimeError("OSRM table request failed")
+                durations[row:row + len(row_block), column:column + len(column_block)] = table
+        return durations
+
+    return fetch
+
+
+class TravelTimeMatrixStore:
+    """
+    Disk-backed travel time matrix that grows with the set of locations.
+
+    Attributes:
+        path (str): File prefix of the matrix (<path>.f32) and its index (<path>.json)
+        fetch (Fetcher): Source of travel times for new locations
+        fetched_cells (int): Number of matrix cells requested from fetch so far
+
+    Example:
+        >>> import tempfile
+        >>> store = TravelTimeMatrixStore(os.path.join(tempfile.mkdtemp(), "sf_matrix"))
+        >>> store.add({"team_1": [-122.42, 37.77], "victim_1": [-122.41, 37.78]})
+        2
+        >>> store.add({"victim_2": [-122.40, 37.79]})  # only 5 new cells are fetched
+        1
+        >>> store.matrix(["team_1", "victim_2"]).shape
+        (2, 2)
+        >>> store.evict(["victim_1"])
+        1
+    """
+
+    def __init__(self, path: str, fetch: Optional[Fetcher] = None,
+                 initial_capacity: int = INITIAL_CAPACITY):
+        self.path = path
+        self.fetch = fetch or estimate_fetcher()
+        self.fetched_cells = 0
+        self._lock = threading.RLock()
+
+        self._slots: Dict[str, int] = {}
+        self._coordinates: Dict[str, List[float]] = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                index = json.load(f)
+            capacity = index["capacity"]
+            self._slots = {key: int(slot) for key, slot in index["slots"].items()}
+            self._coordinates = index["coordinates"]
+            self._data = np.memmap(self._matrix_path, dtype=np.float32, mode="r+",
+                                   shape=(capacity, capacity))
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._data = self._allocate(self._matrix_path, max(1, initial_capacity))
+        used = set(self._slots.values())
+        self._free = sorted(set(range(self.capacity)) - used, reverse=True)
+
+    @property
+    def _matrix_path(self) -> str:
+        return f"{self.path}.f32"
+
+    @property
+    def _index_path(self) -> str:
+        return f"{self.path}.json"
+
+    @property
+    def capacity(self) -> int:
+        """Number of locations the current file can hold."""
+        return self._data.shape[0]
+
+    @property
+    def ids(self) -> List[str]:
+        """IDs of the stored locations."""
+        return list(self._slots)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, location_id: str) -> bool:
+        return location_id in self._slots
+
+    # ------------------------------------------------------------------
+    # Updates
+
+    def add(self, locations: Dict[str, list]) -> int:
+        """
+        Adds locations, fetching only the rows and columns that are missing.
+
+        Locations already stored with the same coordinates are skipped. Locations
+        whose coordinates changed are refreshed.
+
+        Args:
+            locations (Dict[str, list]): [longitude, latitude] per location ID
+
+        Returns:
+            int: Number of locations whose travel times were fetched
+        """
+        with self._lock:
+            new_ids = [key for key, coordinate in locations.items() if self._changed(key, coordinate)]
+            if not new_ids:
+                return 0
+
+            refreshed = set(new_ids)
+            existing_ids = [key for key in self._slots if key not in refreshed]
+            self._reserve(len(new_ids) - sum(key in self._slots for key in new_ids))
+            for key in new_ids:
+                if key not in self._slots:
+                    self._slots[key] = self._free.pop()
+                self._coordinates[key] = [float(value) for value in locations[key]]
+
+            new_slots = np.array([self._slots[key] for key in new_ids])
+            existing_slots = np.array([self._slots[key] for key in existing_ids], dtype=int)
+            new_coordinates = [self._coordinates[key] for key in new_ids]
+            existing_coordinates = [self._coordinates[key] for key in existing_ids]
+
+            # Rows of the new locations to every location, then the columns of the
+            # new locations from the existing ones
+            all_slots = np.concatenate((existing_slots, new_slots))
+            rows = self.fetch(new_coordinates, existing_coordinates + new_coordinates)
+            self._data[np.ix_(new_slots, all_slots)] = rows
+            self.fetched_cells += rows.size
+            if len(existing_ids):
+                columns = self.fetch(existing_coordinates, new_coordinates)
+                self._data[np.ix_(existing_slots, new_slots)] = columns
+                self.fetched_cells += columns.size
+
+            self.flush()
+            return len(new_ids)
+
+    def evict(self, location_ids: Iterable[str]) -> int:
+        """
+        Removes locations, e.g. rescued victims. Their slots are reused by later additions.
+
+        Returns:
+            int: Number of locations removed
+        """
+        with self._lock:
+            removed = 0
+            for key in location_ids:
+                slot = self._slots.pop(key, None)
+                if slot is None:
+                    continue
+                self._coordinates.pop(key, None)
+                self._free.append(slot)
+                removed += 1
+            if removed:
+                self.flush()
+            return removed
+
+    def compact(self) -> None:
+        """
+        Rewrites the file with the stored locations in consecutive slots and the
+        smallest power of two capacity that holds them.
+        """
+        with self._lock:
+            capacity = max(INITIAL_CAPACITY, 1 << max(0, len(self._slots) - 1).bit_length())
+            keys = list(self._slots)
+            self._resize(capacity, np.array([self._slots[key] for key in keys], dtype=int))
+            self._slots = {key: slot for slot, key in enumerate(keys)}
+            self._free = list(range(capacity - 1, len(keys) - 1, -1))
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the matrix and its index to disk."""
+        with self._lock:
+            self._data.flush()
+            temporary = f"{self._index_path}.tmp"
+            with open(temporary, "w") as f:
+                json.dump({"capacity": self.capacity, "slots": self._slots,
+                           "coordinates": self._coordinates}, f)
+            os.replace(temporary, self._index_path)
+
+    # ------------------------------------------------------------------
+    # Queries
+
+    def get(self, origin: str, destination: str) -> float:
+        """Travel time in seconds from one stored location to another."""
+        return float(self._data[self._slots[origin], self._slots[destination]])
+
+    def matrix(self, origins: List[str], destinations: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Travel times between stored locations, in the order of the given IDs.
+
+        Args:
+            origins (List[str]): Row location IDs
+            destinations (List[str], optional): Column location IDs. Defaults to origins
+
+        Returns:
+            np.ndarray: float32 (origins, destinations) travel times in seconds
+
+        Raises:
+            KeyError: If an ID is not stored
+        """
+        destinations = origins if destinations is None else destinations
+        rows = np.array([self._slots[key] for key in origins], dtype=int)
+        columns = np.array([self._slots[key] for key in destinations], dtype=int)
+        return np.asarray(self._data[np.ix_(rows, columns)])
+
+    # ------------------------------------------------------------------
+    # Storage
+
+    def _changed(self, location_id: str, coordinate: list) -> bool:
+        stored = self._coordinates.get(location_id)
+        if location_id not in self._slots or stored is None:
+            return True
+        return any(abs(float(a) - b) > COORDINATE_TOLERANCE for a, b in zip(coordinate, stored))
+
+    def _reserve(self, count: int) -> None:
+        if count <= len(self._free):
+            return
+        capacity = self.capacity
+        while capacity - len(self._slots) < count:
+            capacity *= 2
+        self._resize(capacity, np.arange(self.capacity))
+        self._free = sorted(set(range(capacity)) - set(self._slots.values()), reverse=True)
+
+    def _resize(self, capacity: int, keep: np.ndarray) -> None:
+        """Copies the given slots into the first rows and columns of a new file."""
+        temporary = f"{self._matrix_path}.tmp"
+        resized = self._allocate(temporary, capacity)
+        for start in range(0, len(keep), 1024):
+            block = keep[start:start + 1024]
+            resized[start:start + len(block), :len(keep)] = self._data[np.ix_(block, keep)]
+        resized.flush()
+        del self._data
+        os.replace(temporary, self._matrix_path)
+        self._data = np.memmap(self._matrix_path, dtype=np.float32, mode="r+",
+                               shape=(capacity, capacity))
+
+    @staticmethod
+    def _allocate(path: str, capacity: int) -> np.memmap:
+        return np.memmap(path, dtype=np.float32, mode="w+", shape=(capacity, capacity))
+
+
+def store_for_victims(path: str, victims: Iterable, rescue_teams: Iterable = (),
+                      fetch: Optional[Fetcher] = None) -> Tuple[TravelTimeMatrixStore, List[str]]:
+    """
+    Opens a store and brings it up to date with victim and rescue team locations.
+
+    Victims no longer in the list are evicted, so the store follows the current
+    set of unrescued victims. Rescue teams are kept.
+
+    Args:
+        path (str): File prefix of the store
+        victims (Iterable[Victim]): Current victims (rescue_path_opt.Victim)
+        rescue_teams (Iterable[RescueTeam]): Rescue teams (rescue_path_opt.RescueTeam)
+        fetch (Fetcher, optional): Source of travel times, defaults to estimates
+
+    Returns:
+        Tuple[TravelTimeMatrixStore, List[str]]: The store and the IDs of
+        rescue teams followed by victims, in input order
+    """
+    store = TravelTimeMatrixStore(path, fetch)
+    victims = list(victims)
+    rescue_teams = list(rescue_teams)
+    locations = {f"team:{team.id}": [team.coordinates.longitude, team.coordinates.latitude]
+                 for team in rescue_teams}
+    locations.update({f"victim:{victim.id}": [victim.coordinates.longitude, victim.coordinates.latitude]
+                      for victim in victims})
+    store.evict([key for key in store.ids if key.startswith("victim:") and key not in locations])
+    store.add(locations)
+    return store, list(locations)
@@ -7,14 +7,16 @@ It specializes in calculating optimal routes while considering emergency priorit
 
 Key Features:
     - Emergency level weighting system
-    - Integration with OSRM Trip API
+    - Integration with OSRM Trip and Table APIs
     - Support for rescue center-based routing
     - GeoJSON route generation
     - Priority-based path optimization
+    - Cluster decomposition for victim sets beyond OSRM waypoint limits
 
 Dependencies:
     - requests: For API communication
     - pandas: For data handling
+    - numpy: For spatial clustering
     - json: For GeoJSON processing
 
 Author: Sinan 
@@ -24,7 +26,12 @@ Version: 1.0.0
 
 import requests
 import json
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+# Public and default OSRM deployments reject trips with more waypoints than this
+MAX_TRIP_WAYPOINTS = 100
 
 def emergency_to_weight(emergency_level: int, base_penalty: int = 3600, 
                        max_penalty: int = 7200) -> int:
@@ -61,7 +68,8 @@ def emergency_to_weight(emergency_level: int, base_penalty: int = 3600,
 
 def get_osrm_trip(coordinates: list, weights: list = None, 
                   api_url: str = "http://router.project-osrm.org/trip/v1/driving/",
-                  rescue_center: list = None) -> dict:
+                  rescue_center: list = None,
+                  max_waypoints: int = MAX_TRIP_WAYPOINTS) -> dict:
     """
     Generates optimized route using OSRM Trip API with support for weighted locations
     and rescue center integration.
@@ -71,6 +79,8 @@ def get_osrm_trip(coordinates: list, weights: list = None,
         weights (list, optional): List of time penalties in seconds for each location
         api_url (str, optional): OSRM API endpoint URL
         rescue_center (list, optional): [longitude, latitude] of rescue center
+        max_waypoints (int, optional): Largest trip sent as a single request.
+            Bigger trips are routed through get_osrm_trip_decomposed
     
     Returns:
         dict: GeoJSON object containing:
@@ -96,9 +106,16 @@ def get_osrm_trip(coordinates: list, weights: list = None,
     Notes:
         - OSRM API response includes detailed trip information
         - Rescue center is always first and last point if provided
-        - Weights affect route optimization but not actual travel times
+        - Weights are sent as a 'durations' query parameter, which the OSRM Trip
+          service does not use for ordering; compare weighted and unweighted trips
+          with route_scoring.compare_strategies
         - Uses 'geojson' geometry format for compatibility with mapping libraries
     """
+    if len(coordinates) + (1 if rescue_center else 0) > max_waypoints:
+        return get_osrm_trip_decomposed(coordinates, weights, api_url=api_url,
+                                        rescue_center=rescue_center,
+                                        max_waypoints=max_waypoints)
+
     if rescue_center:
         coordinates.insert(0, rescue_center)
         if weights:
@@ -119,32 +136,272 @@ def get_osrm_trip(coordinates: list, weights: list = None,
                "destination=any&geometries=geojson&overview=full")
     
     # Execute API request
+    data = _request_trip(url)
+    if data is None:
+        return None
+
+    return _trip_to_geojson(data["trips"][0]["geometry"],
+                            data["trips"][0]["distance"],
+                            data["trips"][0]["duration"],
+                            data["waypoints"])
+
+def _request_trip(url: str) -> dict:
+    """
+    Executes a single OSRM request.
+    
+    Returns:
+        dict: Decoded OSRM response, or None if the request failed
+    """
     response = requests.get(url)
     
     if response.status_code == 200:
-        data = response.json()
-        
-        # Construct GeoJSON response
-        geojson = {
-            "type": "FeatureCollection",
-            "features": [
-                {
-                    "type": "Feature",
-                    "geometry": data["trips"][0]["geometry"],
-                    "properties": {
-                        "distance": data["trips"][0]["distance"],
-                        "duration": data["trips"][0]["duration"],
-                        "waypoints": data["waypoints"]
-                    }
-                }
-            ]
-        }
-        
-        return geojson
+        return response.json()
     else:
         print(f"Error: API request failed with status code {response.status_code}")
         return None
 
+def _trip_to_geojson(geometry: dict, distance: float, duration: float,
+                     waypoints: list) -> dict:
+    """
+    Wraps a trip into the GeoJSON FeatureCollection returned by the trip functions.
+    """
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": geometry,
+                "properties": {
+                    "distance": distance,
+                    "duration": duration,
+                    "waypoints": waypoints
+                }
+            }
+        ]
+    }
+
+def _planar(points: np.ndarray) -> np.ndarray:
+    """
+    Projects [longitude, latitude] pairs onto a local equirectangular plane, in
+    degrees of latitude, so that Euclidean distances are comparable on both axes.
+    """
+    planar = np.array(points, dtype=float)
+    if len(planar):
+        planar[:, 0] *= np.cos(np.radians(planar[:, 1].mean()))
+    return planar
+
+def cluster_coordinates(coordinates: list, max_cluster_size: int) -> list:
+    """
+    Splits locations into spatially compact groups of bounded size.
+    
+    Groups are built by recursive median bisection along the widest axis, which
+    keeps every group below max_cluster_size while keeping neighbours together.
+    
+    Args:
+        coordinates (list): List of [longitude, latitude] pairs
+        max_cluster_size (int): Maximum number of locations per group
+    
+    Returns:
+        list: Lists of indices into coordinates, one list per group
+    
+    Example:
+        >>> cluster_coordinates([[2.30, 48.9], [2.31, 48.9], [2.9, 48.1]], 2)
+        [[0, 1], [2]]
+    """
+    if max_cluster_size < 1:
+        raise ValueError("max_cluster_size must be at least 1")
+
+    planar = _planar(coordinates)
+    pending = [np.arange(len(planar))]
+    clusters = []
+
+    while pending:
+        indices = pending.pop()
+        if len(indices) <= max_cluster_size:
+            if len(indices):
+                clusters.append(sorted(indices.tolist()))
+            continue
+        points = planar[indices]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        ranks = np.argsort(points[:, axis], kind="stable")
+        order = indices[ranks]
+        values = points[ranks, axis]
+        # Split so that one half holds a whole number of full groups, on the side
+        # with the wider gap between neighbouring locations
+        n_groups = -(-len(order) // max_cluster_size)
+        left = (n_groups // 2) * max_cluster_size
+        right = len(order) - left
+        split = max((left, right), key=lambda i: values[i] - values[i - 1])
+        pending.extend([order[split:], order[:split]])
+
+    return sorted(clusters)
+
+def _order_clusters(planar: np.ndarray, clusters: list, start: np.ndarray) -> list:
+    """
+    Orders groups greedily by nearest centroid, beginning from start.
+    """
+    centroids = np.array([planar[cluster].mean(axis=0) for cluster in clusters])
+    remaining = list(range(len(clusters)))
+    ordered = []
+    position = start
+    while remaining:
+        distances = np.linalg.norm(centroids[remaining] - position, axis=1)
+        nearest = remaining.pop(int(np.argmin(distances)))
+        ordered.append(clusters[nearest])
+        position = centroids[nearest]
+    return ordered
+
+def get_osrm_trip_decomposed(coordinates: list, weights: list = None,
+                             api_url: str = "http://router.project-osrm.org/trip/v1/driving/",
+                             rescue_center: list = None,
+                             max_waypoints: int = MAX_TRIP_WAYPOINTS,
+                             max_workers: int = 8) -> dict:
+    """
+    Generates an optimized route for victim sets larger than OSRM accepts in a
+    single Trip request.
+    
+    Locations are clustered into groups that fit within max_waypoints, groups are
+    chained by nearest centroid starting from the rescue center, and each group is
+    solved as an open sub-trip concurrently. Every sub-trip starts at the exit
+    location of the previous group, so the stitched tour is continuous and returns
+    to its starting point like the single-request round trip.
+    
+    Args:
+        coordinates (list): List of [longitude, latitude] pairs for each location
+        weights (list, optional): List of time penalties in seconds for each location
+        api_url (str, optional): OSRM API endpoint URL
+        rescue_center (list, optional): [longitude, latitude] of rescue center.
+            The first coordinate is used as the start when omitted
+        max_waypoints (int, optional): Waypoint limit of a single OSRM request
+        max_workers (int, optional): Number of sub-trips requested concurrently
+    
+    Returns:
+        dict: GeoJSON object with the same shape as get_osrm_trip. Waypoints are
+        listed in input order (rescue center first) and their waypoint_index gives
+        the position in the stitched tour. Returns None if any sub-trip fails.
+    
+    Raises:
+        ValueError: If weights length doesn't match coordinates length
+    
+    Notes:
+        - Input lists are not modified
+        - Each sub-trip uses at most max_waypoints coordinates, including the
+          connecting location and the closing rescue center
+    """
+    if weights and len(weights) != len(coordinates):
+        raise ValueError("The number of weights must match the number of coordinates")
+    if max_waypoints < 3:
+        raise ValueError("max_waypoints must allow at least one location per sub-trip")
+
+    # Input order of the output waypoints: rescue center first, then the locations
+    points = [list(rescue_center)] if rescue_center else []
+    points += [list(coordinate) for coordinate in coordinates]
+    point_weights = None
+    if weights:
+        point_weights = ([0] if rescue_center else []) + list(weights)
+
+    planar = _planar(points)
+    victims = np.arange(1, len(points))
+    if len(victims) == 0:
+        return get_osrm_trip(points[:1], point_weights, api_url=api_url)
+    clusters = [victims[cluster].tolist()
+                for cluster in cluster_coordinates(planar[victims], max_waypoints - 2)]
+    clusters = _order_clusters(planar, clusters, planar[0])
+
+    # Fix each group's exit as the location closest to the next group (or to the
+    # rescue center for the last group) so sub-trips can be solved independently
+    sub_trips = []
+    anchor = 0
+    for position, cluster in enumerate(clusters):
+        if position + 1 < len(clusters):
+            target = planar[clusters[position + 1]].mean(axis=0)
+        else:
+            target = planar[0]
+        distances = np.linalg.norm(planar[cluster] - target, axis=1)
+        exit_point = cluster[int(np.argmin(distances))]
+        stops = [anchor] + [i for i in cluster if i != exit_point] + [exit_point]
+        if position + 1 == len(clusters):
+            stops.append(0)
+        sub_trips.append(stops)
+        anchor = exit_point
+
+    def solve(stops):
+        coords_str = ";".join([f"{points[i][0]},{points[i][1]}" for i in stops])
+        url = (f"{api_url}{coords_str}?roundtrip=false&source=first&"
+               "destination=last&geometries=geojson&overview=full")
+        if point_weights:
+            weights_str = ";".join([str(point_weights[i]) if n else "0"
+                                    for n, i in enumerate(stops)])
+            url += f"&durations={weights_str}"
+        return _request_trip(url)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(solve, sub_trips))
+    if any(result is None for result in results):
+        return None
+
+    # Stitch sub-trips in group order
+    line = []
+    distance = 0.0
+    duration = 0.0
+    waypoints = [None] * len(points)
+    offset = 0
+    for position, (stops, data) in enumerate(zip(sub_trips, results)):
+        trip = data["trips"][0]
+        segment = trip["geometry"]["coordinates"]
+        if line and segment and line[-1] == segment[0]:
+            segment = segment[1:]
+        line.extend(segment)
+        distance += trip["distance"]
+        duration += trip["duration"]
+
+        for n, (stop, waypoint) in enumerate(zip(stops, data["waypoints"])):
+            # The connecting location belongs to the previous group and the
+            # closing rescue center was already recorded as the start
+            if (n == 0 and position > 0) or (n == len(stops) - 1 and stop == 0):
+                continue
+            waypoint = dict(waypoint)
+            waypoint["waypoint_index"] = offset + waypoint["waypoint_index"]
+            waypoint["trips_index"] = 0
+            waypoints[stop] = waypoint
+        offset += len(stops) - 1
+
+    geometry = {"type": "LineString", "coordinates": line}
+    return _trip_to_geojson(geometry, distance, duration, waypoints)
+
+def get_osrm_table(coordinates: list, sources: list = None, destinations: list = None,
+                   api_url: str = "http://router.project-osrm.org/table/v1/driving/") -> np.ndarray:
+    """
+    Requests a travel time matrix from the OSRM Table API.
+    
+    Args:
+        coordinates (list): List of [longitude, latitude] pairs
+        sources (list, optional): Indices of the coordinates used as rows. Defaults to all
+        destinations (list, optional): Indices of the coordinates used as columns. Defaults to all
+        api_url (str, optional): OSRM Table API endpoint URL
+    
+    Returns:
+        np.ndarray: (sources, destinations) travel times in seconds, inf where no
+        route exists, or None if the request failed
+    
+    Example:
+        >>> table = get_osrm_table([[2.3, 48.9], [2.4, 48.8]], sources=[0])
+        >>> table.shape
+        (1, 2)
+    """
+    coords_str = ";".join([f"{lon},{lat}" for lon, lat in coordinates])
+    url = f"{api_url}{coords_str}?annotations=duration"
+    if sources is not None:
+        url += "&sources=" + ";".join(str(i) for i in sources)
+    if destinations is not None:
+        url += "&destinations=" + ";".join(str(i) for i in destinations)
+
+    data = _request_trip(url)
+    if data is None:
+        return None
+    durations = np.array(data["durations"], dtype=float)
+    return np.where(np.isnan(durations), np.inf, durations)
+
 if __name__ == "__main__":
     """
     Example usage of path optimizer with sample data.
@@ -1,7 +1,10 @@
 import datetime
-from typing import List, Tuple, Dict
+import math
+from typing import Callable, List, Optional, Tuple, Dict
 from dataclasses import dataclass
 import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
 
 # Constants
 RISK_LEVELS = {
@@ -12,6 +15,25 @@ RISK_LEVELS = {
     5: "very_minor"
 }
 
+# Hours after which a victim of each risk level should have been reached
+RISK_WINDOW_HOURS = {
+    1: 1,
+    2: 2,
+    3: 4,
+    4: 6,
+    5: 8
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+# Average emergency vehicle speed used when no road router is available,
+# and the ratio of road distance to straight-line distance in a street grid
+DEFAULT_SPEED_KMH = 40.0
+ROAD_DETOUR_FACTOR = 1.3
+
+# Number of victims a rescue team takes on when the team data has no capacity
+DEFAULT_TEAM_CAPACITY = 10
+
 @dataclass
 class Coordinates:
     latitude: float
@@ -38,9 +60,24 @@ def load_victim_data(file_path: str) -> List[Victim]:
     
     Returns:
         List[Victim]: List of Victim objects.
+    
+    Notes:
+        - Expects latitude and longitude columns, and either a risk column with
+          RISK_LEVELS names or a risk_nb column on the RISK_LEVELS scale
+        - Victim IDs come from an id column, or the row index when absent
     """
-    # Implementation would go here
-    pass
+    data = pd.read_csv(file_path).dropna(subset=['latitude', 'longitude'])
+    levels = {name: level for level, name in RISK_LEVELS.items()}
+    if 'risk' in data.columns:
+        risk = data['risk'].map(levels).fillna(5)
+    else:
+        risk = data['risk_nb'].fillna(5)
+    ids = data['id'].astype(str) if 'id' in data.columns else data.index.astype(str)
+
+    return [
+        Victim(id=victim_id, coordinates=Coordinates(lat, lon), risk_nb=int(level))
+        for victim_id, lat, lon, level in zip(ids, data['latitude'], data['longitude'], risk)
+    ]
 
 def load_rescue_team_data(file_path: str) -> List[RescueTeam]:
     """
@@ -51,9 +88,22 @@ def load_rescue_team_data(file_path: str) -> List[RescueTeam]:
     
     Returns:
         List[RescueTeam]: List of RescueTeam objects.
+    
+    Notes:
+        - Team IDs come from an id column, or the name column (as in datasets/sf_rescue_dep.csv)
+        - Teams without a capacity column get DEFAULT_TEAM_CAPACITY
     """
-    # Implementation would go here
-    pass
+    data = pd.read_csv(file_path).dropna(subset=['latitude', 'longitude'])
+    ids = data['id'] if 'id' in data.columns else data['name']
+    if 'capacity' in data.columns:
+        capacity = data['capacity'].fillna(DEFAULT_TEAM_CAPACITY)
+    else:
+        capacity = [DEFAULT_TEAM_CAPACITY] * len(data)
+
+    return [
+        RescueTeam(id=str(team_id), coordinates=Coordinates(lat, lon), capacity=int(team_capacity))
+        for team_id, lat, lon, team_capacity in zip(ids, data['latitude'], data['longitude'], capacity)
+    ]
 
 def calculate_distance(coord1: Coordinates, coord2: Coordinates) -> float:
     """
@@ -66,8 +116,120 @@ def calculate_distance(coord1: Coordinates, coord2: Coordinates) -> float:
     Returns:
         float: Distance in kilometers.
     """
-    # Implementation would go here
-    pass
+    lat1, lon1 = math.radians(coord1.latitude), math.radians(coord1.longitude)
+    lat2, lon2 = math.radians(coord2.latitude), math.radians(coord2.longitude)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def estimate_travel_time(coord1: Coordinates, coord2: Coordinates,
+                         speed_kmh: float = DEFAULT_SPEED_KMH) -> float:
+    """
+    Estimate driving time between two coordinates without a road router.
+    
+    Args:
+        coord1 (Coordinates): First coordinate.
+        coord2 (Coordinates): Second coordinate.
+        speed_kmh (float): Average driving speed.
+    
+    Returns:
+        float: Travel time in seconds.
+    """
+    return calculate_distance(coord1, coord2) * ROAD_DETOUR_FACTOR / speed_kmh * 3600
+
+def estimate_travel_time_matrix(points: List[Coordinates],
+                                speed_kmh: float = DEFAULT_SPEED_KMH,
+                                destinations: Optional[List[Coordinates]] = None) -> np.ndarray:
+    """
+    Vectorized estimate_travel_time between every pair of coordinates.
+    
+    Args:
+        points (List[Coordinates]): Coordinates to connect.
+        speed_kmh (float): Average driving speed.
+        destinations (List[Coordinates], optional): Column coordinates. Defaults to points.
+    
+    Returns:
+        np.ndarray: (len(points), len(destinations)) matrix of travel times in seconds.
+    """
+    destinations = points if destinations is None else destinations
+    lat = np.radians([point.latitude for point in points])
+    lon = np.radians([point.longitude for point in points])
+    to_lat = np.radians([point.latitude for point in destinations])
+    to_lon = np.radians([point.longitude for point in destinations])
+    dlat = to_lat[None, :] - lat[:, None]
+    dlon = to_lon[None, :] - lon[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:, None]) * np.cos(to_lat[None, :]) * np.sin(dlon / 2) ** 2
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return distance * ROAD_DETOUR_FACTOR / speed_kmh * 3600
+
+def estimate_leg_travel_times(points: List[Coordinates],
+                              speed_kmh: float = DEFAULT_SPEED_KMH) -> np.ndarray:
+    """
+    Vectorized estimate_travel_time between consecutive coordinates of a path.
+    
+    Args:
+        points (List[Coordinates]): Coordinates in visiting order.
+        speed_kmh (float): Average driving speed.
+    
+    Returns:
+        np.ndarray: len(points) - 1 travel times in seconds.
+    """
+    lat = np.radians([point.latitude for point in points])
+    lon = np.radians([point.longitude for point in points])
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return distance * ROAD_DETOUR_FACTOR / speed_kmh * 3600
+
+def solve_route(start: Coordinates, victims: List[Victim],
+                travel_time: Optional[Callable[[Coordinates, Coordinates], float]] = None,
+                max_passes: int = 10) -> List[Victim]:
+    """
+    Order victims into a round trip from start with a local heuristic solver.
+    
+    Builds a nearest-neighbour tour and improves it with 2-opt moves until no
+    move shortens the tour or max_passes is reached.
+    
+    Args:
+        start (Coordinates): Depot the tour starts from and returns to.
+        victims (List[Victim]): Victims to visit.
+        travel_time (Callable, optional): Cost between two coordinates. Defaults to estimate_travel_time.
+        max_passes (int): Maximum number of 2-opt improvement passes.
+    
+    Returns:
+        List[Victim]: Victims in visiting order.
+    """
+    points = [start] + [victim.coordinates for victim in victims]
+    n = len(points)
+    if travel_time is None:
+        cost = estimate_travel_time_matrix(points)
+    else:
+        cost = np.array([[travel_time(a, b) if i != j else 0.0 for j, b in enumerate(points)]
+                         for i, a in enumerate(points)])
+
+    # Nearest-neighbour construction
+    tour = [0]
+    unvisited = set(range(1, n))
+    while unvisited:
+        last = tour[-1]
+        nearest = min(unvisited, key=lambda j: cost[last, j])
+        tour.append(nearest)
+        unvisited.remove(nearest)
+    tour.append(0)
+
+    # 2-opt improvement
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, len(tour) - 2):
+            for j in range(i + 1, len(tour) - 1):
+                a, b, c, d = tour[i - 1], tour[i], tour[j], tour[j + 1]
+                if cost[a, c] + cost[b, d] < cost[a, b] + cost[c, d] - 1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+
+    return [victims[i - 1] for i in tour[1:-1]]
 
 def create_time_windows(victims: List[Victim]) -> Dict[str, Tuple[datetime.datetime, datetime.datetime]]:
     """
@@ -83,22 +245,15 @@ def create_time_windows(victims: List[Victim]) -> Dict[str, Tuple[datetime.datet
     now = datetime.datetime.now()
     
     for victim in victims:
-        if victim.risk_nb == 1:  # most_urgent
-            end_time = now + datetime.timedelta(hours=1)
-        elif victim.risk_nb == 2:  # urgent
-            end_time = now + datetime.timedelta(hours=2)
-        elif victim.risk_nb == 3:  # less_urgent
-            end_time = now + datetime.timedelta(hours=4)
-        elif victim.risk_nb == 4:  # minor
-            end_time = now + datetime.timedelta(hours=6)
-        else:  # very_minor
-            end_time = now + datetime.timedelta(hours=8)
+        # Unknown levels are treated as very_minor
+        hours = RISK_WINDOW_HOURS.get(victim.risk_nb, RISK_WINDOW_HOURS[5])
+        end_time = now + datetime.timedelta(hours=hours)
         
         time_windows[victim.id] = (now, end_time)
     
     return time_windows
 
-def assign_rescue_teams(victims: List[Victim], rescue_teams: List[RescueTeam], time_windows: Dict[str, Tuple[datetime.datetime, datetime.datetime]]) -> Dict[str, List[str]]:
+def assign_rescue_teams(victims: List[Victim], rescue_teams: List[RescueTeam], time_windows: Dict[str, Tuple[datetime.datetime, datetime.datetime]], k_nearest: int = 8) -> Dict[str, List[str]]:
     """
     Assign rescue teams to victims based on distance, risk level, and time windows.
     
@@ -106,12 +261,165 @@ def assign_rescue_teams(victims: List[Victim], rescue_teams: List[RescueTeam], t
         victims (List[Victim]): List of victims.
         rescue_teams (List[RescueTeam]): List of rescue teams.
         time_windows (Dict[str, Tuple[datetime.datetime, datetime.datetime]]): Time windows for each victim.
+        k_nearest (int): Number of nearest teams considered per victim in the greedy pass.
     
     Returns:
-        Dict[str, List[str]]: Dictionary mapping rescue team IDs to lists of assigned victim IDs.
+        Dict[str, List[str]]: Dictionary mapping rescue team IDs to lists of assigned victim IDs, most urgent first.
+    
+    Notes:
+        - Team positions are indexed in a KD-tree on a local kilometre plane
+        - Greedy pass: in rounds over each victim's k nearest teams, every team
+          accepts the most urgent victims (earliest time window end) up to its
+          remaining capacity
+        - Victims whose nearest teams are all full go to the nearest team with capacity left
+        - Reassignment pass: victims not at their nearest team are swapped with
+          victims of a closer team whenever that lowers the total distance without
+          moving the more urgent of the two further away
+        - Victims beyond the total capacity of all teams are left unassigned
+    """
+    assignments = {team.id: [] for team in rescue_teams}
+    if not victims or not rescue_teams:
+        return assignments
+
+    victim_xy, team_xy = _project_km(
+        np.fromiter((c for v in victims for c in (v.coordinates.latitude, v.coordinates.longitude)),
+                    dtype=float, count=2 * len(victims)).reshape(-1, 2),
+        np.array([[t.coordinates.latitude, t.coordinates.longitude] for t in rescue_teams])
+    )
+    capacity = np.array([max(team.capacity, 0) for team in rescue_teams])
+
+    # Urgency rank: earliest window end first, missing windows last.
+    # Windows share a handful of end times, so timestamps are converted once each
+    timestamps = {}
+    for _, end_time in time_windows.values():
+        if end_time not in timestamps:
+            timestamps[end_time] = end_time.timestamp()
+    deadlines = np.fromiter(
+        (timestamps[time_windows[v.id][1]] if v.id in time_windows else np.inf for v in victims),
+        dtype=float, count=len(victims)
+    )
+    urgency = np.empty(len(victims), dtype=int)
+    urgency[np.argsort(deadlines, kind="stable")] = np.arange(len(victims))
+
+    k = min(k_nearest, len(rescue_teams))
+    nearest_distance, nearest = cKDTree(team_xy).query(victim_xy, k=k)
+    nearest_distance = nearest_distance.reshape(len(victims), k)
+    nearest = nearest.reshape(len(victims), k)
+
+    assigned = np.full(len(victims), -1)
+    remaining = capacity.copy()
+    for rank in range(k):
+        _accept(np.flatnonzero(assigned < 0), nearest[:, rank], urgency, assigned, remaining)
+
+    # Overflow: nearest team that still has room
+    while (assigned < 0).any() and remaining.sum() > 0:
+        open_teams = np.flatnonzero(remaining > 0)
+        pending = np.flatnonzero(assigned < 0)
+        _, choice = cKDTree(team_xy[open_teams]).query(victim_xy[pending])
+        choices = np.full(len(victims), -1)
+        choices[pending] = open_teams[choice]
+        _accept(pending, choices, urgency, assigned, remaining)
+
+    _reassign(victim_xy, team_xy, nearest, nearest_distance, urgency, assigned)
+    load = np.bincount(assigned[assigned >= 0], minlength=len(rescue_teams))
+    if (load > capacity).any():
+        team = int(np.argmax(load - capacity))
+        raise RuntimeError(f"Team {rescue_teams[team].id} assigned {load[team]} victims "
+                           f"for a capacity of {capacity[team]}")
+
+    team_ids = [team.id for team in rescue_teams]
+    order = np.argsort(urgency)
+    for victim_index, team_index in zip(order.tolist(), assigned[order].tolist()):
+        if team_index >= 0:
+            assignments[team_ids[team_index]].append(victims[victim_index].id)
+    return assignments
+
+def _project_km(*groups: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Projects (latitude, longitude) arrays onto a shared equirectangular plane in km.
+    """
+    mean_lat = np.radians(np.concatenate(groups)[:, 0].mean())
+    km_per_degree = EARTH_RADIUS_KM * np.pi / 180
+    return tuple(
+        np.column_stack((group[:, 1] * np.cos(mean_lat), group[:, 0])) * km_per_degree
+        for group in groups
+    )
+
+def _accept(pending: np.ndarray, choices: np.ndarray, urgency: np.ndarray,
+            assigned: np.ndarray, remaining: np.ndarray) -> None:
     """
-    # Implementation would go here
-    pass
+    Lets every team accept its most urgent pending victims up to remaining capacity.
+    """
+    if not len(pending):
+        return
+    teams = choices[pending]
+    order = np.lexsort((urgency[pending], teams))
+    victims_sorted, teams_sorted = pending[order], teams[order]
+    starts = np.flatnonzero(np.r_[True, teams_sorted[1:] != teams_sorted[:-1]])
+    sizes = np.diff(np.r_[starts, len(teams_sorted)])
+    position = np.arange(len(teams_sorted)) - np.repeat(starts, sizes)
+    accepted = position < remaining[teams_sorted]
+    assigned[victims_sorted[accepted]] = teams_sorted[accepted]
+    remaining -= np.bincount(teams_sorted[accepted], minlength=len(remaining))
+
+def _reassign(victim_xy: np.ndarray, team_xy: np.ndarray, nearest: np.ndarray,
+              nearest_distance: np.ndarray, urgency: np.ndarray,
+              assigned: np.ndarray, passes: int = 1, max_rank: int = 3) -> None:
+    """
+    Min-cost reassignment pass over victims that did not get their nearest team.
+    
+    Teams that turned a victim away in the greedy pass are full, so improvements
+    are pairwise swaps. For every (current team, closer team) pair, the displaced
+    victims with the largest savings are matched with the members of the closer
+    team that lose the least by moving the other way.
+    """
+    n_teams = len(team_xy)
+    for _ in range(passes):
+        swapped = False
+        for rank in range(min(max_rank, nearest.shape[1])):
+            valid = np.flatnonzero(assigned >= 0)
+            current = np.full(len(assigned), np.inf)
+            current[valid] = np.linalg.norm(victim_xy[valid] - team_xy[assigned[valid]], axis=1)
+            gain_a = current - nearest_distance[:, rank]
+            candidates = np.flatnonzero((assigned >= 0) & (nearest[:, rank] != assigned) & (gain_a > 1e-9))
+            if not len(candidates):
+                continue
+
+            # Members of every team, as slices of a team-sorted index
+            by_team = np.argsort(assigned, kind="stable")
+            bounds = np.searchsorted(assigned[by_team], np.arange(n_teams + 1))
+
+            pair_key = assigned[candidates] * n_teams + nearest[candidates, rank]
+            order = np.lexsort((-gain_a[candidates], pair_key))
+            candidates, pair_key = candidates[order], pair_key[order]
+            starts = np.flatnonzero(np.r_[True, pair_key[1:] != pair_key[:-1]])
+            used = np.zeros(len(assigned), dtype=bool)
+
+            for key, group in zip(pair_key[starts].tolist(), np.split(candidates, starts[1:])):
+                # Teams come from the pair key: earlier swaps may have moved group[0] already
+                team_a, team_b = divmod(key, n_teams)
+                others = by_team[bounds[team_b]:bounds[team_b + 1]]
+                others = others[~used[others] & (assigned[others] == team_b)]
+                group = group[~used[group]]
+                if not len(others) or not len(group):
+                    continue
+                gain_b = current[others] - np.linalg.norm(victim_xy[others] - team_xy[team_a], axis=1)
+                if len(group) < len(others):
+                    best = np.argpartition(-gain_b, len(group) - 1)[:len(group)]
+                    best = best[np.argsort(-gain_b[best], kind="stable")]
+                else:
+                    best = np.argsort(-gain_b, kind="stable")
+                others, gain_b, group = others[best], gain_b[best], group[:len(best)]
+                # Never push the more urgent victim of the pair further away
+                accepted = ((gain_a[group] + gain_b > 1e-9)
+                            & ((urgency[others] > urgency[group]) | (gain_b >= 0)))
+                if accepted.any():
+                    a, b = group[accepted], others[accepted]
+                    assigned[a], assigned[b] = team_b, team_a
+                    used[a] = used[b] = True
+                    swapped = True
+        if not swapped:
+            break
 
 def optimize_routes(assignments: Dict[str, List[str]], rescue_teams: List[RescueTeam], victims: List[Victim]) -> Dict[str, List[str]]:
     """
@@ -125,15 +433,22 @@ def optimize_routes(assignments: Dict[str, List[str]], rescue_teams: List[Rescue
     Returns:
         Dict[str, List[str]]: Optimized routes for each rescue team.
     """
-    # This is where you would integrate with CuOpt for the VRP solver
-    # Implementation would go here
-    pass
+    # Local heuristic solver; a VRP solver such as CuOpt can replace solve_route here
+    victims_by_id = {victim.id: victim for victim in victims}
+    teams_by_id = {team.id: team for team in rescue_teams}
+    return {
+        team_id: [victim.id for victim in solve_route(
+            teams_by_id[team_id].coordinates,
+            [victims_by_id[victim_id] for victim_id in victim_ids]
+        )]
+        for team_id, victim_ids in assignments.items()
+    }
 
 
 def main():
     # Load data
-    victims = load_victim_data("path/to/victim/data.csv")
-    rescue_teams = load_rescue_team_data("path/to/rescue_team/data.csv")
+    victims = load_victim_data("datasets/health_check_descriptions.csv")
+    rescue_teams = load_rescue_team_data("datasets/sf_rescue_dep.csv")
     
     # Create time windows
     time_windows = create_time_windows(victims)
@@ -0,0 +1,306 @@
+"""
+Incremental Route Maintenance for Rescue Centers
+===============================================
+
+This module keeps the current tour of every rescue center up to date as victims
+report in, change status or are rescued, without recomputing the whole trip on
+each event.
+
+Key Features:
+    - Cheapest feasible insertion of newly reported victims
+    - Removal of rescued victims
+    - Time window feasibility based on victim risk levels
+    - Quality drift tracking with automatic full re-optimization
+    - Pluggable travel time and re-optimization functions (local solver or OSRM)
+
+Dependencies:
+    - numpy: For leg cost bookkeeping
+    - rescue_path_opt: For victim data classes, time windows and the local solver
+    - path_optimizer: For OSRM based re-optimization
+
+Notes:
+    Tour quality drifts as insertions accumulate. A freshly optimized tour of n
+    stops in a fixed area grows roughly with sqrt(n), so the expected optimum is
+    estimated from the last optimized cost scaled by sqrt(n / n_optimized). A full
+    re-optimization runs when the current cost exceeds that estimate by more than
+    drift_threshold.
+"""
+
+import datetime
+import math
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from rescue_tools import path_optimizer
+from rescue_tools.rescue_path_opt import (
+    RISK_WINDOW_HOURS,
+    Coordinates,
+    Victim,
+    estimate_travel_time,
+    solve_route,
+)
+
+TravelTime = Callable[[Coordinates, Coordinates], float]
+Reoptimizer = Callable[[Coordinates, List[Victim]], List[Victim]]
+
+
+def osrm_reoptimizer(api_url: str = "http://router.project-osrm.org/trip/v1/driving/") -> Reoptimizer:
+    """
+    Builds a re-optimization function backed by the OSRM Trip API.
+
+    Args:
+        api_url (str, optional): OSRM API endpoint URL
+
+    Returns:
+        Callable: Function ordering victims from a depot, falling back to the
+        local solver when the OSRM request fails
+    """
+    def reoptimize(depot: Coordinates, victims: List[Victim]) -> List[Victim]:
+        coordinates = [[v.coordinates.longitude, v.coordinates.latitude] for v in victims]
+        route = path_optimizer.get_osrm_trip(
+            coordinates=coordinates,
+            api_url=api_url,
+            rescue_center=[depot.longitude, depot.latitude]
+        )
+        if route is None:
+            return solve_route(depot, victims)
+        # Waypoints are in input order with the depot first
+        waypoints = route["features"][0]["properties"]["waypoints"][1:]
+        order = sorted(range(len(victims)), key=lambda i: waypoints[i]["waypoint_index"])
+        return [victims[i] for i in order]
+
+    return reoptimize
+
+
+class IncrementalRoute:
+    """
+    Round trip of a single rescue center, maintained incrementally.
+
+    Attributes:
+        depot (Coordinates): Rescue center the tour starts from and returns to
+        start_time (datetime.datetime): Time the tour is measured from
+        drift_threshold (float): Allowed ratio between the current cost and the
+            estimated optimum before a full re-optimization is triggered
+        reoptimizations (int): Number of full re-optimizations performed
+        late_insertions (int): Insertions for which no position met every time window
+
+    Example:
+        >>> route = IncrementalRoute(Coordinates(37.7749, -122.4194))
+        >>> route.insert(Victim("v1", Coordinates(37.78, -122.41), risk_nb=1))
+        0
+        >>> route.order
+        ['v1']
+    """
+
+    def __init__(self, depot: Coordinates,
+                 travel_time: Optional[TravelTime] = None,
+                 reoptimizer: Optional[Reoptimizer] = None,
+                 drift_threshold: float = 1.25,
+                 start_time: Optional[datetime.datetime] = None):
+        self.depot = depot
+        self.travel_time = travel_time or estimate_travel_time
+        self.reoptimizer = reoptimizer or (lambda depot, victims: solve_route(depot, victims, self.travel_time))
+        self.drift_threshold = drift_threshold
+        self.start_time = start_time or datetime.datetime.now()
+        self.reoptimizations = 0
+        self.late_insertions = 0
+
+        self._stops: List[Victim] = []
+        self._deadlines: Dict[str, float] = {}
+        # _legs[i] is the cost of reaching stop i (or the depot, for the last leg)
+        self._legs: List[float] = [0.0]
+        self._optimized_cost = 0.0
+        self._optimized_size = 0
+
+    # ------------------------------------------------------------------
+    # Tour state
+
+    @property
+    def order(self) -> List[str]:
+        """Victim IDs in visiting order."""
+        return [victim.id for victim in self._stops]
+
+    @property
+    def victims(self) -> List[Victim]:
+        """Victims in visiting order."""
+        return list(self._stops)
+
+    @property
+    def cost(self) -> float:
+        """Total round trip travel time in seconds."""
+        return float(sum(self._legs))
+
+    @property
+    def drift(self) -> float:
+        """Ratio between the current cost and the estimated optimal cost."""
+        if not self._stops or self._optimized_cost <= 0 or self._optimized_size == 0:
+            return 1.0
+        expected = self._optimized_cost * math.sqrt(len(self._stops) / self._optimized_size)
+        return self.cost / expected if expected > 0 else 1.0
+
+    def arrival_times(self) -> np.ndarray:
+        """Arrival time at each stop, in seconds from start_time."""
+        return np.cumsum(self._legs[:-1]) if self._stops else np.zeros(0)
+
+    def __len__(self) -> int:
+        return len(self._stops)
+
+    def __contains__(self, victim_id: str) -> bool:
+        return victim_id in self._deadlines
+
+    # ------------------------------------------------------------------
+    # Updates
+
+    def deadline(self, victim: Victim, reported_at: Optional[datetime.datetime] = None) -> float:
+        """
+        Latest acceptable arrival for a victim, in seconds from start_time.
+        """
+        reported_at = reported_at or datetime.datetime.now()
+        hours = RISK_WINDOW_HOURS.get(victim.risk_nb, RISK_WINDOW_HOURS[5])
+        return (reported_at - self.start_time).total_seconds() + hours * 3600
+
+    def insert(self, victim: Victim, reported_at: Optional[datetime.datetime] = None) -> int:
+        """
+        Inserts a victim at the cheapest feasible position of the tour.
+
+        A position is feasible when the victim and every later stop are still
+        reached within their time windows. When no position is feasible the
+        cheapest one is used and counted in late_insertions, since a distance
+        based re-optimization cannot restore the time windows either.
+
+        Args:
+            victim (Victim): Newly reported victim, or a victim whose status changed
+            reported_at (datetime.datetime, optional): Report time, defaults to now
+
+        Returns:
+            int: Position of the victim in the tour after the update
+        """
+        if victim.id in self._deadlines:
+            self.remove(victim.id, reoptimize=False)
+
+        deadline = self.deadline(victim, reported_at)
+        nodes = [self.depot] + [stop.coordinates for stop in self._stops] + [self.depot]
+        to_victim = np.array([self.travel_time(node, victim.coordinates) for node in nodes[:-1]])
+        from_victim = np.array([self.travel_time(victim.coordinates, node) for node in nodes[1:]])
+        legs = np.asarray(self._legs)
+        deltas = to_victim + from_victim - legs
+
+        # Slack of every existing stop and the minimum slack from each position on
+        arrivals = np.cumsum(legs)
+        slack = np.array([self._deadlines[stop.id] for stop in self._stops]) - arrivals[:-1]
+        suffix_slack = np.append(np.minimum.accumulate(slack[::-1])[::-1], np.inf)
+        prefix_arrival = np.concatenate(([0.0], arrivals[:-1]))
+        feasible = (prefix_arrival + to_victim <= deadline) & (deltas <= suffix_slack)
+
+        candidates = np.flatnonzero(feasible)
+        position = int(candidates[np.argmin(deltas[candidates])]) if len(candidates) else int(np.argmin(deltas))
+
+        self._stops.insert(position, victim)
+        self._deadlines[victim.id] = deadline
+        self._legs[position:position + 1] = [float(to_victim[position]), float(from_victim[position])]
+        if self._optimized_size == 0:
+            self._mark_optimized()
+
+        if not len(candidates):
+            self.late_insertions += 1
+        if self.drift > self.drift_threshold:
+            self.reoptimize()
+            return self.order.index(victim.id)
+        return position
+
+    def remove(self, victim_id: str, reoptimize: bool = True) -> bool:
+        """
+        Removes a rescued victim by connecting its neighbours directly.
+
+        Args:
+            victim_id (str): ID of the rescued victim
+            reoptimize (bool): Whether to re-optimize if the drift threshold is crossed
+
+        Returns:
+            bool: True if the victim was part of the tour
+        """
+        if victim_id not in self._deadlines:
+            return False
+        position = self.order.index(victim_id)
+        del self._stops[position]
+        del self._deadlines[victim_id]
+        previous = self._stops[position - 1].coordinates if position > 0 else self.depot
+        following = self._stops[position].coordinates if position < len(self._stops) else self.depot
+        self._legs[position:position + 2] = [self.travel_time(previous, following) if self._stops else 0.0]
+        if not self._stops:
+            self._optimized_cost = 0.0
+            self._optimized_size = 0
+        elif reoptimize and self.drift > self.drift_threshold:
+            self.reoptimize()
+        return True
+
+    def reoptimize(self) -> None:
+        """Recomputes the whole tour with the configured re-optimizer."""
+        if self._stops:
+            self._stops = list(self.reoptimizer(self.depot, self._stops))
+            self._recompute_legs()
+        self.reoptimizations += 1
+        self._mark_optimized()
+
+    def _recompute_legs(self) -> None:
+        nodes = [self.depot] + [stop.coordinates for stop in self._stops] + [self.depot]
+        self._legs = [self.travel_time(a, b) for a, b in zip(nodes[:-1], nodes[1:])] if self._stops else [0.0]
+
+    def _mark_optimized(self) -> None:
+        self._optimized_cost = self.cost
+        self._optimized_size = len(self._stops)
+
+
+class RouteMaintainer:
+    """
+    Keeps one IncrementalRoute per rescue center and routes victim events to them.
+
+    Example:
+        >>> maintainer = RouteMaintainer()
+        >>> route = maintainer.add_center("SFFD", Coordinates(37.7749, -122.4194))
+        >>> maintainer.report("SFFD", Victim("v1", Coordinates(37.78, -122.41), risk_nb=2))
+        0
+        >>> maintainer.rescued("v1")
+        True
+    """
+
+    def __init__(self, travel_time: Optional[TravelTime] = None,
+                 reoptimizer: Optional[Reoptimizer] = None,
+                 drift_threshold: float = 1.25):
+        self.travel_time = travel_time
+        self.reoptimizer = reoptimizer
+        self.drift_threshold = drift_threshold
+        self.routes: Dict[str, IncrementalRoute] = {}
+        self._center_of: Dict[str, str] = {}
+
+    def add_center(self, center_id: str, depot: Coordinates) -> IncrementalRoute:
+        """Registers a rescue center with an empty tour."""
+        route = IncrementalRoute(depot, self.travel_time, self.reoptimizer, self.drift_threshold)
+        self.routes[center_id] = route
+        return route
+
+    def report(self, center_id: str, victim: Victim,
+               reported_at: Optional[datetime.datetime] = None) -> int:
+        """
+        Adds a new victim, or updates an existing one, on a center's tour.
+
+        Returns:
+            int: Position of the victim in the center's tour
+        """
+        previous = self._center_of.get(victim.id)
+        if previous is not None and previous != center_id:
+            self.routes[previous].remove(victim.id)
+        self._center_of[victim.id] = center_id
+        return self.routes[center_id].insert(victim, reported_at)
+
+    def rescued(self, victim_id: str) -> bool:
+        """Removes a rescued victim from whichever tour it belongs to."""
+        center_id = self._center_of.pop(victim_id, None)
+        if center_id is None:
+            return False
+        return self.routes[center_id].remove(victim_id)
+
+    def route(self, center_id: str) -> List[str]:
+        """Victim IDs of a center's tour in visiting order."""
+        return self.routes[center_id].order
@@ -37,6 +37,7 @@ setup(
         f"python-dotenv==1.0.1",
         f"python_dateutil==2.9.0.post0",
         f"Requests==2.32.3",
+        f"scipy==1.11.4",
         f"seaborn==0.13.2",
         f"sodapy==2.2.0",
         f"squarify==0.4.3",
@@ -1,18 +1,26 @@
 from victim_tools.llm_utils import GeminiConfig, schema, victim_info_schema# tool_config_from_mode
 from victim_tools.geolocation_data import geolocation_data
 from victim_tools.rescue_data import get_rescue_data
-from victim_tools.vital_data import update_victim_json
-from victim_tools.json_cleaner import upload_victim_info
-
-from victim_tools.audio_processing import process_audio, play_audio
+from victim_tools.vital_data import update_victim_json, apply_field_patch, record_filled
+from victim_tools.fast_extractor import extract_fields, merge_confidence
+from victim_tools.json_cleaner import process_json_response as parse_victim_json
+from victim_tools.llm_cache import shared_cache
+from victim_tools.guidance_index import get_guidance_index
+from victim_tools.llm_metrics import serve_metrics, shared_metrics
+
+from victim_tools.audio_processing import preload_model, process_audio_streaming, play_audio, render_audio, text_to_speech_elevenlabs
+from victim_tools.streaming import SpeechQueue, StreamAccumulator, stream_text
+from victim_tools.turn_pipeline import TurnPipeline
 from victim_tools.function_calling import provide_user_location
 from victim_tools.state_manager import StateManager
-from rescue_tools.fetch_vital_data import set_key, update_, json_template
+from victim_tools.victim_merge import diff, merge, to_update_paths
+from rescue_tools.fetch_vital_data import set_key, update_, patch_, json_template
 
 from streamlit_geolocation import streamlit_geolocation
 
 import time
 
+import copy
 import io
 import base64
 import json
@@ -73,6 +81,8 @@ if "victim_info" not in st.session_state:
     st.session_state.victim_info = json_template
 if "victim_number" not in st.session_state:
     st.session_state['victim_number'] = set_key(st.session_state['victim_info'])
+    # Last version sent to Firebase, later syncs only send the fields that changed
+    st.session_state['synced_victim_info'] = copy.deepcopy(st.session_state['victim_info'])
 if "victim_history" not in st.session_state:
     st.session_state.victim_history = {}
 
@@ -100,27 +110,29 @@ model = genai.GenerativeModel(
     #tool_config = tool_config
     )
 
-# from nexa.gguf import NexaTextInference
-
-# model_path = "gemma-1.1-2b-instruct:q4_0"
-
-# inference = NexaTextInference(
-#     model_path=model_path,
-#     local_path=None,
-#     stop_words=[],
-#     temperature=0.7,
-#     max_new_tokens=512,
-#     top_k=50,
-#     top_p=0.9,
-#     profiling=True
-# )
+# On-device extraction with a quantized model (e.g. gemma-1.1-2b-instruct:q4_0):
+# set local_model_path, see victim_tools/local_llm.py
 
 
 
 # initialize chat
-chat = model.start_chat(enable_automatic_function_calling=True)
-# send a message
-#chat.send_message('Hello', stream=True)
+# The SDK cannot stream while automatic function calling is enabled, so replies
+# are only streamed when no functions are registered
+stream_responses = not function_calling
+chat = model.start_chat(enable_automatic_function_calling=bool(function_calling))
+
+# Seconds each stage of a turn may take once the reply is available
+STAGE_TIMEOUTS = {
+    'tts': 15.0,
+    'extract': 20.0,
+    'sync': 10.0,
+}
+
+# Metrics endpoint of the model calls, started once per process
+if os.getenv('llm_metrics_port'):
+    serve_metrics(int(os.getenv('llm_metrics_port')))
+# Whisper loads in the background from the first run, shared by every session
+preload_model()
 
 #output = chat.send_message('hello')
 
@@ -154,7 +166,7 @@ def chat_container(height: int):
             audio = audiorecorder("🎤", "stop", show_visualizer=False)
         with left_:  
             # get prompt from text  
-            prompt = st.chat_input("Enter Query here") or process_audio(audio)
+            prompt = st.chat_input("Enter Query here") or transcribe_voice(audio)
 
         if state_manager.get_conversation_history() == "":
             introduction_str = "Hi, I am SafeGuardianAI. I am here to provide you with support, as well as informing rescue teams of your vital status. Can you speak?"# Please press the button to let me access your location for most accurate assistance."
@@ -183,43 +195,144 @@ def chat_container(height: int):
 
         if prompt:
             state_manager.add_message(role="user", content=prompt)
-            try:
-                # LLM inference
-                response = generate_response(prompt)
-            except Exception as e:
-                logger.error(f"Error generating response: {e}")
-                # try to call function with args manually 
-                response = generate_manual_response(prompt)
-            state_manager.add_message("assistant", response)
-            process_json_response(response)
         state_manager.display_messages()
 
+        if prompt:
+            # Render the reply below the history while it is generated
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                spoken = stream_responses
+                try:
+                    # LLM inference
+                    response = generate_response(prompt, placeholder)
+                except Exception as e:
+                    logger.error(f"Error generating response: {e}")
+                    # try to call function with args manually 
+                    response = generate_manual_response(prompt)
+                    spoken = False
+                placeholder.markdown(response)
+            state_manager.add_message("assistant", response)
+            json_blocks = st.session_state.pop('streamed_json', None) if spoken else None
+            process_json_response(response, speak=not spoken, json_blocks=json_blocks, user_input=prompt)
+
 
 def display_victim_info():
     st.write("Parsed Informations:\n\n", st.session_state.victim_info) 
-    # send data to FireBase
-    try:
-        update_(st.session_state['victim_number'], st.session_state['victim_info'])
-        time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # send data to FireBase, unless the turn pipeline already did
+    sync = st.session_state.pop('turn_sync', None)
+    time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if sync is None:
+        try:
+            st.session_state['synced_victim_info'] = copy.deepcopy(sync_victim_info(
+                st.session_state['victim_info'], st.session_state['victim_number'],
+                st.session_state.get('synced_victim_info')))
+            sync = True
+        except Exception as e:
+            logger.error(f"Error sending data to Firebase: {e}")
+            sync = False
+    if sync:
         st.success(f"{time}\nID: {st.session_state['victim_number']} \n Your data has been sent to the Rescue Team.")
-    except Exception as e:
-        logger.error(f"Error sending data to Firebase: {e}")
-        st.warning("{time}\nError sending data to the Rescue Team.")
+    else:
+        st.warning(f"{time}\nError sending data to the Rescue Team.")
 
 
-def generate_response(user_input: str) -> str:
-        if st.session_state.victim_info != json_template:
+def sync_victim_info(victim_info: Dict[str, Any], victim_number: str,
+                     synced: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Sends the victim document to Firebase: only the fields changed since the
+    synced version when it is known, the whole document otherwise.
+    """
+    if synced is None:
+        update_(victim_number, victim_info)
+    else:
+        updates = to_update_paths(diff(synced, victim_info))
+        if updates:
+            patch_(victim_number, updates)
+    return victim_info
+
+
+def extract_victim_info(response: str, victim_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Updates the victim document from a reply, or from the victim's message when a
+    guide answered (second LLM call), validates it and merges it into victim_info.
+    Runs in a turn pipeline worker: the result is stored by the caller.
+    """
+    extracted = parse_victim_json(update_victim_json(new_infos=response), schema)
+    extracted['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return merge(victim_info, extracted).document
+
+
+def transcribe_voice(audio) -> str:
+    """
+    Transcribes a voice message chunk by chunk: the partial transcript is shown,
+    and its fields extracted, while the rest of the message is transcribed.
+    """
+    placeholder = st.empty()
+
+    def on_partial(partial):
+        placeholder.caption(f"🎤 {partial.transcript}")
+        apply_fast_extraction(partial.text)
+
+    text = process_audio_streaming(audio, on_partial)
+    placeholder.empty()
+    return text
+
+
+def generate_response(user_input: str, placeholder=None) -> str:
+        # Summary, collected fields and recent turns within a token budget
+        state_manager.history.set_victim_info(st.session_state.victim_info, st.session_state.get('field_confidence', {}))
+        message = state_manager.history.prompt(user_input)
+        # Same prompt (history included) in the same victim state: reuse the previous reply.
+        # Keying on the raw utterance would answer "yes" or "what now?" out of context.
+        cached = shared_cache.get(model_path, message, state=st.session_state.victim_info)
+        logger.info(f"LLM cache: {shared_cache.stats()}")
+        if cached is not None:
+            if stream_responses:
+                # the caller expects streamed replies to be spoken already
+                st.session_state.pop('streamed_json', None)
+                try:
+                    play_audio(cached)
+                except Exception as e:
+                    logger.error(f"Error playing audio: {e}")
+            return cached
+        # Common guidance questions are answered offline from the bundled guides
+        guide = get_guidance_index().answer(user_input)
+        if guide is not None:
+            logger.info(f"Answered from guide {guide.id} (confidence {guide.confidence})")
+            # The guide text has no JSON block: process_json_response extracts from the message instead
+            st.session_state['guide_answered'] = guide.id
+            if stream_responses:
+                st.session_state.pop('streamed_json', None)
+                try:
+                    play_audio(guide.text)
+                except Exception as e:
+                    logger.error(f"Error playing audio: {e}")
+            return guide.text
+        state = copy.deepcopy(st.session_state.victim_info)
+        text = _generate_response(message, user_input, placeholder)
+        if isinstance(text, str):
+            shared_cache.put(model_path, message, text, state=state)
+        return text
+
+
+def _generate_response(message: str, user_input: str, placeholder=None) -> str:
+        # The budgeted history travels with the message, the chat session keeps none of its own
+        chat.history = []
+        if stream_responses:
+            response, text = stream_response(message, placeholder)
+            if text:
+                return text
+        else:
             try:
-                informations_collected = {k: v for k, v in st.session_state.victim_history.items() if v is not None and v != ""}
-                string_informations_collected = ", ".join([f"{k}: {v}" for k, v in informations_collected.items()])
-                response = chat.send_message(f"You already collected my {string_informations_collected}.{user_input}")
-                print(response)
+                with shared_metrics.track('gemini', model_path, 'chat', prompt=message) as call:
+                    response = chat.send_message(message)
+                    call.set_response_usage(response)
             except Exception as e:
                 print(e)
-                response = chat.send_message(user_input)
-        else:
-            response = chat.send_message(user_input)
-            print(response)
+                with shared_metrics.track('gemini', model_path, 'chat', prompt=user_input) as call:
+                    call.retry()
+                    response = chat.send_message(user_input)
+                    call.set_response_usage(response)
         try:
             return response.text
         except AttributeError:
@@ -229,10 +342,38 @@ def generate_response(user_input: str) -> str:
                 for function_name, function_args in function_call.items():
                     return globals()[function_name](**function_args)
 
-       
+
+def stream_response(message: str, placeholder=None):
+    """
+    Streams a chat reply: renders tokens as they arrive, synthesizes complete
+    sentences in the background and parses fenced JSON blocks as soon as they close.
+
+    Returns:
+        The streamed response and its full text (empty if it had no text parts)
+    """
+    speech = SpeechQueue(text_to_speech_elevenlabs)
+    stream = StreamAccumulator(on_sentence=speech.submit)
+    with shared_metrics.track('gemini', model_path, 'chat_stream', prompt=message) as call:
+        response = chat.send_message(message, stream=True)
+        for text in stream_text(response):
+            call.first_token()
+            stream.feed(text)
+            if placeholder is not None:
+                placeholder.markdown(stream.display_text + "▌")
+        call.set_response_usage(response)
+    stream.close()
+    st.session_state['streamed_json'] = stream.json_blocks
+    try:
+        render_audio(speech.audio())
+    except Exception as e:
+        logger.error(f"Error playing audio: {e}")
+    return response, stream.text
+
 
 def generate_manual_response(user_input: str) -> str:
-    response = chat.send_message(user_input)
+    with shared_metrics.track('gemini', model_path, 'manual', prompt=user_input) as call:
+        response = chat.send_message(user_input)
+        call.set_response_usage(response)
     for part in response.candidates[0].content.parts:
         if response.candidates[0].content.parts[0].function_call:
             function_name = response.candidates[0].content.parts[0].function_call.name
@@ -246,7 +387,7 @@ def generate_manual_response(user_input: str) -> str:
 
                 result = globals()[function_name](**function_args_dict)
                 # add to existing instead of replacing
-                st.session_state.victim_info = result
+                st.session_state.victim_info = merge(st.session_state.victim_info, result).document
                 #st.session_state.victim_history = {**st.session_state.victim_history, **result}
 
                 return response.text
@@ -279,7 +420,7 @@ def process_and_upload_victim_info(response: str, schema: Dict[str, Any]):
                 return json_data['message']
             else:
                 # Consider adding JSON validation here
-                st.session_state['victim_info'] = json_data
+                st.session_state['victim_info'] = merge(st.session_state['victim_info'], json_data).document
                 st.session_state['victim_info']['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 logger.info("Victim info updated successfully")
                 return json_str
@@ -290,19 +431,84 @@ def process_and_upload_victim_info(response: str, schema: Dict[str, Any]):
         logger.info("No JSON block found in response.")
         return None  # Explicitly return None
 
-def process_json_response(response: str):
+def apply_fast_extraction(user_input: str) -> bool:
+    """
+    Fills the fields found by the local extractor in the victim's message.
+
+    Returns:
+        bool: Whether the LLM extraction is still needed for this message
+    """
+    extraction = extract_fields(user_input)
+    if extraction.fields:
+        st.session_state['victim_info'] = apply_field_patch(st.session_state['victim_info'], extraction.patch())
+        st.session_state['field_confidence'] = merge_confidence(st.session_state.get('field_confidence'), extraction)
+        logger.info(f"Fast path extracted {sorted(extraction.fields)}, residual: {extraction.residual!r}")
+    return extraction.needs_llm()
+
+
+def submit_extraction(pipeline: TurnPipeline, new_infos: str, needs_llm: bool) -> None:
+    """Adds the extraction (when still needed) and Firebase sync stages of a turn."""
+    if needs_llm:
+        pipeline.submit('extract', extract_victim_info, new_infos, st.session_state['victim_info'],
+                        timeout=STAGE_TIMEOUTS['extract'])
+        pipeline.submit('sync', sync_victim_info, st.session_state['victim_number'],
+                        st.session_state.get('synced_victim_info'), after='extract',
+                        timeout=STAGE_TIMEOUTS['sync'])
+    else:
+        # Everything the victim said was extracted locally: no second LLM call
+        st.session_state['llm_calls_skipped'] = st.session_state.get('llm_calls_skipped', 0) + 1
+        pipeline.submit('sync', sync_victim_info, st.session_state['victim_info'],
+                        st.session_state['victim_number'], st.session_state.get('synced_victim_info'),
+                        timeout=STAGE_TIMEOUTS['sync'])
+
+
+def process_json_response(response: str, speak: bool = True, json_blocks: List[Dict[str, Any]] = None,
+                          user_input: str = None):
+    needs_llm = apply_fast_extraction(user_input) if user_input else True
+    guided = st.session_state.pop('guide_answered', None)
+    # Speech, extraction and the Firebase sync of the extracted data run concurrently
+    pipeline = TurnPipeline()
+    # streamed replies were already spoken sentence by sentence
+    if speak:
+        pipeline.submit('tts', text_to_speech_elevenlabs, response.split('```')[-1],
+                        timeout=STAGE_TIMEOUTS['tts'])
+    message = None
     # check if response is JSON
-    try:
-        play_audio(response)
-    except Exception as e:
-        logger.error(f"Error playing audio: {e}")
     if '```json' in response:
-        if 'message' in json.loads(response.split('```json')[1].split('```')[0]) and len(json.loads(response.split('```json')[1].split('```')[0])) == 1:          
-            return str(response.split('```json')[1].split('```')[0]['message'])
+        if json_blocks is None:
+            stream = StreamAccumulator()
+            stream.feed(response)
+            stream.close()
+            json_blocks = stream.json_blocks
+        if json_blocks and all('message' in block and len(block) == 1 for block in json_blocks):
+            message = str(json_blocks[0]['message'])
         else:
-            try:
-                upload_victim_info(update_victim_json(new_infos=response), schema)
-            except:
-                st.warning("Error updating victim info.")
+            submit_extraction(pipeline, response, needs_llm)
+    elif guided and user_input:
+        # Replies from the offline guides hold no JSON, what the victim said is extracted from the message
+        submit_extraction(pipeline, user_input, needs_llm)
+
+    # Streamlit elements and session state are only touched from the script thread
+    results = pipeline.results()
+    if 'tts' in results:
+        if results['tts'].ok:
+            render_audio(results['tts'].value)
+        else:
+            logger.error(f"Error playing audio: {results['tts'].error or 'timed out'}")
+    if 'extract' in results:
+        if results['extract'].ok:
+            # Fields the model filled are known from now on, even when their value is 0 or False
+            st.session_state['field_confidence'] = record_filled(st.session_state.get('field_confidence'),
+                                                                 st.session_state['victim_info'], results['extract'].value)
+            st.session_state['victim_info'] = results['extract'].value
+            logger.info("Victim info updated successfully")
+        else:
+            st.warning("Error updating victim info.")
+    # A sync skipped because extraction failed is retried by display_victim_info
+    if 'sync' in results and results.get('extract', results['sync']).ok:
+        st.session_state['turn_sync'] = results['sync'].ok
+        if results['sync'].ok:
+            st.session_state['synced_victim_info'] = copy.deepcopy(results['sync'].value)
+    return message
             
 main()
\ No newline at end of file
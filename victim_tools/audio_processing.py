@@ -1,49 +1,90 @@
 # audio_processing.py
 
-from faster_whisper import WhisperModel
 import io
 import numpy as np
 import logging
 import requests
 import os
 import streamlit as st
-import base64
+
+from victim_tools.streaming_transcription import Partial, StreamingTranscriber
+from victim_tools.whisper_service import shared_whisper
 
 logger = logging.getLogger(__name__)
 
-MODEL_SIZE = "large-v2"
-model = None
+# Share of a clip the speech chunks must cover, below it the clip is transcribed whole
+MIN_VAD_COVERAGE = 0.2
+
 
 def load_model():
-    global model
-    if model is None:
-        try:
-            model = WhisperModel(MODEL_SIZE, device="cuda", compute_type="float16")
-            logger.info(f"Loaded Whisper model: {MODEL_SIZE}")
-        except Exception as e:
-            logger.error(f"Error loading Whisper model: {e}")
-            model = WhisperModel(MODEL_SIZE, device="cpu", compute_type="float16")
-            logger.info(f"Loaded Whisper model on CPU: {MODEL_SIZE}")
-    return model
+    """Shared Whisper model, sized for the hardware (see victim_tools.whisper_service)."""
+    return shared_whisper.load()
+
+
+def preload_model():
+    """Starts loading the Whisper model in the background, e.g. at server start."""
+    return shared_whisper.preload()
+
+
+def audio_to_array(audio):
+    """16 kHz float32 samples of an audiorecorder (pydub) clip."""
+    audio_buffer = io.BytesIO()
+    audio.export(audio_buffer, format="wav", parameters=["-ar", str(16000)])
+    return np.frombuffer(audio_buffer.getvalue()[44:], dtype=np.int16).astype(np.float32) / 32768.0
+
 
 def process_audio(audio):
     if audio is not None:
         try:
-            audio_buffer = io.BytesIO()
-            audio.export(audio_buffer, format="wav", parameters=["-ar", str(16000)])
-            audio_array = np.frombuffer(audio_buffer.getvalue()[44:], dtype=np.int16).astype(np.float32) / 32768.0
-
-            model = load_model()
-            segments, _ = model.transcribe(audio_array)
-            text = ' '.join([segment.text for segment in segments])
-            logger.info(f"Transcribed audio: {text[:50]}...")
-            return text
+            audio_array = audio_to_array(audio)
+
+            result = shared_whisper.transcribe(audio_array)
+            logger.info(f"Transcribed audio: {result.text[:50]}... (RTF {result.rtf:.2f})")
+            return result.text
         except Exception as e:
             logger.error(f"Error processing audio: {e}")
             return None
     else:
         return None
-    
+
+
+def process_audio_streaming(audio, on_partial=None, block_s: float = 0.5, min_coverage: float = MIN_VAD_COVERAGE):
+    """
+    Transcribes a clip chunk by chunk (see victim_tools.streaming_transcription),
+    calling on_partial(partial) from the caller's thread as each chunk is ready.
+    The voice activity detector is calibrated on the clip; when its chunks cover
+    less than min_coverage of the clip, or give no text, the whole clip is
+    transcribed in one call instead, so speech it missed is not lost.
+
+    Returns:
+        str: Full transcript, or None if the clip could not be transcribed
+    """
+    if audio is None:
+        return None
+    try:
+        audio_array = audio_to_array(audio)
+        block = int(block_s * 16000)
+        transcriber = StreamingTranscriber(shared_whisper.transcribe)
+        transcriber.vad.calibrate(audio_array)
+        covered = 0.0
+        for partial in transcriber.stream(audio_array[i:i + block] for i in range(0, len(audio_array), block)):
+            logger.info(f"Partial transcript {partial.index} ({partial.start_s:.1f}-{partial.end_s:.1f}s): "
+                        f"{partial.text[:50]}")
+            covered += partial.end_s - partial.start_s
+            if on_partial is not None:
+                on_partial(partial)
+        duration = len(audio_array) / 16000
+        if transcriber.transcript and covered >= min_coverage * duration:
+            return transcriber.transcript
+        logger.info(f"Speech chunks cover {covered:.1f}s of {duration:.1f}s, transcribing the whole clip")
+        result = shared_whisper.transcribe(audio_array)
+        text = result.text.strip()
+        if on_partial is not None and text:
+            on_partial(Partial(0, text, text, 0.0, duration, final=True))
+        return text or transcriber.transcript
+    except Exception as e:
+        logger.error(f"Error processing audio: {e}")
+        return None
 
 
 def text_to_speech_elevenlabs(text):
@@ -73,11 +114,13 @@ def play_audio(text):
         print(text)
         audio_content = text_to_speech_elevenlabs(text)
         # audio_content = text_to_speech_openai(text)
-
-        if audio_content is not None:
-            audio_content = io.BytesIO(audio_content)
-            audio_content.seek(0) 
-            audio_base_64 = base64.b64encode(audio_content.read()).decode("utf-8")
-            st.audio(audio_content, format='audio/mpeg', autoplay=True)
+        render_audio(audio_content)
     except Exception as e:
         print(f'Error :{e}')
+
+def render_audio(audio_content):
+    """Autoplays synthesized MP3 audio, e.g. the joined clips of a streaming.SpeechQueue."""
+    if audio_content is not None:
+        audio_content = io.BytesIO(audio_content)
+        audio_content.seek(0)
+        st.audio(audio_content, format='audio/mpeg', autoplay=True)
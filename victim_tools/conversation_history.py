@@ -0,0 +1,189 @@
+"""
+Token-Budgeted Conversation History
+===================================
+Keeps the prompt history of long conversations bounded. The last turns are kept
+verbatim; older ones are folded into a rolling summary, and what the victim has
+told us is carried by the structured victim_info rather than by old messages.
+The rendered history is maintained as messages are added, so reading it does
+not depend on the length of the conversation.
+
+Token counts are estimated at 4 characters per token, as in vital_data.
+"""
+
+import re
+from collections import deque
+from typing import Any, Callable, Collection, Deque, Dict, List, Optional
+
+from victim_tools.victim_merge import is_blank
+
+# summarizer(summary, folded_messages) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+_FIRST_SENTENCE = re.compile(r"(.+?[.!?])(?:\s|$)", re.S)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def extractive_summary(summary: str, messages: List[Dict[str, str]], max_chars: int = 1200) -> str:
+    """
+    Default summarizer, without a model call: appends the first sentence of each
+    folded message (JSON blocks removed) and keeps the most recent max_chars.
+
+    Example:
+        >>> extractive_summary("", [{"role": "user", "content": "My leg is stuck. It hurts a lot."}])
+        'user: My leg is stuck.'
+    """
+    lines = [summary] if summary else []
+    for message in messages:
+        text = message['content'].split('```')[0].strip()
+        match = _FIRST_SENTENCE.match(text)
+        text = " ".join((match.group(1) if match else text).split())
+        if text:
+            lines.append(f"{message['role']}: {text[:200]}")
+    summary = "\n".join(lines)
+    if len(summary) > max_chars:
+        summary = summary[-max_chars:].split("\n", 1)[-1]
+    return summary
+
+
+def known_facts(victim_info: Dict[str, Any], filled: Optional[Collection[str]] = None) -> str:
+    """
+    Non-blank fields of a victim document, one 'path: value' per line.
+
+    Args:
+        victim_info: Victim document, with or without the top-level 'victim_info' key
+        filled: Dotted paths of the fields known to be filled (e.g. the keys of
+            field_confidence); other fields hold template defaults such as 0 or False.
+            Without it every non-blank field is listed.
+
+    Example:
+        >>> document = {'victim_info': {'personal_info': {'name': 'Ana', 'age': 0}, 'medical_info': {'injuries': ['leg']}}}
+        >>> known_facts(document, filled={'victim_info.personal_info.name', 'victim_info.medical_info.injuries'})
+        'personal_info.name: Ana\\nmedical_info.injuries: leg'
+        >>> known_facts(document)
+        'personal_info.name: Ana\\npersonal_info.age: 0\\nmedical_info.injuries: leg'
+    """
+    lines = []
+
+    def walk(node, path):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                walk(value, f"{path}.{key}" if path else key)
+        elif not is_blank(node) and (filled is None or f"victim_info.{path}" in filled):
+            value = ", ".join(str(item) for item in node if not is_blank(item)) if isinstance(node, list) else node
+            lines.append(f"{path}: {value}")
+
+    walk(victim_info.get('victim_info', victim_info), "")
+    return "\n".join(lines)
+
+
+class ConversationHistory:
+    """
+    Conversation history with a token budget.
+
+    The last keep_turns turns (user and assistant messages) stay verbatim as long
+    as they fit in max_tokens; older messages are folded into the summary. Folding
+    happens in batches, so the summarizer (possibly a model call) runs rarely.
+
+    Attributes:
+        summary: Rolling summary of the folded messages
+        facts: Known victim_info fields, see set_victim_info
+
+    Example:
+        >>> history = ConversationHistory(max_tokens=40, keep_turns=1)
+        >>> for text in ("I am trapped.", "Where are you?", "Under a bridge. Please hurry.", "Help is coming."):
+        ...     history.add("user" if text[0] in "IU" else "assistant", text)
+        >>> print(history.rendered)
+        Summary of earlier conversation:
+        user: I am trapped.
+        assistant: Where are you?
+        <BLANKLINE>
+        user: Under a bridge. Please hurry.
+        assistant: Help is coming.
+    """
+
+    def __init__(self, max_tokens: int = 1200, keep_turns: int = 6, summary_chars: int = 1200,
+                 summarizer: Optional[Summarizer] = None):
+        self.max_tokens = max_tokens
+        self.keep_messages = 2 * keep_turns
+        self.summary_chars = summary_chars
+        self.summarizer = summarizer
+        self.clear()
+
+    def add(self, role: str, content: str) -> None:
+        message = {"role": role, "content": content}
+        line = f"{role}: {content}"
+        self._recent.append(message)
+        self._recent_lines.append(line)
+        self._recent_tokens += estimate_tokens(line)
+        self._recent_text = f"{self._recent_text}\n{line}" if self._recent_text else line
+        if len(self._recent) > self.keep_messages or self._recent_tokens > self.max_tokens:
+            self._fold()
+        self._rendered = None
+
+    def set_victim_info(self, victim_info: Dict[str, Any], filled: Optional[Collection[str]] = None) -> None:
+        """Updates the known facts rendered with the history (see known_facts for filled)."""
+        facts = known_facts(victim_info, filled)
+        if facts != self.facts:
+            self.facts = facts
+            self._rendered = None
+
+    def clear(self) -> None:
+        self.summary = ""
+        self.facts = ""
+        self._recent: Deque[Dict[str, str]] = deque()
+        self._recent_lines: Deque[str] = deque()
+        self._recent_tokens = 0
+        self._recent_text = ""
+        self._rendered: Optional[str] = ""
+
+    @property
+    def rendered(self) -> str:
+        """Summary, known facts and recent messages, as sent to the model. Cached between changes."""
+        if self._rendered is None:
+            self._rendered = self._render(self._recent_text)
+        return self._rendered
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.rendered)
+
+    def prompt(self, user_input: str) -> str:
+        """
+        Message for the model: the history before user_input, then user_input.
+        The latest message is left out of the history when it is user_input.
+        """
+        recent = self._recent_text
+        if self._recent and self._recent[-1] == {"role": "user", "content": user_input}:
+            recent = recent[:len(recent) - len(self._recent_lines[-1])].rstrip("\n")
+        history = self._render(recent)
+        if not history:
+            return user_input
+        return f"Conversation so far:\n{history}\n\nLatest message from the victim: {user_input}"
+
+    def _render(self, recent: str) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        if self.facts:
+            parts.append(f"Information already collected:\n{self.facts}")
+        if recent:
+            parts.append(recent)
+        return "\n\n".join(parts)
+
+    def _fold(self) -> None:
+        # Fold down to half the budget, so the next fold is several messages away
+        keep = max(1, self.keep_messages // 2)
+        folded = []
+        while len(self._recent) > 1 and (len(self._recent) > keep or self._recent_tokens > self.max_tokens // 2):
+            folded.append(self._recent.popleft())
+            self._recent_tokens -= estimate_tokens(self._recent_lines.popleft())
+        if not folded:
+            return
+        self._recent_text = "\n".join(self._recent_lines)
+        if self.summarizer is not None:
+            self.summary = self.summarizer(self.summary, folded)
+        else:
+            self.summary = extractive_summary(self.summary, folded, self.summary_chars)
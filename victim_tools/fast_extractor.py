@@ -0,0 +1,434 @@
+"""
+Fast Field Extractor
+====================
+Deterministic extraction of victim fields that need no LLM: age, blood type,
+phone numbers and email, name, trapped, injuries, pain level, group size,
+dependents, mobility, medical conditions, allergies, needs, hazards and the
+disaster type.
+
+Every field comes with a confidence score. The text not explained by any match
+is returned as residual, so the LLM extraction only runs when a message holds
+more than these fields. Patterns are compiled once at import; keyword lists are
+compiled into single alternations so each message is scanned once per field.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'fifteen': 15, 'twenty': 20,
+    'a couple of': 2, 'a few': 3,
+}
+_NUMBER = r"(\d{1,3}|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+
+BODY_PARTS = (
+    'head', 'neck', 'back', 'spine', 'chest', 'rib', 'ribs', 'arm', 'arms', 'hand', 'hands',
+    'wrist', 'shoulder', 'leg', 'legs', 'knee', 'ankle', 'foot', 'feet', 'hip', 'pelvis',
+    'stomach', 'abdomen', 'eye', 'eyes', 'face',
+)
+INJURY_WORDS = (
+    'broken', 'broke', 'fractured', 'injured', 'hurt', 'cut', 'burned', 'burnt',
+    'sprained', 'dislocated', 'crushed', 'bleeding', 'bruised',
+)
+# Injuries named without a body part
+INJURY_KEYWORDS = {
+    'bleeding': 'bleeding', 'unconscious': 'unconscious', 'concussion': 'concussion',
+    'burns': 'burns', 'fracture': 'fracture', 'head injury': 'head injury',
+    'can\'t breathe': 'breathing difficulty', 'cannot breathe': 'breathing difficulty',
+    'hard to breathe': 'breathing difficulty', 'short of breath': 'breathing difficulty',
+    'hypothermia': 'hypothermia', 'dehydrated': 'dehydration',
+}
+MEDICAL_CONDITIONS = {
+    'diabetes': 'diabetes', 'diabetic': 'diabetes', 'asthma': 'asthma', 'asthmatic': 'asthma',
+    'epilepsy': 'epilepsy', 'epileptic': 'epilepsy', 'pregnant': 'pregnancy',
+    'heart condition': 'heart condition', 'heart problem': 'heart condition',
+    'high blood pressure': 'hypertension', 'hypertension': 'hypertension', 'copd': 'COPD',
+    'dialysis': 'kidney failure',
+}
+DISASTER_TYPES = {
+    'earthquake': 'earthquake', 'quake': 'earthquake', 'aftershock': 'earthquake',
+    'flood': 'flood', 'flooding': 'flood', 'wildfire': 'wildfire', 'fire': 'fire',
+    'hurricane': 'hurricane', 'tornado': 'tornado', 'tsunami': 'tsunami',
+    'landslide': 'landslide', 'mudslide': 'landslide', 'avalanche': 'avalanche',
+    'explosion': 'explosion',
+}
+NEEDS = {
+    'water': 'water', 'food': 'food', 'medicine': 'medicine', 'medication': 'medicine',
+    'insulin': 'insulin', 'oxygen': 'oxygen', 'blanket': 'blankets', 'blankets': 'blankets',
+    'doctor': 'medical help', 'ambulance': 'medical help', 'medical help': 'medical help',
+    'shelter': 'shelter', 'light': 'light', 'help': 'rescue',
+}
+HAZARDS = {
+    'gas leak': 'gas leak', 'smell gas': 'gas leak', 'smell of gas': 'gas leak',
+    'smoke': 'smoke', 'fire': 'fire', 'live wire': 'live wires', 'live wires': 'live wires',
+    'power lines': 'downed power lines', 'rising water': 'rising water',
+    'water is rising': 'rising water', 'collapsing': 'unstable structure',
+    'collapsed': 'unstable structure', 'aftershocks': 'aftershocks', 'debris': 'debris',
+}
+
+# Words that carry no information for the residual check
+FILLER_WORDS = frozenset("""
+a an the and or but so i i'm im me my we we're us our you your it it's is are am was were be been
+have has had do does did can could will would please help hello hi hey yes no not okay ok oh
+um uh just very really also too here there this that with of in on at to for from by about
+right now still some any know think got get been am
+""".split())
+
+_NEGATION = re.compile(r"\b(?:not|no|no longer|never|without|isn't|isnt|aren't|arent|wasn't|wasnt|"
+                       r"don't|dont|doesn't|doesnt|didn't|didnt|i'm not|not really)\s+(?:\w+\s+){0,2}$")
+RELATIONS = (
+    'wife', 'husband', 'partner', 'boyfriend', 'girlfriend', 'mother', 'mom', 'mum', 'father', 'dad',
+    'son', 'daughter', 'baby', 'child', 'kid', 'kids', 'children', 'brother', 'sister', 'grandmother',
+    'grandma', 'grandfather', 'grandpa', 'uncle', 'aunt', 'cousin', 'friend', 'neighbor', 'neighbour',
+)
+_FIRST_PERSON = re.compile(r"\b(?:i|i'm|im|i've|me|myself)\b|\bmy\b(?!\s+(?:" + "|".join(RELATIONS) + r")\b)")
+_THIRD_PERSON = re.compile(r"\b(?:he|she|they|him|his|her|them|their|he's|she's|they're)\b|"
+                           r"\b(?:my|our|a|the)\s+(?:" + "|".join(RELATIONS) + r")\b")
+# Fields found by keyword alone: the context may still negate them ("the fire is out")
+KEYWORD_FIELDS = ('victim_info.situation.nearby_hazards', 'victim_info.situation.disaster_type')
+
+
+def _keywords(words) -> "re.Pattern":
+    """Compiles keywords into one alternation, longest first so phrases win over their words."""
+    return re.compile(r"\b(" + "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)) + r")\b")
+
+
+_AGE = [
+    (re.compile(r"\b(\d{1,3})\s*(?:years?|yrs?|y/o|yo)(?:[\s-]*old)?\b"), 0.95),
+    (re.compile(r"\b(?:age|aged)\s*(?:is\s*)?(\d{1,3})\b"), 0.95),
+    (re.compile(r"\b(?:i am|i'm|im)\s+(\d{1,3})\b(?!\s*(?:%|percent|people|of us|kids|children|minutes|hours|meters|feet|floors?))"), 0.55),
+]
+_BLOOD_TYPE = [
+    (re.compile(r"\bblood(?:\s*type|\s*group)?\s*(?:is\s*)?(ab|a|b|o)\s*(positive|negative|pos|neg|\+|-)?(?!\w)"), 0.95),
+    # Without "blood", only "type o+" or "o+ blood": a bare "a -" or "b positive" is too common
+    (re.compile(r"\btype\s*(ab|a|b|o)\s*(positive|negative|pos|neg|\+|-)(?!\w)"), 0.75),
+    (re.compile(r"(?<!\w)(ab|a|b|o)\s*(positive|negative|\+|-)\s*(?:type\s*)?blood\b"), 0.75),
+]
+_PHONE = re.compile(r"(?<![\w+])(\+?\d[\d\s().-]{5,}\d)(?!\w)")
+_PHONE_CONTEXT = re.compile(r"\b(?:phone|number|cell|mobile|call|reach|contact|text)\b")
+# "4500-4600" or "1990 - 2000" are ranges, not phone numbers
+_RANGE = re.compile(r"(\d+)\s*-\s*(\d+)")
+_EMAIL = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+_NAME = re.compile(r"\b(?:my name is|my name's|i am called|i'm called)\s+([a-z][a-z'-]+(?:\s+[a-z][a-z'-]+)?)")
+_CONTACT = re.compile(r"\b(?:my\s+)?(wife|husband|mother|mom|father|dad|son|daughter|brother|sister|"
+                      r"partner|friend|neighbou?r)(?:'s)?\s+(?:number|phone|cell)?\s*(?:is\s*)?$")
+_TRAPPED = _keywords(('trapped', 'stuck', 'pinned', 'buried', 'can\'t get out', 'cannot get out',
+                      'can\'t escape', 'under the rubble', 'under rubble'))
+# Units after a number that is a distance, a height or a time rather than a count or a score
+_NO_UNIT = (r"(?!\s*(?:years?|yrs?|months?|weeks?|days?|hours?|hrs?|minutes?|mins?|seconds?|secs?|"
+            r"floors?|stor(?:e?y|ies|eys)|levels?|blocks?|steps?|stairs|meters?|metres?|m|km|"
+            r"kilometers?|kilometres?|miles?|feet|foot|ft|yards?|%|percent)\b)")
+_PAIN_WORD = r"\b(?:pain|painful|hurts?|hurting|aches?)\b"
+_PAIN = [
+    (re.compile(_PAIN_WORD + r"[^.!?\d]{0,25}?(\d{1,2})\s*(?:/|out of)\s*10\b"), 0.9),
+    (re.compile(r"\b(\d{1,2})\s*(?:/|out of)\s*10\b[^.!?\d]{0,15}?" + _PAIN_WORD), 0.85),
+    (re.compile(r"\bpain(?:\s*level)?\s*(?:is\s*)?(?:at\s*|about\s*|around\s*)?(\d{1,2})\b(?!\s*(?:/|out of))" + _NO_UNIT), 0.8),
+    # A number somewhere after "pain" without a scale may be a duration or a count
+    (re.compile(r"\bpain\b[^.!?\d]{0,25}?(\d{1,2})\b(?!\s*(?:/|out of))" + _NO_UNIT), 0.5),
+]
+_PAIN_WORDS = [
+    (re.compile(r"\b(?:excruciating|unbearable|extreme|severe|terrible)\s+pain\b|\bhurts? (?:so|really) (?:bad|much)\b"), 8),
+    (re.compile(r"\b(?:moderate)\s+pain\b"), 5),
+    (re.compile(r"\b(?:mild|slight|little|minor)\s+pain\b"), 2),
+]
+_GROUP = [
+    (re.compile(r"\bthere (?:are|is)\s+" + _NUMBER + r"\s+of us\b"), 0.9),
+    (re.compile(r"\bwe are\s+" + _NUMBER + r"\b" + _NO_UNIT), 0.8),
+    (re.compile(r"\b" + _NUMBER + r"\s+of us\b"), 0.75),
+    (re.compile(r"\b" + _NUMBER + r"\s+(?:people|persons)\b"), 0.55),
+]
+_ALONE = re.compile(r"\b(?:i'm|i am|im)\s+(?:all\s+)?alone\b|\bby myself\b")
+_DEPENDENTS = re.compile(r"\b" + _NUMBER + r"\s+(?:kids|children|babies|toddlers|infants)\b|\b(?:my|a)\s+(baby|child|kid|toddler)\b")
+_IMMOBILE = _keywords(('can\'t walk', 'cannot walk', 'can\'t move', 'cannot move', 'unable to walk',
+                       'unable to move', 'paralyzed', 'paralysed', 'wheelchair'))
+_MOBILE = _keywords(('i can walk', 'able to walk', 'i can move', 'walking fine'))
+_INJURY = re.compile(r"\b(" + "|".join(INJURY_WORDS) + r")\s+(?:my\s+|his\s+|her\s+|the\s+)?(left\s+|right\s+)?("
+                     + "|".join(BODY_PARTS) + r")\b")
+_INJURY_AFTER = re.compile(r"\b(?:my\s+)?(left\s+|right\s+)?(" + "|".join(BODY_PARTS) + r")\s+(?:is|are|was|feels|looks)?\s*("
+                           + "|".join(INJURY_WORDS) + r")\b")
+_INJURY_KEYWORDS = _keywords(INJURY_KEYWORDS)
+_CONDITIONS = _keywords(MEDICAL_CONDITIONS)
+_ALLERGY = re.compile(r"\ballergic to\s+([a-z][a-z ,-]{1,40}?)(?=[.!?;]|$)")
+_DISASTER = _keywords(DISASTER_TYPES)
+_NEEDS = re.compile(r"\b(?:need|needs|needed|want|out of|no|running out of|ran out of)\s+(?:some\s+|more\s+|an?\s+)?("
+                    + "|".join(re.escape(word) for word in sorted(NEEDS, key=len, reverse=True)) + r")\b")
+_HAZARDS = _keywords(HAZARDS)
+
+
+@dataclass
+class Extraction:
+    """
+    Result of extract_fields.
+
+    Attributes:
+        fields: Values by dotted victim_info path
+        confidence: Confidence (0-1) of every extracted field
+        residual: Text left once matched spans and filler words are removed
+        spans: (start, end) of every match in the normalized text
+    """
+    fields: Dict[str, Any] = field(default_factory=dict)
+    confidence: Dict[str, float] = field(default_factory=dict)
+    residual: str = ""
+    spans: List[Tuple[int, int]] = field(default_factory=list)
+
+    def needs_llm(self, min_residual_words: int = 3, threshold: float = 0.6) -> bool:
+        """
+        Whether the LLM should still read the message: when nothing was extracted
+        (short answers like "yes" only make sense in context), when it holds at
+        least min_residual_words informative words no pattern explained, or when a
+        field was extracted with a confidence below threshold. Hazards and the
+        disaster type alone are keyword matches, which the LLM confirms.
+
+        Example:
+            >>> extract_fields("no fire here").fields, extract_fields("i dont smell gas").fields
+            ({}, {})
+            >>> extract_fields("there is a gas leak").needs_llm()
+            True
+        """
+        if not self.fields or all(path in KEYWORD_FIELDS for path in self.fields):
+            return True
+        if any(value < threshold for value in self.confidence.values()):
+            return True
+        return len(self.residual.split()) >= min_residual_words
+
+    def patch(self) -> Dict[str, Any]:
+        """Fields as a patch for vital_data.apply_field_patch."""
+        return dict(self.fields)
+
+    def _set(self, path: str, value: Any, confidence: float, span: Tuple[int, int]) -> None:
+        # Keeps the most confident value of a scalar field, merges list fields
+        self.spans.append(span)
+        if isinstance(value, list):
+            existing = self.fields.setdefault(path, [])
+            existing.extend(item for item in value if item not in existing)
+            self.confidence[path] = max(self.confidence.get(path, 0.0), confidence)
+        elif confidence > self.confidence.get(path, 0.0):
+            self.fields[path] = value
+            self.confidence[path] = confidence
+
+
+def normalize_text(text: str) -> str:
+    """Lowercases and unifies apostrophes so the patterns can stay simple."""
+    return str(text).replace("’", "'").replace("‘", "'").lower()
+
+
+def extract_fields(text: str) -> Extraction:
+    """
+    Extracts victim fields from a message without calling a model.
+
+    Args:
+        text: Victim message, typed or transcribed
+
+    Returns:
+        Extraction: Fields by dotted path with confidences, and the residual text
+
+    Example:
+        >>> result = extract_fields("I'm 34 years old, trapped under rubble and my left leg is broken")
+        >>> result.fields['victim_info.personal_info.age'], result.fields['victim_info.situation.trapped']
+        (34, True)
+        >>> result.fields['victim_info.medical_info.injuries']
+        ['broken left leg']
+        >>> result.needs_llm()
+        False
+    """
+    text = normalize_text(text)
+    result = Extraction()
+
+    for pattern, confidence in _AGE:
+        for match in pattern.finditer(text):
+            age = int(match.group(1))
+            if 0 < age <= 120 and not _about_other(text, match.start()):
+                result._set('victim_info.personal_info.age', age, confidence, match.span())
+
+    for pattern, confidence in _BLOOD_TYPE:
+        for match in pattern.finditer(text):
+            if _about_other(text, match.start()):
+                continue
+            group, sign = match.group(1), match.group(2)
+            if sign is None:
+                result._set('victim_info.medical_info.blood_type', group.upper(), confidence - 0.2, match.span())
+            else:
+                sign = '+' if sign in ('positive', 'pos', '+') else '-'
+                result._set('victim_info.medical_info.blood_type', group.upper() + sign, confidence, match.span())
+
+    _extract_contacts(text, result)
+
+    match = _NAME.search(text)
+    if match:
+        result._set('victim_info.personal_info.name', match.group(1).title(), 0.85, match.span())
+
+    for match in _TRAPPED.finditer(text):
+        if _about_other(text, match.start()):
+            continue
+        if not _negated(text, match.start()):
+            result._set('victim_info.situation.trapped', True, 0.9, match.span())
+        else:
+            result.spans.append(match.span())
+
+    for pattern, confidence in _PAIN:
+        for match in pattern.finditer(text):
+            level = int(match.group(1))
+            if 0 <= level <= 10 and not _about_other(text, match.start()):
+                result._set('victim_info.medical_info.pain_level', level, confidence, match.span())
+    for pattern, level in _PAIN_WORDS:
+        for match in pattern.finditer(text):
+            if not _about_other(text, match.start()):
+                result._set('victim_info.medical_info.pain_level', level, 0.6, match.span())
+
+    for pattern, confidence in _GROUP:
+        for match in pattern.finditer(text):
+            result._set('victim_info.social_info.group_size', _number(match.group(1)), confidence, match.span())
+    for match in _ALONE.finditer(text):
+        result._set('victim_info.social_info.group_size', 1, 0.9, match.span())
+
+    for match in _DEPENDENTS.finditer(text):
+        count = _number(match.group(1)) if match.group(1) else 1
+        result._set('victim_info.social_info.dependents', count, 0.7, match.span())
+
+    for match in _IMMOBILE.finditer(text):
+        if not _negated(text, match.start()) and not _about_other(text, match.start()):
+            result._set('victim_info.situation.mobility', 'immobile', 0.8, match.span())
+    for match in _MOBILE.finditer(text):
+        if not _negated(text, match.start()) and not _about_other(text, match.start()):
+            result._set('victim_info.situation.mobility', 'mobile', 0.75, match.span())
+
+    for match in _INJURY.finditer(text):
+        if _about_other(text, match.start()):
+            continue
+        injury = f"{_injury_word(match.group(1))} {(match.group(2) or '')}{match.group(3)}"
+        result._set('victim_info.medical_info.injuries', [injury], 0.8, match.span())
+    for match in _INJURY_AFTER.finditer(text):
+        # From the body part, so a leading "my" counts as the subject
+        if _about_other(text, match.start(2)):
+            continue
+        injury = f"{_injury_word(match.group(3))} {(match.group(1) or '')}{match.group(2)}"
+        result._set('victim_info.medical_info.injuries', [injury], 0.8, match.span())
+    for match in _INJURY_KEYWORDS.finditer(text):
+        if not _negated(text, match.start()) and not _inside(match.span(), result.spans) \
+                and not _about_other(text, match.start()):
+            result._set('victim_info.medical_info.injuries', [INJURY_KEYWORDS[match.group(1)]], 0.75, match.span())
+
+    for match in _CONDITIONS.finditer(text):
+        if not _negated(text, match.start()) and not _about_other(text, match.start()):
+            result._set('victim_info.medical_info.medical_conditions',
+                        [MEDICAL_CONDITIONS[match.group(1)]], 0.8, match.span())
+
+    for match in _ALLERGY.finditer(text):
+        if _about_other(text, match.start()):
+            continue
+        allergies, end = [], match.start(1)
+        # Stops at the first item that is not a short noun phrase ("... and i'm trapped")
+        for item in re.split(r"(,|\band\b|\bor\b)", match.group(1)):
+            if item in (',', 'and', 'or') or not item.strip():
+                end += len(item)
+                continue
+            if len(item.split()) > 2:
+                break
+            allergies.append(item.strip())
+            end += len(item)
+        if allergies:
+            result._set('victim_info.medical_info.allergies', allergies, 0.9, (match.start(), end))
+
+    for match in _NEEDS.finditer(text):
+        result._set('victim_info.situation.immediate_needs', [NEEDS[match.group(1)]], 0.75, match.span())
+
+    for match in _HAZARDS.finditer(text):
+        if not _negated(text, match.start()):
+            result._set('victim_info.situation.nearby_hazards', [HAZARDS[match.group(1)]], 0.7, match.span())
+
+    for match in _DISASTER.finditer(text):
+        if not _negated(text, match.start()):
+            result._set('victim_info.situation.disaster_type', DISASTER_TYPES[match.group(1)], 0.85, match.span())
+
+    result.residual = _residual(text, result.spans)
+    return result
+
+
+def _extract_contacts(text: str, result: Extraction) -> None:
+    match = _EMAIL.search(text)
+    if match:
+        result._set('victim_info.contact_info.email', match.group(0), 0.95, match.span())
+    for match in _PHONE.finditer(text):
+        digits = re.sub(r"\D", "", match.group(1))
+        if not 7 <= len(digits) <= 15 or _is_range(match.group(1)):
+            continue
+        phone = ('+' if match.group(1).startswith('+') else '') + digits
+        contact = _CONTACT.search(text, max(0, match.start() - 40), match.start())
+        if contact:
+            result._set('victim_info.contact_info.emergency_contact.phone', phone, 0.85, match.span())
+            result._set('victim_info.contact_info.emergency_contact.relationship',
+                        contact.group(1), 0.85, contact.span())
+        elif not _about_other(text, match.start()):
+            # Long digit runs without "phone", "number" or "call" may be addresses or codes
+            context = _PHONE_CONTEXT.search(text, max(0, match.start() - 40), match.start())
+            result._set('victim_info.contact_info.phone', phone, 0.85 if context else 0.55, match.span())
+
+
+def _is_range(number: str) -> bool:
+    """
+    Whether a matched number is two same-length numbers joined by a hyphen.
+
+    Example:
+        >>> _is_range("4500-4600"), _is_range("555-1234"), _is_range("415-555-1234")
+        (True, False, False)
+    """
+    match = _RANGE.fullmatch(number.strip())
+    return bool(match) and len(match.group(1)) == len(match.group(2))
+
+
+def _number(word: str) -> int:
+    return int(word) if word.isdigit() else NUMBER_WORDS[word]
+
+
+def _injury_word(word: str) -> str:
+    return {'broke': 'broken', 'fractured': 'broken', 'burnt': 'burned'}.get(word, word)
+
+
+def _negated(text: str, start: int) -> bool:
+    return bool(_NEGATION.search(text, max(0, start - 30), start))
+
+
+def _about_other(text: str, start: int) -> bool:
+    """
+    Whether the closest subject before start, in the same sentence, is someone
+    else ("my daughter is 4", "his number is ..."). Facts about other people are
+    left to the LLM rather than recorded as the victim's.
+
+    Example:
+        >>> text = "i'm trapped and my son is bleeding"
+        >>> _about_other(text, text.index('trapped')), _about_other(text, text.index('bleeding'))
+        (False, True)
+    """
+    sentence = max(text.rfind(mark, 0, start) for mark in '.!?;') + 1
+    window = text[max(sentence, start - 60):start]
+    other = max((match.end() for match in _THIRD_PERSON.finditer(window)), default=-1)
+    return other > max((match.end() for match in _FIRST_PERSON.finditer(window)), default=-1)
+
+
+def _inside(span: Tuple[int, int], spans: List[Tuple[int, int]]) -> bool:
+    return any(start <= span[0] and span[1] <= end for start, end in spans)
+
+
+def _residual(text: str, spans: List[Tuple[int, int]]) -> str:
+    """Text outside of the matched spans, without filler words."""
+    kept, position = [], 0
+    for start, end in sorted(spans):
+        if start > position:
+            kept.append(text[position:start])
+        position = max(position, end)
+    kept.append(text[position:])
+    words = re.findall(r"[a-z0-9']+", " ".join(kept))
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+def merge_confidence(confidence: Optional[Dict[str, float]], extraction: Extraction) -> Dict[str, float]:
+    """
+    Combines known field confidences with those of a new extraction, keeping
+    the highest confidence of every field.
+    """
+    merged = dict(confidence or {})
+    for path, value in extraction.confidence.items():
+        merged[path] = max(merged.get(path, 0.0), value)
+    return merged
@@ -0,0 +1,349 @@
+"""
+Offline Emergency Guidance
+==========================
+Answers common guidance questions (bleeding, gas leaks, aftershocks...) from a
+bundled corpus of emergency procedures (configs/emergency_guides.json), without
+a model call or a network connection.
+
+Guides are ranked with BM25. The index is precomputed once per corpus version
+and stored next to the corpus as numpy arrays (compressed sparse rows of BM25
+weights by term), which are memory-mapped when loaded, so a query costs one
+lookup per query term. An optional sentence embedding model
+(guidance_embedding_model, needs sentence-transformers) adds semantic matches
+for questions worded unlike the guides.
+
+A guide is only returned for questions asking for guidance that neither ask for
+rescue nor report facts about the victim, and only when the retrieval confidence
+reaches guidance_min_confidence (default 0.5); other messages go to the model.
+
+Usage:
+    python -m victim_tools.guidance_index "my friend is bleeding a lot, what do I do?"
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from victim_tools.fast_extractor import extract_fields
+
+logger = logging.getLogger(__name__)
+
+GUIDES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "configs", "emergency_guides.json")
+MIN_CONFIDENCE = float(os.getenv('guidance_min_confidence', 0.5))
+# Minimum cosine similarity for a match found by the embedding model alone
+MIN_SIMILARITY = 0.6
+# BM25 parameters; title and keywords count TITLE_BOOST times
+K1 = 1.2
+B = 0.75
+TITLE_BOOST = 2
+
+# embedder(texts) -> one normalized vector per text
+Embedder = Callable[[List[str]], np.ndarray]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# A question mark alone is not enough: "are you still there?" or "did you get that?" need the model
+_QUESTION = re.compile(
+    r"^\s*(how|what|where|when|should|can|could|is it|is there|do i|do we|tell me|explain)\b|"
+    r"\b(what|how) (do|should|can|could|must) (i|we)\b|\bwhat to do\b|\bhow to\b|\bshould (i|we)\b|"
+    r"\bis it safe\b|\bwhat if\b",
+    re.I)
+# Requests for rescue and questions about it go to the model, which also alerts the team
+_RESCUE = re.compile(
+    r"\b(send (someone|somebody|help|a team|an ambulance|rescue)|rescue|save (me|us)|get (me|us) out|"
+    r"(is|are) (anyone|anybody|someone|somebody|help|you|they) coming|where are (you|they)|"
+    r"when (will|are|is) (you|they|help|someone|somebody|the team)|how long (until|till|before|will)|"
+    r"come (and )?(get|help|find|save)|please come|hurry)\b",
+    re.I)
+# Life-threatening symptoms and the guides that answer them: a question naming one
+# is only answered by these guides, any other match goes to the model
+LIFE_THREATS = [
+    (re.compile(r"\b(not|isn't|isnt|stopped|no longer|can't|cant|cannot) breath(e|ing)\b|\bno pulse\b|"
+                r"\b(no|without a) heart ?beat\b|\bheart (has )?stopped\b", re.I), ('cpr',)),
+    (re.compile(r"\b(unconscious|unresponsive|passed out|not responding|won't wake|wont wake|"
+                r"not waking)\b", re.I), ('cpr', 'recovery_position')),
+]
+# Fields describing the victim rather than the subject of a question ("bleeding", "gas leak");
+# messages stating them report a situation the model should take into account
+REPORTED_FIELDS = tuple(f"victim_info.{field}" for field in (
+    'personal_info.', 'contact_info.', 'social_info.', 'medical_info.blood_type', 'medical_info.pain_level',
+    'medical_info.allergies', 'situation.trapped', 'situation.mobility'))
+STOPWORDS = frozenset(
+    "a about after again all am an and any are as at be been before being but by can could did do does doing "
+    "don for from get got had has have having he her here him his how i if im in into is it its just me more "
+    "most my myself nor now of off on once only or other our out over own please right same she should "
+    "so some still such than that the their them then there these they this those through to too under until "
+    "up us very was we were what when where which while who why will with would you your yours tell help know "
+    "need want think going go treat treating stop deal handle happen happens someone somebody long".split())
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix stripping, so 'bleeding', 'bleeds' and 'bleed' share a term.
+
+    Example:
+        >>> [stem(word) for word in ('bleeding', 'leaks', 'injuries', 'burned', 'gas')]
+        ['bleed', 'leak', 'injury', 'burn', 'gas']
+    """
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 5 and word.endswith('ing'):
+        return word[:-3]
+    if len(word) > 4 and word.endswith('ed'):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Stemmed terms of a text, stopwords removed."""
+    return [stem(word) for word in _TOKEN.findall(text.lower().replace("'", "")) if word not in STOPWORDS]
+
+
+def is_guidance_question(text: str) -> bool:
+    """
+    Whether a message only asks for guidance: it asks how to handle something,
+    and neither asks for rescue nor reports facts about the victim.
+
+    Example:
+        >>> is_guidance_question("I smell gas, what should I do?"), is_guidance_question("I am 34 and my leg is stuck")
+        (True, False)
+        >>> is_guidance_question("Are you still there?"), is_guidance_question("What should I do, is anyone coming?")
+        (False, False)
+        >>> is_guidance_question("How do I stop the bleeding? We are 3 and I'm trapped")
+        False
+    """
+    if not _QUESTION.search(text) or _RESCUE.search(text):
+        return False
+    return not any(path.startswith(REPORTED_FIELDS) for path in extract_fields(text).fields)
+
+
+@dataclass
+class GuideMatch:
+    """A guide answering a question, with the retrieval confidence (0 to 1)."""
+    id: str
+    title: str
+    text: str
+    score: float
+    confidence: float
+
+
+class GuidanceIndex:
+    """
+    BM25 index of the emergency guides.
+
+    The index files (<corpus>.index/) are rebuilt when the corpus changes and
+    memory-mapped otherwise.
+
+    Args:
+        guides_path: JSON list of guides with id, title, keywords and text
+        index_dir: Directory of the index files, defaults to guidance_index_dir or <guides_path>.index
+        embedder: Optional sentence embedding function for semantic matches
+        embedder_name: Name of the embedding model, part of its index file name
+
+    Example:
+        >>> import tempfile
+        >>> index = GuidanceIndex(index_dir=tempfile.mkdtemp())
+        >>> match = index.search("There is a strong smell of gas in the kitchen, what do I do?")
+        >>> match.id, match.confidence >= MIN_CONFIDENCE
+        ('gas_leak', True)
+        >>> index.answer("My name is Ana and I am 34") is None
+        True
+    """
+
+    def __init__(self, guides_path: str = GUIDES_PATH, index_dir: Optional[str] = None,
+                 embedder: Optional[Embedder] = None, embedder_name: str = "embedder"):
+        with open(guides_path, 'rb') as f:
+            raw = f.read()
+        self.guides = json.loads(raw)
+        self.version = hashlib.sha1(raw).hexdigest()[:16]
+        self.index_dir = index_dir or os.getenv('guidance_index_dir') or guides_path + ".index"
+        self.embedder = embedder
+        self._load_or_build()
+        self.embeddings = self._load_embeddings(embedder_name) if embedder else None
+
+    def search(self, question: str) -> Optional[GuideMatch]:
+        """Best guide for a question, or None when no guide shares a term with it."""
+        terms = tokenize(question)
+        scores = np.zeros(len(self.guides), dtype=np.float32)
+        rows = [self.vocabulary[term] for term in dict.fromkeys(terms) if term in self.vocabulary]
+        for row in rows:
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            scores[self.postings[start:stop]] += self.weights[start:stop]
+        best, confidence = int(np.argmax(scores)), 0.0
+        if rows:
+            confidence = self._coverage(terms, best)
+        if self.embeddings is not None and terms:
+            similarities = self.embeddings @ self.embedder([question])[0]
+            semantic = int(np.argmax(similarities))
+            if similarities[semantic] >= MIN_SIMILARITY and float(similarities[semantic]) > confidence:
+                best, confidence = semantic, float(similarities[semantic])
+        if confidence == 0.0:
+            return None
+        guide = self.guides[best]
+        return GuideMatch(guide['id'], guide['title'], guide['text'], float(scores[best]), round(confidence, 3))
+
+    def answer(self, question: str, min_confidence: float = MIN_CONFIDENCE) -> Optional[GuideMatch]:
+        """
+        Guide answering a guidance question with enough confidence, else None (ask the model).
+        Questions naming a life-threatening symptom are only answered by its guides.
+        """
+        if not is_guidance_question(question):
+            return None
+        match = self.search(question)
+        if match is None or match.confidence < min_confidence:
+            return None
+        for pattern, guides in LIFE_THREATS:
+            if pattern.search(question) and match.id not in guides:
+                logger.info(f"Guide {match.id} does not cover the life threat in {question!r}, asking the model")
+                return None
+        return match
+
+    def _coverage(self, terms: List[str], doc: int) -> float:
+        """
+        Share of the question (weighted by idf) that the guide matches, 0 unless
+        a matched term is in the guide title or keywords. Terms unknown to the
+        corpus weigh half the largest idf, so questions mostly about something
+        else get a low confidence.
+        """
+        unknown_weight = float(self.idf.max()) / 2
+        matched = total = 0.0
+        on_topic = False
+        for term in dict.fromkeys(terms):
+            row = self.vocabulary.get(term)
+            if row is None:
+                total += unknown_weight
+                continue
+            idf = float(self.idf[row])
+            total += idf
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            postings = self.postings[start:stop]
+            position = np.flatnonzero(postings == doc)
+            if len(position):
+                matched += idf
+                on_topic = on_topic or bool(self.topical[start + position[0]])
+        return matched / total if total and on_topic else 0.0
+
+    def _load_or_build(self) -> None:
+        meta_path = os.path.join(self.index_dir, "index.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['version'] != self.version:
+                raise ValueError("corpus changed")
+        except (OSError, ValueError, KeyError):
+            meta = self._build()
+        self.vocabulary: Dict[str, int] = meta['vocabulary']
+        self.indptr = np.load(os.path.join(self.index_dir, "indptr.npy"), mmap_mode='r')
+        self.postings = np.load(os.path.join(self.index_dir, "postings.npy"), mmap_mode='r')
+        self.weights = np.load(os.path.join(self.index_dir, "weights.npy"), mmap_mode='r')
+        self.idf = np.load(os.path.join(self.index_dir, "idf.npy"), mmap_mode='r')
+        self.topical = np.load(os.path.join(self.index_dir, "topical.npy"), mmap_mode='r')
+
+    def _build(self) -> dict:
+        start = time.perf_counter()
+        topics = [set(tokenize(" ".join([guide['title']] + guide.get('keywords', [])))) for guide in self.guides]
+        documents = [tokenize(" ".join([guide['title']] + guide.get('keywords', []))) * TITLE_BOOST
+                     + tokenize(guide['text']) for guide in self.guides]
+        lengths = np.array([len(terms) for terms in documents], dtype=np.float32)
+        average = float(lengths.mean()) if len(lengths) else 1.0
+        frequencies: Dict[str, Dict[int, int]] = {}
+        for doc, terms in enumerate(documents):
+            for term in terms:
+                counts = frequencies.setdefault(term, {})
+                counts[doc] = counts.get(doc, 0) + 1
+
+        vocabulary = {term: row for row, term in enumerate(sorted(frequencies))}
+        indptr, postings, weights, idf, topical = [0], [], [], [], []
+        n = len(documents)
+        for term in sorted(frequencies):
+            counts = frequencies[term]
+            term_idf = math.log(1 + (n - len(counts) + 0.5) / (len(counts) + 0.5))
+            idf.append(term_idf)
+            for doc, tf in sorted(counts.items()):
+                postings.append(doc)
+                topical.append(term in topics[doc])
+                weights.append(term_idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * lengths[doc] / average)))
+            indptr.append(len(postings))
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        np.save(os.path.join(self.index_dir, "indptr.npy"), np.array(indptr, dtype=np.int32))
+        np.save(os.path.join(self.index_dir, "postings.npy"), np.array(postings, dtype=np.int32))
+        np.save(os.path.join(self.index_dir, "weights.npy"), np.array(weights, dtype=np.float32))
+        np.save(os.path.join(self.index_dir, "idf.npy"), np.array(idf, dtype=np.float32))
+        np.save(os.path.join(self.index_dir, "topical.npy"), np.array(topical, dtype=np.bool_))
+        meta = {'version': self.version, 'vocabulary': vocabulary}
+        # Written last: an interrupted build is redone on the next load
+        with open(os.path.join(self.index_dir, "index.json"), 'w') as f:
+            json.dump(meta, f)
+        logger.info(f"Built guidance index ({n} guides, {len(vocabulary)} terms) in "
+                    f"{(time.perf_counter() - start) * 1000:.1f}ms")
+        return meta
+
+    def _load_embeddings(self, name: str) -> np.ndarray:
+        safe_name = re.sub(r"[^\w.-]", "_", name)
+        path = os.path.join(self.index_dir, f"embeddings-{safe_name}-{self.version}.npy")
+        if not os.path.exists(path):
+            vectors = self.embedder([f"{guide['title']}. {guide['text']}" for guide in self.guides])
+            np.save(path, np.asarray(vectors, dtype=np.float32))
+        return np.load(path, mmap_mode='r')
+
+
+def sentence_transformer_embedder(model_name: str) -> Embedder:
+    """Embedder backed by a sentence-transformers model (e.g. all-MiniLM-L6-v2), run locally."""
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    return lambda texts: model.encode(texts, normalize_embeddings=True)
+
+
+_shared: Optional[GuidanceIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_guidance_index() -> GuidanceIndex:
+    """Process-wide index of the bundled guides, with the embedding model of guidance_embedding_model if set."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            embedder, name = None, os.getenv('guidance_embedding_model')
+            if name:
+                try:
+                    embedder = sentence_transformer_embedder(name)
+                except Exception as e:
+                    logger.warning(f"Embedding model {name} unavailable, using BM25 only: {e}")
+            _shared = GuidanceIndex(embedder=embedder, embedder_name=name or "embedder")
+        return _shared
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the offline emergency guidance index")
+    parser.add_argument("question")
+    parser.add_argument("--guides", default=GUIDES_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = GuidanceIndex(args.guides)
+    loaded = time.perf_counter()
+    match = index.search(args.question)
+    answer = index.answer(args.question)
+    done = time.perf_counter()
+    print(f"load {(loaded - start) * 1000:.1f}ms, query {(done - loaded) * 1000:.2f}ms")
+    if match is None:
+        print("No matching guide")
+        return
+    print(f"{match.title} (confidence {match.confidence}, answered offline: {answer is not None})\n{match.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,14 @@ import json
 import logging
 from typing import Dict, Any
 import re
-from jsonschema import validate, ValidationError
+from jsonschema import ValidationError
 import streamlit as st
 import datetime 
 
+from victim_tools import json_repair
+from victim_tools.victim_merge import merge
+from victim_tools.victim_schema import get_validator
+
 logger = logging.getLogger(__name__)
 
 def extract_json_from_response(response: str) -> str:
@@ -31,23 +35,15 @@ def extract_json_from_response(response: str) -> str:
 def clean_json_string(json_str: str) -> str:
     """
     Clean JSON string by fixing common formatting issues.
-    - Removes whitespace
-    - Replaces None with null
-    - Fixes quotes and newlines
+    - Trailing and missing commas
+    - Unquoted and single-quoted keys and strings
+    - Python literals (None, True, False) in value position
+    Returns the repaired JSON, or the stripped string if it cannot be repaired.
     """
-    # Remove any leading/trailing whitespace
-    json_str = json_str.strip()
-    
-    # Replace 'None' with 'null' for valid JSON
-    json_str = json_str.replace('None', 'null')
-    
-    # Replace single quotes with double quotes for valid JSON
-    json_str = json_str.replace("'", '"')
-    
-    # Remove any newline characters within string values
-    json_str = re.sub(r'(?<!\\)\\n', ' ', json_str)
-    
-    return json_str
+    try:
+        return json.dumps(json_repair.loads(json_str))
+    except json_repair.JSONRepairError:
+        return json_str.strip()
 
 def parse_json_safely(json_str: str) -> Dict[str, Any]:
     """
@@ -59,33 +55,40 @@ def parse_json_safely(json_str: str) -> Dict[str, Any]:
     except json.JSONDecodeError as e:
         logger.warning(f"Initial JSON parsing failed: {e}")
         
-        # Try to fix common issues
-        fixed_json = clean_json_string(json_str)
+        # Try to fix common issues, in a single tolerant pass
         try:
-            return json.loads(fixed_json)
-        except json.JSONDecodeError as e:
+            return json_repair.loads(json_str)
+        except json_repair.JSONRepairError as e:
             logger.error(f"JSON parsing failed after cleaning: {e}")
             raise
 
 def validate_json_schema(data: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
     """
     Validate JSON against schema and attempt fixes for missing fields.
+    Uses the cached compiled validator of the schema; jsonschema only runs to
+    report the errors of invalid data.
     """
+    validator = get_validator(schema)
     try:
-        validate(instance=data, schema=schema)
+        validator.validate(data)
         return data
     except ValidationError as e:
         logger.warning(f"JSON schema validation failed: {e}")
         
         # Attempt to fix schema issues (this is a simplified example)
+        fixed = False
         for error in e.context:
             if error.validator == 'required':
                 for missing_property in error.validator_value:
                     data[missing_property] = None
+                    fixed = True
+        if not fixed:
+            logger.error("JSON schema validation failed, no fix applies")
+            raise
         
         # Validate again after fixes
         try:
-            validate(instance=data, schema=schema)
+            validator.validate(data)
             return data
         except ValidationError as e:
             logger.error(f"JSON schema validation failed after attempted fixes: {e}")
@@ -112,12 +115,12 @@ def process_json_response(response: str, schema: Dict[str, Any]) -> Dict[str, An
 
 def upload_victim_info(response: str, schema: Dict[str, Any], timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")) -> None:
     """
-    Updates victim info in session state with timestamp.
+    Merges the victim info of a response into session state, with timestamp.
     Logs success/failure of update.
     """
     try:
         processed_json = process_json_response(response, schema)
-        st.session_state['victim_info'] = processed_json
+        st.session_state['victim_info'] = merge(st.session_state.get('victim_info') or {}, processed_json).document
         # add a timestamp
         st.session_state['victim_info']['timestamp'] = timestamp
         logger.info("Victim info updated successfully")
@@ -0,0 +1,272 @@
+"""
+Tolerant JSON Parser
+====================
+Reads the first JSON object (or array) of model output in a single scan. The
+JSON may be inside a ```json fence or surrounded by prose, and is repaired while
+it is read: trailing or missing commas, unquoted or single-quoted keys and
+strings, and Python literals (True, False, None) are accepted. Only tokens in
+value position are converted, so text such as "O'Brien" or "None of my family"
+inside strings is never altered.
+
+Valid JSON is decoded by the standard json module first; the tolerant scanner
+only runs when that fails. With partial=True input that stops early (a reply
+still streaming) returns the values completed so far.
+"""
+
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE = re.compile(r"```[ \t]*([\w-]*)[ \t]*\n?")
+_WHITESPACE = re.compile(r"\s*")
+_OPENING = re.compile(r"[{\[]")
+_NUMBER = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_WORD = re.compile(r"[A-Za-z_$][\w$-]*|\d+")
+_INVALID_ESCAPE = re.compile(r"\\(?![\"\\/bfnrtu])")
+_SINGLE_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'", re.S)
+_LITERALS = {'true': True, 'True': True, 'false': False, 'False': False,
+             'null': None, 'None': None, 'undefined': None}
+_decoder = json.JSONDecoder(strict=False)
+
+
+class JSONRepairError(ValueError):
+    """The text holds no JSON object that can be repaired."""
+
+
+class _EndOfInput(Exception):
+    """Raised when the text ends inside a token."""
+
+
+def loads(text: str, partial: bool = False) -> Any:
+    """
+    Parses the first JSON object or array of a text, repairing common mistakes.
+
+    Args:
+        text (str): Model output, with the JSON fenced, raw or surrounded by prose
+        partial (bool): Accept text that ends inside the JSON and return the
+            completed values (incomplete keys, strings and numbers are dropped)
+
+    Returns:
+        Any: The parsed object or array
+
+    Raises:
+        JSONRepairError: If no JSON can be read, or the text ends early and partial is False
+
+    Example:
+        >>> loads("Sure! ```json\\n{name: 'O\\\\'Brien', 'trapped': True, 'notes': \\"None of my family\\",}\\n```")
+        {'name': "O'Brien", 'trapped': True, 'notes': 'None of my family'}
+        >>> loads('{"age": 34, "injuries": ["leg", "ar', partial=True)
+        {'age': 34, 'injuries': ['leg']}
+    """
+    start, end = _locate(text)
+    if start is None:
+        raise JSONRepairError("No JSON object found")
+    try:
+        value, stop = _decoder.raw_decode(text, start)
+        if stop <= end:
+            return value
+    except json.JSONDecodeError:
+        pass
+    return _Parser(text, end, partial).parse(start)
+
+
+def loads_prefix(text: str) -> Tuple[Any, bool]:
+    """
+    Parses the completed part of JSON that may still be streaming.
+
+    Returns:
+        Tuple[Any, bool]: The parsed prefix and whether the JSON was complete
+
+    Example:
+        >>> loads_prefix('```json\\n{"lat": 48.85, "lon": 2.3')
+        ({'lat': 48.85}, False)
+    """
+    start, end = _locate(text)
+    if start is None:
+        raise JSONRepairError("No JSON object found")
+    parser = _Parser(text, end, partial=True)
+    value = parser.parse(start)
+    return value, not parser.truncated
+
+
+def _locate(text: str) -> Tuple[Optional[int], int]:
+    """Start of the first object or array (inside the first fence if any) and end of the region to scan."""
+    end = len(text)
+    fence = _FENCE.search(text)
+    search_from = 0
+    if fence:
+        closing = text.find("```", fence.end())
+        if closing >= 0:
+            end = closing
+        search_from = fence.end()
+    match = _OPENING.search(text, search_from, end)
+    if match:
+        return match.start(), end
+    if fence:
+        # The fence holds no JSON, look in the whole text
+        match = _OPENING.search(text)
+        return (match.start() if match else None), len(text)
+    return None, end
+
+
+class _Parser:
+    """Recursive descent over text[:end], building values as they are read."""
+
+    def __init__(self, text: str, end: int, partial: bool):
+        self.text = text
+        self.end = end
+        self.partial = partial
+        self.truncated = False
+        self.pos = 0
+
+    def parse(self, start: int) -> Any:
+        self.pos = start
+        try:
+            return self._value()
+        except _EndOfInput:
+            raise JSONRepairError("JSON ends before its first value")
+
+    def _error(self, expected: str) -> JSONRepairError:
+        found = self.text[self.pos:self.pos + 20]
+        return JSONRepairError(f"Expected {expected} at position {self.pos}, found {found!r}")
+
+    def _skip_whitespace(self) -> None:
+        self.pos = _WHITESPACE.match(self.text, self.pos).end()
+        if self.pos >= self.end:
+            raise _EndOfInput
+
+    def _truncate(self, container):
+        if not self.partial:
+            raise JSONRepairError("JSON ends before it is closed")
+        self.truncated = True
+        return container
+
+    def _value(self) -> Any:
+        self._skip_whitespace()
+        char = self.text[self.pos]
+        if char == '{':
+            return self._object()
+        if char == '[':
+            return self._array()
+        if char in '"\'':
+            return self._string()
+        match = _NUMBER.match(self.text, self.pos)
+        if match:
+            return self._number(match)
+        match = _WORD.match(self.text, self.pos)
+        if match:
+            if match.end() >= self.end:
+                raise _EndOfInput
+            self.pos = match.end()
+            word = match.group()
+            # Bare words other than literals are read as strings, e.g. {status: critical}
+            return _LITERALS.get(word, word)
+        raise self._error("a value")
+
+    def _object(self) -> Dict[str, Any]:
+        obj: Dict[str, Any] = {}
+        self.pos += 1
+        while True:
+            try:
+                self._skip_whitespace()
+            except _EndOfInput:
+                return self._truncate(obj)
+            char = self.text[self.pos]
+            if char == '}':
+                self.pos += 1
+                return obj
+            if char == ',':
+                # Commas are optional separators: trailing and missing commas are both accepted
+                self.pos += 1
+                continue
+            try:
+                key = self._key()
+                self._skip_whitespace()
+                if self.text[self.pos] not in ':=':
+                    raise self._error("':'")
+                self.pos += 1
+                value = self._value()
+            except _EndOfInput:
+                return self._truncate(obj)
+            obj[key] = value
+            if self.truncated:
+                return obj
+
+    def _array(self) -> List[Any]:
+        array: List[Any] = []
+        self.pos += 1
+        while True:
+            try:
+                self._skip_whitespace()
+            except _EndOfInput:
+                return self._truncate(array)
+            char = self.text[self.pos]
+            if char == ']':
+                self.pos += 1
+                return array
+            if char == ',':
+                self.pos += 1
+                continue
+            try:
+                value = self._value()
+            except _EndOfInput:
+                return self._truncate(array)
+            array.append(value)
+            if self.truncated:
+                return array
+
+    def _key(self) -> str:
+        char = self.text[self.pos]
+        if char in '"\'':
+            return self._string()
+        match = _WORD.match(self.text, self.pos)
+        if not match:
+            raise self._error("a key")
+        if match.end() >= self.end:
+            raise _EndOfInput
+        self.pos = match.end()
+        return match.group()
+
+    def _string(self) -> str:
+        if self.text[self.pos] == "'":
+            match = _SINGLE_QUOTED.match(self.text, self.pos, self.end)
+            if not match:
+                raise _EndOfInput
+            self.pos = match.end()
+            body = re.sub(r"\\'|\"", lambda m: "'" if m.group() == "\\'" else '\\"', match.group(1))
+            return _unescape(body)
+        try:
+            value, stop = scanstring(self.text, self.pos + 1, False)
+        except json.JSONDecodeError as e:
+            if e.msg.startswith("Unterminated"):
+                raise _EndOfInput
+            # Invalid escape sequence: keep the backslash
+            closing = re.compile(r'(?:[^"\\]|\\.)*"', re.S).match(self.text, self.pos + 1, self.end)
+            if not closing:
+                raise _EndOfInput
+            stop = closing.end()
+            value = _unescape(self.text[self.pos + 1:stop - 1])
+        if stop > self.end:
+            raise _EndOfInput
+        self.pos = stop
+        return value
+
+    def _number(self, match) -> Any:
+        if match.end() >= self.end:
+            # The number may continue in the next chunk
+            raise _EndOfInput
+        self.pos = match.end()
+        token = match.group()
+        if token.lstrip('-').isdigit():
+            return int(token)
+        return float(token)
+
+
+def _unescape(body: str) -> str:
+    """Decodes the body of a double-quoted string, keeping invalid escapes literally."""
+    body = _INVALID_ESCAPE.sub(r"\\\\", body)
+    try:
+        return scanstring(body + '"', 0, False)[0]
+    except json.JSONDecodeError:
+        return body
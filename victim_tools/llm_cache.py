@@ -0,0 +1,175 @@
+"""
+LLM Result Cache
+================
+Caches model results for repeated or near-identical utterances ("I can't move my
+leg", canned button replies, synthetic test flows) so they skip the Groq/Gemini
+round trip.
+
+Entries are keyed on the model, the normalized utterance and a hash of the
+victim-state fields the result depends on. An in-memory LRU tier is bounded by
+entry count; an optional SQLite file adds a persistent second tier shared by
+all sessions. Hit rates are tracked per model.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_utterance(text: str) -> str:
+    """
+    Normalizes an utterance so trivial variations share a cache entry.
+
+    Example:
+        >>> normalize_utterance("  I CAN’T move my leg!! ")
+        "i can't move my leg"
+    """
+    text = unicodedata.normalize("NFKC", str(text)).replace("’", "'").lower()
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+def state_hash(state: Any) -> str:
+    """Stable hash of the victim-state fields a result depends on."""
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier (memory LRU, optional SQLite) cache of model results.
+
+    Args:
+        max_entries: Maximum number of entries kept in memory
+        path: SQLite file for the persistent tier, None to keep results in memory only
+        max_age: Seconds after which entries expire, None to keep them forever
+
+    Example:
+        >>> cache = LLMCache(max_entries=2)
+        >>> cache.get("llama", "I can't move my leg") is None
+        True
+        >>> cache.put("llama", "I can't move my leg", {"medical_info.mobility": "immobile"})
+        >>> cache.get("llama", "i can't move my leg.")
+        {'medical_info.mobility': 'immobile'}
+        >>> cache.stats()["llama"]["hit_rate"]
+        0.5
+    """
+
+    def __init__(self, max_entries: int = 512, path: Optional[str] = None,
+                 max_age: Optional[float] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.max_age = max_age
+        # key -> (model, value, created)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache ("
+                             "key TEXT PRIMARY KEY, model TEXT, value TEXT, created REAL)")
+            self._db.commit()
+
+    @staticmethod
+    def key(model: str, utterance: str, state: Any = None) -> str:
+        """Cache key of an utterance for a model and victim state."""
+        parts = [model, normalize_utterance(utterance), state_hash(state)]
+        return hashlib.sha1("\x1f".join(parts).encode()).hexdigest()
+
+    def get(self, model: str, utterance: str, state: Any = None) -> Optional[Any]:
+        """
+        Returns the cached result, or None on a miss.
+        """
+        key = self.key(model, utterance, state)
+        with self._lock:
+            stats = self._stats.setdefault(model, {"hits": 0, "disk_hits": 0, "misses": 0})
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[2]):
+                self._memory.move_to_end(key)
+                stats["hits"] += 1
+                return entry[1]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM llm_cache WHERE key = ?",
+                                       (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    value = json.loads(row[0])
+                    self._remember(key, model, value, row[1])
+                    stats["hits"] += 1
+                    stats["disk_hits"] += 1
+                    return value
+            stats["misses"] += 1
+            return None
+
+    def put(self, model: str, utterance: str, value: Any, state: Any = None) -> None:
+        """
+        Stores a JSON-serializable result. None values are not cached.
+        """
+        if value is None:
+            return
+        key = self.key(model, utterance, state)
+        created = time.time()
+        with self._lock:
+            self._remember(key, model, value, created)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                                     (key, model, json.dumps(value), created))
+                    self._db.commit()
+                except (TypeError, sqlite3.Error) as e:
+                    logger.warning(f"Could not persist cache entry: {e}")
+
+    def clear(self, model: Optional[str] = None) -> None:
+        """Removes every entry and statistic, or only those of one model."""
+        with self._lock:
+            if model is None:
+                self._memory.clear()
+                self._stats.clear()
+            else:
+                for key in [key for key, entry in self._memory.items() if entry[0] == model]:
+                    del self._memory[key]
+                self._stats.pop(model, None)
+            if self._db is not None:
+                if model is None:
+                    self._db.execute("DELETE FROM llm_cache")
+                else:
+                    self._db.execute("DELETE FROM llm_cache WHERE model = ?", (model,))
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Hits, disk hits, misses and hit rate per model.
+        """
+        with self._lock:
+            return {
+                model: {**counts, "hit_rate": counts["hits"] / max(1, counts["hits"] + counts["misses"])}
+                for model, counts in self._stats.items()
+            }
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _remember(self, key: str, model: str, value: Any, created: float) -> None:
+        self._memory[key] = (model, value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _expired(self, created: float) -> bool:
+        return self.max_age is not None and time.time() - created > self.max_age
+
+
+# Cache shared by every session of the app. Set llm_cache_path to keep results on disk.
+shared_cache = LLMCache(path=os.getenv("llm_cache_path"))
@@ -0,0 +1,315 @@
+"""
+LLM Call Metrics
+================
+Records every model call (Gemini chat, Groq requests, Gemini generate_content,
+batch triage): provider, model, stage, prompt and completion tokens,
+time to first token, total latency, retries and outcome.
+
+Records are kept in an in-process ring buffer, summarized in latency and token
+histograms per provider/model/stage, and exported to a JSONL file
+(llm_metrics_path) and an HTTP metrics endpoint (llm_metrics_port) serving
+Prometheus text at /metrics and JSON summaries at /metrics.json and /calls.
+
+Usage:
+    with shared_metrics.track('groq', 'llama-3.1-70b-versatile', stage='extraction', prompt=prompt) as call:
+        response = send(prompt)
+        call.set_response_usage(response)
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384)
+
+
+@dataclass
+class CallRecord:
+    """One model call."""
+    provider: str
+    model: str
+    stage: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    ttft_s: Optional[float] = None
+    latency_s: float = 0.0
+    retries: int = 0
+    outcome: str = 'ok'
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.provider, self.model, self.stage or ''
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram.
+
+    Example:
+        >>> histogram = Histogram((1, 2, 4))
+        >>> for value in (0.5, 1.5, 1.7, 3, 9): histogram.observe(value)
+        >>> histogram.counts, histogram.quantile(0.5)
+        ([1, 2, 1, 1], 2)
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q quantile (inf past the last bound)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def summary(self) -> Dict[str, Any]:
+        return {'count': self.count, 'mean': self.total / self.count if self.count else None,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95)}
+
+
+class _Series:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS_S)
+        self.ttft = Histogram(LATENCY_BUCKETS_S)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.outcomes: Dict[str, int] = {}
+        self.retries = 0
+
+    def add(self, record: CallRecord) -> None:
+        self.latency.observe(record.latency_s)
+        if record.ttft_s is not None:
+            self.ttft.observe(record.ttft_s)
+        if record.prompt_tokens is not None:
+            self.prompt_tokens.observe(record.prompt_tokens)
+        if record.completion_tokens is not None:
+            self.completion_tokens.observe(record.completion_tokens)
+        self.outcomes[record.outcome] = self.outcomes.get(record.outcome, 0) + 1
+        self.retries += record.retries
+
+
+class CallTracker:
+    """Collects the details of a call in progress; see LLMMetrics.track."""
+
+    def __init__(self, metrics: 'LLMMetrics', record: CallRecord):
+        self.metrics = metrics
+        self.record = record
+        self._start = time.perf_counter()
+
+    def first_token(self) -> None:
+        """Marks the arrival of the first streamed token (only the first call counts)."""
+        if self.record.ttft_s is None:
+            self.record.ttft_s = time.perf_counter() - self._start
+
+    def set_usage(self, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None) -> None:
+        if prompt_tokens is not None:
+            self.record.prompt_tokens = int(prompt_tokens)
+        if completion_tokens is not None:
+            self.record.completion_tokens = int(completion_tokens)
+
+    def set_response_usage(self, response) -> None:
+        """Token usage reported by an OpenAI style response dict or a Gemini response."""
+        if isinstance(response, dict):
+            usage = response.get('usage') or {}
+            self.set_usage(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+            return
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            self.set_usage(getattr(usage, 'prompt_token_count', None) or None,
+                           getattr(usage, 'candidates_token_count', None) or None)
+
+    def retry(self) -> None:
+        self.record.retries += 1
+
+    def __enter__(self) -> 'CallTracker':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        self.record.latency_s = time.perf_counter() - self._start
+        if exc is not None:
+            self.record.outcome = 'timeout' if 'timeout' in type(exc).__name__.lower() else 'error'
+            self.record.error = f"{type(exc).__name__}: {exc}"[:300]
+        self.metrics.add(self.record)
+        return False
+
+
+class LLMMetrics:
+    """
+    Ring buffer and histograms of model calls.
+
+    Args:
+        capacity: Number of recent calls kept
+        export_path: JSONL file every record is appended to, None to disable
+
+    Example:
+        >>> metrics = LLMMetrics()
+        >>> with metrics.track('groq', 'llama', stage='extraction', prompt='x' * 400) as call:
+        ...     call.set_usage(completion_tokens=20)
+        >>> summary = metrics.summary()['groq/llama/extraction']
+        >>> summary['calls'], summary['prompt_tokens']['count'], summary['outcomes']
+        (1, 1, {'ok': 1})
+    """
+
+    def __init__(self, capacity: int = 1000, export_path: Optional[str] = None):
+        self.records: deque = deque(maxlen=capacity)
+        self.export_path = export_path
+        self.exporters: List[Callable[[CallRecord], None]] = []
+        self._series: Dict[Tuple[str, str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def track(self, provider: str, model: str, stage: Optional[str] = None,
+              prompt: Optional[str] = None) -> CallTracker:
+        """
+        Context manager timing one call. The prompt token count is estimated from
+        the prompt (4 characters per token) until set_usage reports it.
+        """
+        record = CallRecord(provider, model, stage)
+        if prompt is not None:
+            record.prompt_tokens = len(str(prompt)) // 4
+        return CallTracker(self, record)
+
+    def add(self, record: CallRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+            self._series.setdefault(record.key, _Series()).add(record)
+            if self.export_path:
+                try:
+                    with open(self.export_path, 'a') as f:
+                        f.write(json.dumps(asdict(record)) + '\n')
+                except OSError as e:
+                    logger.warning(f"Could not export LLM metrics: {e}")
+        for exporter in self.exporters:
+            try:
+                exporter(record)
+            except Exception as e:
+                logger.warning(f"LLM metrics exporter failed: {e}")
+
+    def recent(self, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = list(self.records)
+        return [asdict(record) for record in records[-n if n else 0:]]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Histogram summaries by 'provider/model/stage'."""
+        with self._lock:
+            return {
+                "/".join(part for part in key if part): {
+                    'calls': series.latency.count,
+                    'outcomes': dict(series.outcomes),
+                    'retries': series.retries,
+                    'latency_s': series.latency.summary(),
+                    'ttft_s': series.ttft.summary(),
+                    'prompt_tokens': series.prompt_tokens.summary(),
+                    'completion_tokens': series.completion_tokens.summary(),
+                }
+                for key, series in self._series.items()
+            }
+
+    def prometheus(self) -> str:
+        """Histograms and counters in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            items = list(self._series.items())
+            for name, attribute, help_text in (
+                    ('llm_call_latency_seconds', 'latency', 'Total latency of model calls'),
+                    ('llm_call_ttft_seconds', 'ttft', 'Time to first streamed token'),
+                    ('llm_prompt_tokens', 'prompt_tokens', 'Prompt tokens per call'),
+                    ('llm_completion_tokens', 'completion_tokens', 'Completion tokens per call')):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for key, series in items:
+                    histogram = getattr(series, attribute)
+                    labels = _labels(key)
+                    cumulative = 0
+                    for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+            lines += ["# HELP llm_calls_total Model calls by outcome", "# TYPE llm_calls_total counter"]
+            for key, series in items:
+                for outcome, count in series.outcomes.items():
+                    lines.append(f'llm_calls_total{{{_labels(key)},outcome="{outcome}"}} {count}')
+            lines += ["# HELP llm_call_retries_total Retried model requests", "# TYPE llm_call_retries_total counter"]
+            for key, series in items:
+                lines.append(f"llm_call_retries_total{{{_labels(key)}}} {series.retries}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: Tuple[str, str, str]) -> str:
+    provider, model, stage = (part.replace('\\', '\\\\').replace('"', '\\"') for part in key)
+    return f'provider="{provider}",model="{model}",stage="{stage}"'
+
+
+def make_handler(metrics: LLMMetrics) -> type:
+    """HTTP handler serving /metrics (Prometheus), /metrics.json (summaries) and /calls (recent records)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/metrics':
+                return self._send(200, metrics.prometheus(), 'text/plain; version=0.0.4')
+            if path == '/metrics.json':
+                return self._send(200, json.dumps(metrics.summary()), 'application/json')
+            if path == '/calls':
+                return self._send(200, json.dumps(metrics.recent(100)), 'application/json')
+            return self._send(404, json.dumps({"error": f"Unknown endpoint {path}"}), 'application/json')
+
+        def _send(self, status: int, body: str, content_type: str) -> None:
+            payload = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+_servers: Dict[int, ThreadingHTTPServer] = {}
+
+
+def serve_metrics(port: int, metrics: Optional[LLMMetrics] = None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves the metrics endpoint from a background thread. Calling it again with
+    the same port (e.g. on a Streamlit rerun) returns the running server.
+    """
+    if port in _servers:
+        return _servers[port]
+    server = ThreadingHTTPServer((host, port), make_handler(metrics or shared_metrics))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _servers[port] = server
+    logger.info(f"Serving LLM metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+# Metrics shared by every session of the process
+shared_metrics = LLMMetrics(capacity=int(os.getenv('llm_metrics_capacity', 1000)),
+                            export_path=os.getenv('llm_metrics_path'))
@@ -5,7 +5,6 @@ from collections.abc import Iterable  # For working with iterable objects
 import time
 from sodapy import Socrata  # Socrata client for open data APIs
 import json  # JSON library for handling JSON data
-import re  # Regular expressions for string manipulation
 from IPython.display import display, Markdown  # For displaying markdown in Jupyter environments
 from geopy.geocoders import Nominatim  # For geolocation services
 
@@ -24,6 +23,9 @@ import google.generativeai as genai
 # Import additional display utilities for Jupyter environments
 from typing import List, Tuple, Optional, Dict, Any
 
+from victim_tools import json_repair
+from victim_tools.victim_schema import get_validator, to_gemini_schema, to_json_schema
+
 # Define a configuration class for Gemini AI settings
 class GeminiConfig:
     def __init__(self, gemini_api, model_path, response_type):
@@ -205,282 +207,20 @@ def fix_json(json_string):
     Returns:
         dict or None: Parsed JSON as a dictionary if successful, otherwise None.
     """
-    # Remove any leading/trailing whitespace and 'json' prefix
-    json_string = json_string.strip()
-    json_string = re.sub(r'^json\s*', '', json_string, flags=re.IGNORECASE)
-    
-    # Remove any trailing commas before closing braces or brackets
-    json_string = re.sub(r',\s*([}\]])', r'\1', json_string)
-    
-    # Add missing commas between key-value pairs
-    json_string = re.sub(r'"\s*}\s*"', '", "', json_string)
-    json_string = re.sub(r'"\s*]\s*"', '"], "', json_string)
-    
-    # Ensure all keys are properly quoted
-    json_string = re.sub(r'([{,])\s*(\w+):', r'\1 "\2":', json_string)
-    
-    # Replace single quotes with double quotes
-    json_string = json_string.replace("'", '"')
-    
-    # Ensure proper formatting for empty strings and arrays
-    json_string = re.sub(r':\s*""', ': ""', json_string)
-    json_string = re.sub(r':\s*\[\]', ': []', json_string)
-    
-    # Try to parse the cleaned JSON string
+    # One tolerant pass: trailing/missing commas, unquoted keys, single quotes, Python literals
     try:
-        parsed_json = json.loads(json_string)
-        return parsed_json
-    except json.JSONDecodeError as e:
+        return json_repair.loads(json_string)
+    except json_repair.JSONRepairError as e:
         print(f"Error parsing JSON: {e}")
         return None  # Return None if parsing fails
 
 
-schema = {
-  "type": "object",
-  "properties": {
-    "victim_info": {
-      "type": "object",
-      "properties": {
-        "id": {"type": "string"},
-        "emergency_status": {
-                "type": "string",
-                "enum": ["critical", "very_urgent", "urgent", "stable", "unknown"]
-                },       
-        "location": {
-          "type": "object",
-          "properties": {
-            "lat": {"type": "number"},
-            "lon": {"type": "number"},
-            "details": {"type": "string"},
-            "nearest_landmark": {"type": "string"}
-          },
-          "required": ["lat", "lon", "details", "nearest_landmark"]
-        },
-        "personal_info": {
-          "type": "object",
-          "properties": {
-            "name": {"type": "string"},
-            "age": {"type": "integer"},
-            "gender": {"type": "string"},
-            "language": {"type": "string"},
-            "physical_description": {"type": "string"}
-          },
-          "required": ["name", "age", "gender", "language", "physical_description"]
-        },
-        "medical_info": {
-          "type": "object",
-          "properties": {
-            "injuries": {"type": "array", "items": {"type": "string"}},
-            "pain_level": {"type": "integer"},
-            "medical_conditions": {"type": "array", "items": {"type": "string"}},
-            "medications": {"type": "array", "items": {"type": "string"}},
-            "allergies": {"type": "array", "items": {"type": "string"}},
-            "blood_type": {"type": "string"}
-          },
-          "required": ["injuries", "pain_level", "medical_conditions", "medications", "allergies", "blood_type"]
-        },
-        "situation": {
-          "type": "object",
-          "properties": {
-            "disaster_type": {"type": "string"},
-            "immediate_needs": {"type": "array", "items": {"type": "string"}},
-            "trapped": {"type": "boolean"},
-            "mobility": {"type": "string"},
-            "nearby_hazards": {"type": "array", "items": {"type": "string"}}
-          },
-          "required": ["disaster_type", "immediate_needs", "trapped", "mobility", "nearby_hazards"]
-        },
-        "contact_info": {
-          "type": "object",
-          "properties": {
-            "phone": {"type": "string"},
-            "email": {"type": "string"},
-            "emergency_contact": {
-              "type": "object",
-              "properties": {
-                "name": {"type": "string"},
-                "relationship": {"type": "string"},
-                "phone": {"type": "string"}
-              },
-              "required": ["name", "relationship", "phone"]
-            }
-          },
-          "required": ["phone", "email", "emergency_contact"]
-        },
-        "resources": {
-          "type": "object",
-          "properties": {
-            "food_status": {"type": "string"},
-            "water_status": {"type": "string"},
-            "shelter_status": {"type": "string"},
-            "communication_devices": {"type": "array", "items": {"type": "string"}}
-          },
-          "required": ["food_status", "water_status", "shelter_status", "communication_devices"]
-        },
-        "rescue_info": {
-          "type": "object",
-          "properties": {
-            "last_contact": {"type": "string"},
-            "rescue_team_eta": {"type": "string"},
-            "special_rescue_needs": {"type": "string"}
-          },
-          "required": ["last_contact", "rescue_team_eta", "special_rescue_needs"]
-        },
-        "environmental_data": {
-          "type": "object",
-          "properties": {
-            "temperature": {"type": "number"},
-            "humidity": {"type": "number"},
-            "air_quality": {"type": "string"},
-            "weather": {"type": "string"}
-          },
-          "required": ["temperature", "humidity", "air_quality", "weather"]
-        },
-        "device_data": {
-          "type": "object",
-          "properties": {
-            "battery_level": {"type": "integer"},
-            "network_status": {"type": "string"}
-          },
-          "required": ["battery_level", "network_status"]
-        },
-        "social_info": {
-          "type": "object",
-          "properties": {
-            "group_size": {"type": "integer"},
-            "dependents": {"type": "integer"},
-            "nearby_victims_count": {"type": "integer"},
-            "can_communicate_verbally": {"type": "boolean"}
-          },
-          "required": ["group_size", "dependents", "nearby_victims_count", "can_communicate_verbally"]
-        },
-        "psychological_status": {
-          "type": "object",
-          "properties": {
-            "stress_level": {"type": "string"},
-            "special_needs": {"type": "string"}
-          },
-          "required": ["stress_level", "special_needs"]
-        }
-      },
-      "required": ["id", "emergency_status", "location", "personal_info", "medical_info", "situation", "contact_info", "resources", "rescue_info", "environmental_data", "device_data", "social_info", "psychological_status"]
-    }
-  },
-  "required": ["victim_info"]
-}
+# Both schemas are generated from victim_schema.VICTIM_FIELDS, edit the fields there
+schema = to_json_schema()
 
 
-victim_info_schema = genai.protos.Schema(
-    type=genai.protos.Type.OBJECT,
-    properties={
-        'id': genai.protos.Schema(type=genai.protos.Type.STRING),
-        'emergency_status': genai.protos.Schema(type=genai.protos.Type.STRING),
-        'location': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'lat': genai.protos.Schema(type=genai.protos.Type.NUMBER),
-                'lon': genai.protos.Schema(type=genai.protos.Type.NUMBER),
-                'details': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'nearest_landmark': genai.protos.Schema(type=genai.protos.Type.STRING)
-            }
-        ),
-        'personal_info': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'name': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'age': genai.protos.Schema(type=genai.protos.Type.INTEGER),
-                'gender': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'language': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'physical_description': genai.protos.Schema(type=genai.protos.Type.STRING)
-            }
-        ),
-        'medical_info': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'injuries': genai.protos.Schema(type=genai.protos.Type.ARRAY, items=genai.protos.Schema(type=genai.protos.Type.STRING)),
-                'pain_level': genai.protos.Schema(type=genai.protos.Type.INTEGER),
-                'medical_conditions': genai.protos.Schema(type=genai.protos.Type.ARRAY, items=genai.protos.Schema(type=genai.protos.Type.STRING)),
-                'medications': genai.protos.Schema(type=genai.protos.Type.ARRAY, items=genai.protos.Schema(type=genai.protos.Type.STRING)),
-                'allergies': genai.protos.Schema(type=genai.protos.Type.ARRAY, items=genai.protos.Schema(type=genai.protos.Type.STRING)),
-                'blood_type': genai.protos.Schema(type=genai.protos.Type.STRING)
-            }
-        ),
-        'situation': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'disaster_type': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'immediate_needs': genai.protos.Schema(type=genai.protos.Type.ARRAY, items=genai.protos.Schema(type=genai.protos.Type.STRING)),
-                'trapped': genai.protos.Schema(type=genai.protos.Type.BOOLEAN),
-                'mobility': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'nearby_hazards': genai.protos.Schema(type=genai.protos.Type.ARRAY, items=genai.protos.Schema(type=genai.protos.Type.STRING))
-            }
-        ),
-        'contact_info': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'phone': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'email': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'emergency_contact': genai.protos.Schema(
-                    type=genai.protos.Type.OBJECT,
-                    properties={
-                        'name': genai.protos.Schema(type=genai.protos.Type.STRING),
-                        'relationship': genai.protos.Schema(type=genai.protos.Type.STRING),
-                        'phone': genai.protos.Schema(type=genai.protos.Type.STRING)
-                    }
-                )
-            }
-        ),
-        'resources': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'food_status': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'water_status': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'shelter_status': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'communication_devices': genai.protos.Schema(type=genai.protos.Type.ARRAY, items=genai.protos.Schema(type=genai.protos.Type.STRING))
-            }
-        ),
-        'rescue_info': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'last_contact': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'rescue_team_eta': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'special_rescue_needs': genai.protos.Schema(type=genai.protos.Type.STRING)
-            }
-        ),
-        'environmental_data': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'temperature': genai.protos.Schema(type=genai.protos.Type.NUMBER),
-                'humidity': genai.protos.Schema(type=genai.protos.Type.NUMBER),
-                'air_quality': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'weather': genai.protos.Schema(type=genai.protos.Type.STRING)
-            }
-        ),
-        'device_data': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'battery_level': genai.protos.Schema(type=genai.protos.Type.INTEGER),
-                'network_status': genai.protos.Schema(type=genai.protos.Type.STRING)
-            }
-        ),
-        'social_info': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'group_size': genai.protos.Schema(type=genai.protos.Type.INTEGER),
-                'dependents': genai.protos.Schema(type=genai.protos.Type.INTEGER),
-                'nearby_victims_count': genai.protos.Schema(type=genai.protos.Type.INTEGER),
-                'can_communicate_verbally': genai.protos.Schema(type=genai.protos.Type.BOOLEAN)
-            }
-        ),
-        'psychological_status': genai.protos.Schema(
-            type=genai.protos.Type.OBJECT,
-            properties={
-                'stress_level': genai.protos.Schema(type=genai.protos.Type.STRING),
-                'special_needs': genai.protos.Schema(type=genai.protos.Type.STRING)
-            }
-        )
-    }
-)
+victim_info_schema = to_gemini_schema()
+
 
 parameters_schema = genai.protos.Schema(
     type=genai.protos.Type.OBJECT,
@@ -499,7 +239,7 @@ add_victim_info = genai.protos.FunctionDeclaration(
 
 
 import jsonschema
-from jsonschema import validate, Draft7Validator
+from jsonschema import validate
 from typing import Any, Dict, List, Union
 
 def fix_json_schema(instance: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
@@ -513,7 +253,7 @@ def fix_json_schema(instance: Dict[str, Any], schema: Dict[str, Any]) -> Dict[st
     Returns:
         Dict[str, Any]: The fixed JSON instance.
     """
-    validator = Draft7Validator(schema)  # Initialize the validator with the provided schema
+    validator = get_validator(schema)  # Compiled once per schema and cached
     errors = sorted(validator.iter_errors(instance), key=lambda e: e.path)  # Collect and sort validation errors
     
     for error in errors:
@@ -0,0 +1,292 @@
+"""
+Local CPU Inference
+===================
+Runs extraction on a quantized GGUF model (e.g. gemma-1.1-2b-instruct q4_0) on
+the CPU through llama.cpp, using llama-cpp-python when installed and the copy
+bundled with the nexa SDK otherwise. Extraction keeps working with no network
+and with a latency that only depends on the machine.
+
+- The model is loaded once per process, optionally in the background at startup,
+  and warmed up by evaluating the static instruction prefix.
+- Prompts put static instructions first, so llama.cpp reuses the KV cache of the
+  common prefix across turns; a RAM cache keeps the state of other prefixes.
+- The thread count defaults to the physical cores and can be measured with
+  tune_threads (python -m victim_tools.local_llm --tune).
+- JSON answers are constrained by a grammar compiled from a JSON schema.
+
+Configuration (environment):
+    local_model_path: GGUF file, or a nexa model id such as gemma-1.1-2b-instruct:q4_0
+    local_llm_threads: Thread count, defaults to the number of physical cores
+    local_llm_ctx: Context size in tokens (default 4096)
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from victim_tools.llm_metrics import shared_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_INSTRUCTION = (
+    "You extract rescue information from messages of disaster victims. "
+    "Answer with JSON only."
+)
+
+
+class LocalLLMUnavailable(RuntimeError):
+    """No local model is configured, or llama.cpp bindings are not installed."""
+
+
+def _bindings():
+    """Llama, LlamaGrammar and LlamaRAMCache from llama-cpp-python or the nexa SDK."""
+    try:
+        from llama_cpp import Llama, LlamaGrammar, LlamaRAMCache
+        return Llama, LlamaGrammar, LlamaRAMCache
+    except ImportError:
+        pass
+    try:
+        from nexa.gguf.llama.llama import Llama
+        from nexa.gguf.llama.llama_cache import LlamaRAMCache
+        from nexa.gguf.llama.llama_grammar import LlamaGrammar
+        return Llama, LlamaGrammar, LlamaRAMCache
+    except ImportError as e:
+        raise LocalLLMUnavailable("Install llama-cpp-python or nexa for local inference") from e
+
+
+def physical_cores() -> int:
+    """Physical core count (logical CPUs available to the process, halved when hyper-threaded)."""
+    try:
+        logical = len(os.sched_getaffinity(0))
+    except AttributeError:
+        logical = os.cpu_count() or 1
+    try:
+        with open('/proc/cpuinfo') as f:
+            info = f.read()
+        siblings = int(info.split('siblings')[1].split(':')[1].split()[0])
+        cores = int(info.split('cpu cores')[1].split(':')[1].split()[0])
+        return max(1, logical * cores // siblings)
+    except (OSError, IndexError, ValueError, ZeroDivisionError):
+        return max(1, logical // 2) if logical > 2 else logical
+
+
+def resolve_model_path(model: str) -> str:
+    """Path of a GGUF file; nexa model ids are downloaded (once) by the nexa SDK."""
+    if os.path.isfile(model):
+        return model
+    try:
+        from nexa.general import pull_model
+    except ImportError:
+        raise LocalLLMUnavailable(f"Model file {model} not found")
+    local_path, _ = pull_model(model)
+    if not local_path:
+        raise LocalLLMUnavailable(f"Could not download {model}")
+    return local_path
+
+
+class LocalLLM:
+    """
+    A GGUF model served from this process.
+
+    Args:
+        model: GGUF file or nexa model id
+        n_threads: Threads used for generation, defaults to the physical cores
+        n_ctx: Context size in tokens
+        n_batch: Prompt tokens evaluated per batch
+        cache_bytes: Size of the RAM cache of KV states, 0 to disable
+
+    Example:
+        llm = LocalLLM("models/gemma-1.1-2b-instruct-q4_0.gguf").load()
+        llm.complete([{"role": "user", "content": "Age: 34"}], json_schema={"type": "object"})
+    """
+
+    def __init__(self, model: str, n_threads: Optional[int] = None, n_ctx: int = 4096, n_batch: int = 256,
+                 cache_bytes: int = 256 << 20):
+        self.model = model
+        self.name = os.path.basename(model).rsplit('.gguf', 1)[0]
+        self.n_threads = n_threads or physical_cores()
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.cache_bytes = cache_bytes
+        self.load_time: Optional[float] = None
+        self._llama = None
+        self._grammar_class = None
+        self._grammars: OrderedDict = OrderedDict()
+        self._load_lock = threading.Lock()
+        # llama.cpp contexts are not thread-safe: one generation at a time
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._llama is not None
+
+    def load(self) -> 'LocalLLM':
+        """Loads the model (once) and warms it up."""
+        with self._load_lock:
+            if self._llama is not None:
+                return self
+            Llama, LlamaGrammar, LlamaRAMCache = _bindings()
+            start = time.perf_counter()
+            llama = Llama(model_path=resolve_model_path(self.model), n_ctx=self.n_ctx, n_batch=self.n_batch,
+                          n_threads=self.n_threads, n_threads_batch=os.cpu_count() or self.n_threads,
+                          n_gpu_layers=0, use_mmap=True, verbose=False)
+            if self.cache_bytes:
+                llama.set_cache(LlamaRAMCache(capacity_bytes=self.cache_bytes))
+            self._grammar_class = LlamaGrammar
+            self._llama = llama
+            self.load_time = time.perf_counter() - start
+            logger.info(f"Loaded local model {self.name} in {self.load_time:.1f}s ({self.n_threads} threads)")
+        self.warm_up()
+        return self
+
+    def load_async(self) -> threading.Thread:
+        """Loads the model from a background thread, e.g. at application start."""
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                logger.warning(f"Could not load local model {self.model}: {e}")
+        thread = threading.Thread(target=run, name="local-llm-load", daemon=True)
+        thread.start()
+        return thread
+
+    def warm_up(self, system_instruction: str = DEFAULT_SYSTEM_INSTRUCTION) -> None:
+        """Evaluates the static prompt prefix, so its KV cache is ready for the first call."""
+        self.complete([{"role": "system", "content": system_instruction}, {"role": "user", "content": "ok"}],
+                      max_tokens=1)
+
+    def set_threads(self, n_threads: int) -> None:
+        self.n_threads = n_threads
+        if self._llama is not None:
+            self._llama.context_params.n_threads = n_threads
+            self._llama.n_threads = n_threads
+            self._llama._ctx.set_n_threads(n_threads, self._llama.n_threads_batch)
+
+    def complete(self, messages: List[Dict[str, str]], json_schema: Optional[Dict[str, Any]] = None,
+                 json_mode: bool = False, max_tokens: int = 256, temperature: float = 0.0) -> Dict[str, Any]:
+        """
+        Answers chat messages.
+
+        Args:
+            messages: OpenAI style chat messages; keep static content first for KV cache reuse
+            json_schema: JSON schema the answer must follow (grammar constrained)
+            json_mode: Constrain the answer to any JSON object
+            max_tokens: Maximum completion tokens
+            temperature: Sampling temperature
+
+        Returns:
+            dict: OpenAI style chat completion, with usage
+        """
+        self.load()
+        kwargs = {}
+        if json_schema is not None:
+            kwargs['grammar'] = self._grammar(json_schema)
+        elif json_mode:
+            kwargs['response_format'] = {"type": "json_object"}
+        with self._lock:
+            return self._llama.create_chat_completion(messages=messages, max_tokens=max_tokens,
+                                                      temperature=temperature, **kwargs)
+
+    def tune_threads(self, candidates: Optional[List[int]] = None, max_tokens: int = 32) -> Dict[int, float]:
+        """
+        Measures generation speed for several thread counts and keeps the fastest.
+
+        Returns:
+            Dict[int, float]: Tokens per second by thread count
+        """
+        self.load()
+        logical = os.cpu_count() or 1
+        candidates = candidates or sorted({1, 2, 4, physical_cores(), logical} - {0})
+        messages = [{"role": "user", "content": "Describe what to do after an earthquake in three sentences."}]
+        speeds = {}
+        for n_threads in candidates:
+            if n_threads > logical:
+                continue
+            self.set_threads(n_threads)
+            start = time.perf_counter()
+            response = self.complete(messages, max_tokens=max_tokens, temperature=0.0)
+            tokens = response.get('usage', {}).get('completion_tokens') or max_tokens
+            speeds[n_threads] = tokens / (time.perf_counter() - start)
+            logger.info(f"{n_threads} threads: {speeds[n_threads]:.1f} tokens/s")
+        self.set_threads(max(speeds, key=speeds.get))
+        return speeds
+
+    def _grammar(self, json_schema: Dict[str, Any]):
+        # Compiling a grammar takes milliseconds; field sets repeat across turns
+        key = json.dumps(json_schema, sort_keys=True)
+        grammar = self._grammars.get(key)
+        if grammar is None:
+            grammar = self._grammar_class.from_json_schema(key, verbose=False)
+            self._grammars[key] = grammar
+            if len(self._grammars) > 64:
+                self._grammars.popitem(last=False)
+        else:
+            self._grammars.move_to_end(key)
+        return grammar
+
+
+_shared: Optional[LocalLLM] = None
+_shared_lock = threading.Lock()
+
+
+def get_local_llm() -> LocalLLM:
+    """Process-wide local model configured by the environment (see module docstring)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            model = os.getenv('local_model_path')
+            if not model:
+                raise LocalLLMUnavailable("Set local_model_path to use local inference")
+            threads = os.getenv('local_llm_threads')
+            _shared = LocalLLM(model, n_threads=int(threads) if threads else None,
+                               n_ctx=int(os.getenv('local_llm_ctx', 4096)))
+        return _shared
+
+
+def send_local_message(message, system_instruction=None, json_mode=False, max_tokens=512, model=None,
+                       timeout=None, stage=None, json_schema=None):
+    """
+    Same interface and response shape as vital_data.send_message, answered by the
+    local model. The system instruction comes first so its KV cache is reused;
+    timeout is not supported by llama.cpp and ignored.
+    """
+    llm = get_local_llm()
+    messages = [{"role": "system", "content": system_instruction or DEFAULT_SYSTEM_INSTRUCTION},
+                {"role": "user", "content": message}]
+    with shared_metrics.track('local', model or llm.name, stage, prompt=message) as call:
+        response = llm.complete(messages, json_schema=json_schema, json_mode=json_mode, max_tokens=max_tokens)
+        call.set_response_usage(response)
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the local extraction model, measure it and tune threads")
+    parser.add_argument("--model", default=os.getenv('local_model_path'), help="GGUF file or nexa model id")
+    parser.add_argument("--tune", action="store_true", help="Measure tokens/s for several thread counts")
+    parser.add_argument("--prompt", default="I am 34, my leg is broken and I am trapped under a wall.")
+    args = parser.parse_args()
+    if not args.model:
+        parser.error("--model or local_model_path is required")
+
+    llm = LocalLLM(args.model).load()
+    print(f"Loaded {llm.name} in {llm.load_time:.1f}s with {llm.n_threads} threads")
+    if args.tune:
+        speeds = llm.tune_threads()
+        print("tokens/s by threads:", {n: round(speed, 1) for n, speed in speeds.items()})
+        print(f"Set local_llm_threads={llm.n_threads}")
+    schema = {"type": "object", "properties": {"personal_info.age": {"type": "integer"},
+                                               "medical_info.injuries": {"type": "array", "items": {"type": "string"}}}}
+    for attempt in ("cold", "warm"):
+        start = time.perf_counter()
+        response = llm.complete([{"role": "system", "content": DEFAULT_SYSTEM_INSTRUCTION},
+                                 {"role": "user", "content": args.prompt}], json_schema=schema, max_tokens=64)
+        print(f"{attempt}: {time.perf_counter() - start:.2f}s {response['choices'][0]['message']['content']}")
+
+
+if __name__ == "__main__":
+    main()
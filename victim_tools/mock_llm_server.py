@@ -0,0 +1,282 @@
+"""
+Local Mock LLM Server
+=====================
+Serves the Gemini (generateContent) and OpenAI compatible (Groq through
+Helicone) chat endpoints from scripted responses, so the victim tools can be
+exercised and benchmarked without API keys or network access.
+
+Answers follow the prompts the tools send: compact update_victim_json prompts
+get a field patch, full prompts a ```json victim document, batch triage prompts
+a label per report and chat messages a short reply with a JSON block. Values come
+from the local fast_extractor. Scripted rules (regex -> response) take precedence.
+Latency, malformed JSON and server errors are injected at configurable rates.
+
+Usage:
+    python -m victim_tools.mock_llm_server --port 8088 --latency 0.4 --malformed-rate 0.1
+    groq_api_url=http://127.0.0.1:8088/openai/v1/chat/completions streamlit run victim_client_updated.py
+"""
+
+import argparse
+import ast
+import copy
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from victim_tools.fast_extractor import extract_fields
+
+_COMPACT_MESSAGE = re.compile(r"Fields still needed.*?\n\nMessage: (.*)", re.S)
+_FULL_MESSAGE = re.compile(r"new informations: (.*?)\n\n", re.S)
+_FULL_HISTORY = re.compile(r"based on history: (.*?)\n\n and new informations", re.S)
+_TRIAGE_LINE = re.compile(r'^\{"id": .*"report": .*\}$', re.M)
+_GEMINI_PATH = re.compile(r"/v1(?:beta)?/models/([^/:]+):generateContent$")
+# emergency_status set from the triage label, as the prompts ask the model to always set it
+EMERGENCY_STATUS = {'most_urgent': 'critical', 'urgent': 'urgent', 'less_urgent': 'stable', 'minor': 'stable'}
+
+
+class MockLLM:
+    """
+    Produces scripted model answers.
+
+    Attributes:
+        latency (float): Seconds added to every answer
+        jitter (float): Maximum random seconds added on top of latency
+        malformed_rate (float): Share of answers whose JSON is corrupted
+        error_rate (float): Share of requests answered with HTTP 503
+        rules (List[Tuple[re.Pattern, str]]): Scripted (pattern, response) pairs,
+            the first pattern found in the prompt wins
+        seed (int, optional): Seed of the random generator, for reproducible runs
+
+    Example:
+        >>> llm = MockLLM(seed=0)
+        >>> llm.answer("Fields still needed (path: type):\\n...\\n\\nMessage: I am 34 years old")
+        '{"personal_info.age": 34, "emergency_status": "stable"}'
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, malformed_rate: float = 0.0,
+                 error_rate: float = 0.0, rules: Optional[List[Tuple[str, str]]] = None,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.malformed_rate = malformed_rate
+        self.error_rate = error_rate
+        self.rules = [(re.compile(pattern, re.I), response) for pattern, response in rules or []]
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Seconds the next answer should take."""
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def fails(self) -> bool:
+        """Whether the next request should be answered with a server error."""
+        with self._lock:
+            self.requests += 1
+            return self._random.random() < self.error_rate
+
+    def answer(self, prompt: str) -> str:
+        """Answer to a prompt, possibly with malformed JSON."""
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return self._corrupt(response)
+
+        match = _COMPACT_MESSAGE.search(prompt)
+        if match:
+            fields = _victim_fields(match.group(1))
+            return self._corrupt(json.dumps({path.split('.', 1)[1]: value for path, value in fields.items()}))
+
+        match = _FULL_MESSAGE.search(prompt)
+        if match:
+            # Full prompts embed the current document (as a Python literal); update it
+            history = _FULL_HISTORY.search(prompt)
+            try:
+                document = ast.literal_eval(history.group(1)) if history else {}
+            except (ValueError, SyntaxError):
+                document = {}
+            document = _nest(_victim_fields(match.group(1)), document if isinstance(document, dict) else {})
+            return f"```json\n{self._corrupt(json.dumps(document, indent=2))}\n```"
+
+        reports = _TRIAGE_LINE.findall(prompt)
+        if reports:
+            results = []
+            for line in reports:
+                report = json.loads(line)
+                results.append({"id": report["id"], "risk": _triage(report["report"])})
+            return self._corrupt(json.dumps({"results": results}))
+
+        document = _nest(_victim_fields(prompt))
+        return ("I hear you, help is on the way. Are you injured anywhere?\n"
+                f"```json\n{self._corrupt(json.dumps(document))}\n```")
+
+    def _corrupt(self, text: str) -> str:
+        with self._lock:
+            if self._random.random() >= self.malformed_rate:
+                return text
+            kind = self._random.choice(('truncated', 'single_quotes', 'trailing_comma', 'prose'))
+            cut = self._random.randint(1, max(1, len(text) - 1))
+        if kind == 'truncated':
+            return text[:cut]
+        if kind == 'single_quotes':
+            return text.replace('"', "'")
+        if kind == 'trailing_comma':
+            return re.sub(r"(\}|\])\s*$", r",\1", text, count=1)
+        return f"Sure! Here is the JSON you asked for: {text}"
+
+
+def _victim_fields(message: str) -> Dict[str, Any]:
+    fields = extract_fields(message).fields
+    fields['victim_info.emergency_status'] = EMERGENCY_STATUS[_triage(message)]
+    return fields
+
+
+def _nest(fields: Dict[str, Any], document: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    document = copy.deepcopy(document) if document else {'victim_info': {}}
+    for path, value in fields.items():
+        *parents, leaf = path.split('.')
+        node = document
+        for key in parents:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        node[leaf] = value
+    return document
+
+
+def _triage(report: str) -> str:
+    fields = extract_fields(report).fields
+    text = report.lower()
+    if any(word in text for word in ('breath', 'unconscious', 'bleeding heavily', 'chest pain')):
+        return 'most_urgent'
+    if fields.get('victim_info.situation.trapped') or 'bleeding' in text:
+        return 'urgent'
+    if fields.get('victim_info.medical_info.injuries') or 'pain' in text:
+        return 'less_urgent'
+    return 'minor'
+
+
+def openai_prompt(body: Dict[str, Any]) -> str:
+    """Text of the last user message of an OpenAI style request."""
+    messages = [message for message in body.get('messages', []) if message.get('role') == 'user']
+    return str(messages[-1].get('content', '')) if messages else ''
+
+
+def gemini_prompt(body: Dict[str, Any]) -> str:
+    """Text of the last content of a Gemini generateContent request."""
+    contents = body.get('contents') or [{}]
+    return "".join(part.get('text', '') for part in contents[-1].get('parts', []))
+
+
+def openai_response(model: str, content: str, prompt: str) -> Dict[str, Any]:
+    return {
+        "id": f"mock-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                  "total_tokens": (len(prompt) + len(content)) // 4},
+    }
+
+
+def gemini_response(content: str, prompt: str) -> Dict[str, Any]:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": content}]},
+                        "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(content) // 4,
+                          "totalTokenCount": (len(prompt) + len(content)) // 4},
+    }
+
+
+def make_handler(llm: MockLLM) -> type:
+    """
+    Builds an HTTP request handler serving <prefix>/v1/chat/completions (OpenAI,
+    Groq and Helicone style) and /v1beta/models/<model>:generateContent (Gemini).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            except json.JSONDecodeError:
+                return self._send(400, {"error": {"message": "Invalid JSON body"}})
+
+            gemini = _GEMINI_PATH.search(path)
+            if not gemini and not path.endswith('/chat/completions'):
+                return self._send(404, {"error": {"message": f"Unknown endpoint {path}"}})
+            time.sleep(llm.delay())
+            if llm.fails():
+                return self._send(503, {"error": {"message": "Service unavailable (mock)"}})
+
+            if gemini:
+                prompt = gemini_prompt(body)
+                return self._send(200, gemini_response(llm.answer(prompt), prompt))
+            prompt = openai_prompt(body)
+            return self._send(200, openai_response(body.get('model', 'mock'), llm.answer(prompt), prompt))
+
+        def _send(self, status: int, body: Dict[str, Any]) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(llm: Optional[MockLLM] = None, host: str = "127.0.0.1",
+                 port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serves a mock model from a background thread.
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The running server (call shutdown() to stop
+        it) and its base URL, e.g. http://127.0.0.1:8088. The OpenAI compatible
+        endpoint is <base URL>/openai/v1/chat/completions
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(llm or MockLLM()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def load_rules(path: str) -> List[Tuple[str, str]]:
+    """Reads scripted rules from a JSONL file of {"match": regex, "response": text} lines."""
+    with open(path) as f:
+        return [(rule['match'], rule['response']) for rule in map(json.loads, f) if rule]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve scripted Gemini and OpenAI compatible model answers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random seconds added on top")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of answers with corrupted JSON")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--rules", help="JSONL file of scripted {\"match\", \"response\"} rules")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    llm = MockLLM(args.latency, args.jitter, args.malformed_rate, args.error_rate,
+                  load_rules(args.rules) if args.rules else None, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(llm))
+    print(f"Serving mock LLM on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
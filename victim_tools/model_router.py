@@ -0,0 +1,284 @@
+"""
+Latency-Aware Model Router
+==========================
+Routes LLM calls across providers and models. Every backend keeps rolling
+latency and error statistics; calls go to the fastest healthy backend for their
+task, are hedged on the next one when the first has not answered within its p95
+latency, and skip backends whose circuit breaker is open after repeated failures.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRouterError(Exception):
+    """No backend could answer a call."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending calls to a backend after consecutive failures.
+
+    The breaker opens after failure_threshold consecutive failures. Once
+    cooldown seconds have passed a single probe call is let through (half-open):
+    its success closes the breaker, its failure opens it again for twice as long,
+    up to max_cooldown.
+
+    Example:
+        >>> breaker = CircuitBreaker(failure_threshold=2)
+        >>> breaker.record(False); breaker.record(False)
+        >>> breaker.state, breaker.allow()
+        ('open', False)
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        """Whether a call may be sent. Claims the probe call when half-open."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def available(self) -> bool:
+        """Whether allow() would let a call through, without claiming the probe."""
+        state = self.state
+        return state == 'closed' or (state == 'half_open' and not self._probing)
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                self.cooldown = self.base_cooldown
+            else:
+                self.failures += 1
+                if self._probing:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                if self._probing or self.failures >= self.failure_threshold:
+                    self.opened_at = time.monotonic()
+            self._probing = False
+
+
+@dataclass
+class Backend:
+    """
+    One provider/model the router can call.
+
+    Attributes:
+        name: Unique name, e.g. 'groq/llama-3.1-8b-instant'
+        call: Callable answering a prompt; receives the keyword arguments of ModelRouter.call
+        tasks: Tasks the backend may serve, e.g. ('extraction', 'chat')
+        window: Number of recent calls kept for the statistics
+    """
+    name: str
+    call: Callable[..., Any]
+    tasks: Sequence[str] = ('extraction',)
+    window: int = 100
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+    def __post_init__(self):
+        self._latencies: deque = deque(maxlen=self.window)
+        self._outcomes: deque = deque(maxlen=self.window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._latencies.append(latency)
+            self._outcomes.append(ok)
+        self.breaker.record(ok)
+
+    def latency(self, quantile: float = 0.5) -> Optional[float]:
+        """Latency quantile of recent successful calls, None before the first one."""
+        with self._lock:
+            if not self._latencies:
+                return None
+            return float(np.quantile(np.fromiter(self._latencies, float), quantile))
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return 1.0 - sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': len(self._outcomes),
+            'p50_s': self.latency(0.5),
+            'p95_s': self.latency(0.95),
+            'error_rate': round(self.error_rate(), 3),
+            'circuit': self.breaker.state,
+        }
+
+
+@dataclass
+class RouteResult:
+    """
+    Answer of a routed call.
+
+    Attributes:
+        value: Return value of the backend that answered first
+        backend: Name of that backend
+        latency: Seconds until the answer
+        hedged: Whether a hedge request was sent
+    """
+    value: Any
+    backend: str
+    latency: float
+    hedged: bool = False
+
+
+class ModelRouter:
+    """
+    Sends each call to the fastest healthy backend of its task, with hedging.
+
+    Backends are ranked by median latency; those without statistics yet count
+    as answering in hedge_delay. When the first backend has not answered after
+    its p95 latency (hedge_delay before min_samples calls) the call is also sent
+    to the next backend and the first answer wins. Failed attempts fall through to the next
+    backend, up to max_attempts.
+
+    Args:
+        backends: Backends in order of preference
+        hedge_quantile: Latency quantile after which a hedge request is sent
+        hedge_delay: Hedge delay in seconds for backends with fewer than min_samples calls
+        min_hedge_delay, max_hedge_delay: Bounds of the hedge delay
+        max_attempts: Maximum number of backends tried per call
+        max_workers: Calls that may be in flight at the same time
+
+    Example:
+        >>> router = ModelRouter([Backend('slow', lambda prompt: time.sleep(0.5) or 'slow'),
+        ...                       Backend('fast', lambda prompt: 'fast')], hedge_delay=0.05)
+        >>> result = router.call('extraction', prompt='Age?')
+        >>> result.backend, result.hedged
+        ('fast', True)
+    """
+
+    def __init__(self, backends: List[Backend], hedge_quantile: float = 0.95, hedge_delay: float = 2.0,
+                 min_hedge_delay: float = 0.2, max_hedge_delay: float = 10.0, min_samples: int = 10,
+                 max_attempts: int = 3, max_workers: int = 8):
+        self.backends = list(backends)
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.min_samples = min_samples
+        self.max_attempts = max_attempts
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    def ranked(self, task: str) -> List[Backend]:
+        """Backends able to serve a task with a closed (or probing) circuit, fastest first."""
+        candidates = [backend for backend in self.backends if task in backend.tasks and backend.breaker.available()]
+        # Backends without statistics count as answering in hedge_delay; ties keep list order
+        return sorted(candidates, key=lambda backend: backend.latency() or self.hedge_delay)
+
+    def delay(self, backend: Backend) -> float:
+        """Seconds to wait for a backend before hedging."""
+        if len(backend._outcomes) < self.min_samples:
+            return self.hedge_delay
+        p95 = backend.latency(self.hedge_quantile) or self.hedge_delay
+        return min(max(p95, self.min_hedge_delay), self.max_hedge_delay)
+
+    def call(self, task: str, timeout: Optional[float] = None, **kwargs) -> RouteResult:
+        """
+        Routes a call.
+
+        Args:
+            task: Task of the call, selects the backends
+            timeout: Seconds to wait for an answer overall, None to wait for the attempts to end
+            **kwargs: Arguments passed to the backend callables
+
+        Returns:
+            RouteResult: First successful answer
+
+        Raises:
+            ModelRouterError: If every attempted backend failed, or none is available
+        """
+        start = time.perf_counter()
+        queue = self.ranked(task)
+        if not queue:
+            raise ModelRouterError(f"No healthy backend for {task}")
+        in_flight: Dict[Future, Backend] = {}
+        attempts, hedged, last_error = 0, False, None
+
+        def launch() -> bool:
+            nonlocal attempts
+            while queue and attempts < self.max_attempts:
+                backend = queue.pop(0)
+                if backend.breaker.allow():
+                    attempts += 1
+                    in_flight[self._executor.submit(self._timed, backend, kwargs)] = backend
+                    return True
+            return False
+
+        launch()
+        while in_flight:
+            first = next(iter(in_flight.values()))
+            wait_for = self.delay(first) if queue and not hedged and len(in_flight) == 1 else None
+            if timeout is not None:
+                remaining = timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    break
+                wait_for = remaining if wait_for is None else min(wait_for, remaining)
+            done, _ = wait(list(in_flight), timeout=wait_for, return_when=FIRST_COMPLETED)
+            if not done:
+                if queue and not hedged and launch():
+                    hedged = True
+                    logger.info(f"Hedging {task} call of {first.name}")
+                continue
+            for future in done:
+                backend = in_flight.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"{backend.name} failed: {e}")
+                    continue
+                return RouteResult(value, backend.name, time.perf_counter() - start, hedged)
+            if not in_flight:
+                launch()
+        raise ModelRouterError(f"No backend answered the {task} call") from last_error
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Rolling statistics of every backend, by name."""
+        return {backend.name: backend.stats() for backend in self.backends}
+
+    @staticmethod
+    def _timed(backend: Backend, kwargs: Dict[str, Any]) -> Any:
+        # Statistics are recorded even when a hedged call loses the race
+        start = time.perf_counter()
+        try:
+            value = backend.call(**kwargs)
+        except Exception:
+            backend.record(time.perf_counter() - start, ok=False)
+            raise
+        backend.record(time.perf_counter() - start, ok=True)
+        return value
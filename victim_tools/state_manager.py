@@ -3,14 +3,24 @@
 import streamlit as st
 from typing import Dict, Any
 
+from victim_tools.conversation_history import ConversationHistory
+
 class StateManager:
     def __init__(self):
         if "messages" not in st.session_state:
             st.session_state.messages = []
+        if "conversation_history" not in st.session_state:
+            st.session_state.conversation_history = ConversationHistory()
+
+    @property
+    def history(self) -> ConversationHistory:
+        """Token-budgeted history used for prompts."""
+        return st.session_state.conversation_history
 
     def add_message(self, role: str, content: str):
         """Add a new message to the chat history."""
         st.session_state.messages.append({"role": role, "content": content})
+        self.history.add(role, content)
 
     def display_messages(self):
         """Display all messages in the chat history."""
@@ -27,13 +37,15 @@ class StateManager:
     def clear_messages(self):
         """Clear all messages from the chat history."""
         st.session_state.messages = []
+        self.history.clear()
 
     def get_conversation_history(self) -> str:
-        """Get the entire conversation history as a single string."""
-        return "\n".join([f"{m['role']}: {m['content']}" for m in st.session_state.messages])
+        """Get the conversation history (summary, known facts and recent turns) as a single string."""
+        return self.history.rendered
 
     def update_victim_info(self, new_info: Dict[str, Any]):
         """Update the victim information in the session state."""
         if 'victim_info' not in st.session_state:
             st.session_state.victim_info = {}
-        st.session_state.victim_info.update(new_info)
\ No newline at end of file
+        st.session_state.victim_info.update(new_info)
+        self.history.set_victim_info(st.session_state.victim_info, st.session_state.get('field_confidence'))
\ No newline at end of file
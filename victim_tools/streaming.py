@@ -0,0 +1,242 @@
+"""
+Streaming Response Processing
+=============================
+Splits a model response into speakable sentences and fenced JSON blocks while it
+is still being generated, so the reply can be rendered token by token, spoken
+sentence by sentence and parsed as soon as a JSON block closes.
+"""
+
+import logging
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from victim_tools import json_repair
+
+logger = logging.getLogger(__name__)
+
+FENCE = "```"
+# End of a sentence: terminal punctuation (optionally followed by closing quotes
+# or brackets) and whitespace, or a blank line
+SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s+|\n\s*\n')
+SENTENCE_CHARS = '.!?…"\')] \t\r\n'
+
+
+@dataclass
+class StreamUpdate:
+    """
+    Output produced by one chunk of a stream.
+
+    Attributes:
+        sentences: Sentences completed by the chunk, outside of code fences
+        json_blocks: JSON blocks closed by the chunk, already parsed
+    """
+    sentences: List[str] = field(default_factory=list)
+    json_blocks: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class StreamAccumulator:
+    """
+    Incrementally scans streamed text for complete sentences and JSON blocks.
+
+    Scanning resumes where the previous chunk stopped, so the work stays linear
+    in the length of the response however it is split into chunks.
+    Sentences shorter than min_sentence_chars are joined with the next one so
+    that text-to-speech is not called for fragments like "Okay.".
+
+    Example:
+        >>> stream = StreamAccumulator()
+        >>> stream.feed("Okay. Stay calm, help is on the way. Are ").sentences
+        ['Okay. Stay calm, help is on the way.']
+        >>> stream.feed('you hurt?\\n```json\\n{"age": 34}\\n```').json_blocks
+        [{'age': 34}]
+        >>> stream.sentences
+        ['Okay. Stay calm, help is on the way.', 'Are you hurt?']
+    """
+
+    def __init__(self, on_sentence: Optional[Callable[[str], None]] = None,
+                 on_json: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 min_sentence_chars: int = 20):
+        self.on_sentence = on_sentence
+        self.on_json = on_json
+        self.min_sentence_chars = min_sentence_chars
+        self.sentences: List[str] = []
+        self.json_blocks: List[Dict[str, Any]] = []
+        self._text = ""
+        self._scan = 0            # next position to examine
+        self._sentence_start = 0  # start of the pending sentence
+        self._fence_body = None   # start of the open code block body, if inside one
+        self._fence_language = ""
+
+    @property
+    def text(self) -> str:
+        """Full text received so far, including code blocks."""
+        return self._text
+
+    @property
+    def display_text(self) -> str:
+        """Text received so far without the body of an unfinished code block."""
+        if self._fence_body is None:
+            return self._text
+        return self._text[:self._text.rfind(FENCE, 0, self._fence_body)]
+
+    @property
+    def spoken_text(self) -> str:
+        """Sentences emitted so far, joined."""
+        return " ".join(self.sentences)
+
+    def feed(self, chunk: str) -> StreamUpdate:
+        """
+        Adds a chunk of streamed text.
+
+        Returns:
+            StreamUpdate: Sentences and JSON blocks completed by this chunk
+        """
+        self._text += chunk
+        update = StreamUpdate()
+        while self._step(update, final=False):
+            pass
+        return update
+
+    def close(self) -> StreamUpdate:
+        """
+        Marks the end of the stream and flushes the pending sentence. An unclosed
+        JSON block is parsed as if it had been closed.
+        """
+        update = StreamUpdate()
+        while self._step(update, final=True):
+            pass
+        if self._fence_body is not None:
+            self._finish_block(self._text[self._fence_body:], update)
+            self._fence_body = None
+        else:
+            self._emit_sentence(self._text[self._sentence_start:], update, force=True)
+        self._scan = self._sentence_start = len(self._text)
+        return update
+
+    def _step(self, update: StreamUpdate, final: bool) -> bool:
+        """Processes the next sentence end or fence. Returns False when more text is needed."""
+        text = self._text
+        if self._fence_body is not None:
+            closing = text.find(FENCE, self._scan)
+            if closing < 0:
+                # Keep the last characters, they may be the start of the closing fence
+                self._scan = max(self._fence_body, len(text) - len(FENCE) + 1)
+                return False
+            self._finish_block(text[self._fence_body:closing], update)
+            self._fence_body = None
+            self._scan = self._sentence_start = closing + len(FENCE)
+            return True
+
+        opening = text.find(FENCE, self._scan)
+        limit = len(text) if opening < 0 else opening
+        if opening < 0 and not final:
+            limit = max(self._scan, len(text) - len(FENCE) + 1)
+        match = SENTENCE_END.search(text, self._scan, limit)
+        if match:
+            self._scan = match.end()
+            self._emit_sentence(text[self._sentence_start:match.end()], update)
+            return True
+        if opening < 0:
+            # Resume before trailing punctuation and whitespace, which may end a
+            # sentence once the next chunk arrives
+            self._scan = limit
+            while self._scan > self._sentence_start and text[self._scan - 1] in SENTENCE_CHARS:
+                self._scan -= 1
+            return False
+
+        # Code block: wait for the end of its first line, which holds the language
+        line_end = text.find("\n", opening + len(FENCE))
+        if line_end < 0:
+            self._scan = opening
+            return False
+        self._emit_sentence(text[self._sentence_start:opening], update, force=True)
+        self._fence_language = text[opening + len(FENCE):line_end].strip().lower()
+        self._fence_body = self._scan = line_end + 1
+        return True
+
+    def _emit_sentence(self, sentence: str, update: StreamUpdate, force: bool = False) -> None:
+        # Joins short sentences with the following ones unless forced
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            self._sentence_start = self._scan
+            return
+        if len(sentence) < self.min_sentence_chars and not force:
+            return
+        self._sentence_start = self._scan
+        self.sentences.append(sentence)
+        update.sentences.append(sentence)
+        if self.on_sentence:
+            self.on_sentence(sentence)
+
+    def _finish_block(self, body: str, update: StreamUpdate) -> None:
+        if self._fence_language not in ("json", "") and not body.lstrip().startswith("{"):
+            return
+        try:
+            data = json_repair.loads(body)
+        except json_repair.JSONRepairError as e:
+            logger.warning(f"Could not parse streamed JSON block: {e}")
+            return
+        if isinstance(data, dict):
+            self.json_blocks.append(data)
+            update.json_blocks.append(data)
+            if self.on_json:
+                self.on_json(data)
+
+
+class SpeechQueue:
+    """
+    Synthesizes sentences in the background as soon as they are complete.
+
+    Audio clips are returned in sentence order, so MP3 clips can be joined and
+    played as a single stream once the reply is finished.
+
+    Example:
+        >>> queue = SpeechQueue(lambda text: text.upper().encode())
+        >>> queue.submit("stay calm.")
+        >>> queue.audio()
+        b'STAY CALM.'
+    """
+
+    def __init__(self, synthesize: Callable[[str], Optional[bytes]], max_workers: int = 2):
+        self.synthesize = synthesize
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._clips: List[Future] = []
+
+    def submit(self, sentence: str) -> None:
+        """Starts synthesizing a sentence."""
+        self._clips.append(self._executor.submit(self.synthesize, sentence))
+
+    def audio(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Waits for every submitted sentence and joins the clips.
+
+        Returns:
+            bytes: Concatenated audio, or None if nothing could be synthesized
+        """
+        clips = []
+        for future in self._clips:
+            try:
+                clip = future.result(timeout=timeout)
+            except Exception as e:
+                logger.error(f"Error synthesizing speech: {e}")
+                continue
+            if clip:
+                clips.append(clip)
+        self._executor.shutdown(wait=False)
+        return b"".join(clips) or None
+
+
+def stream_text(chunks: Iterable[Any]) -> Iterable[str]:
+    """
+    Yields the text of streamed Gemini response chunks, skipping chunks without
+    text parts (e.g. function calls).
+    """
+    for chunk in chunks:
+        try:
+            text = chunk.text
+        except (ValueError, AttributeError):
+            continue
+        if text:
+            yield text
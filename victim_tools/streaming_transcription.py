@@ -0,0 +1,258 @@
+"""
+Streaming Transcription
+=======================
+Transcribes voice messages chunk by chunk instead of as one buffer. Incoming
+16 kHz audio is segmented by an energy-based voice activity detector: a chunk
+ends at a pause in speech (or after max_chunk_s of continuous speech), so words
+are not cut, and silence is never sent to Whisper. Each chunk is transcribed in
+the background while the next one is recorded, with the end of the transcript
+so far as Whisper's initial_prompt so names and context carry over.
+
+Every transcribed chunk is emitted as a partial transcript, which downstream
+extraction can start on before the victim has finished speaking.
+
+Usage:
+    transcriber = StreamingTranscriber(shared_whisper.transcribe)
+    for partial in transcriber.stream(blocks):
+        print(partial.transcript)
+"""
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from collections import deque
+from typing import Callable, Deque, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+@dataclass
+class Partial:
+    """
+    A transcribed chunk.
+
+    Attributes:
+        index: Chunk number, from 0
+        text: Text of this chunk
+        transcript: Text of every chunk so far
+        start_s, end_s: Position of the chunk in the stream
+        final: Whether the chunk was cut by the end of the stream
+    """
+    index: int
+    text: str
+    transcript: str
+    start_s: float
+    end_s: float
+    final: bool = False
+
+
+class EnergyVAD:
+    """
+    Frame-level voice activity detection on signal energy, relative to the
+    measured noise floor so background noise (wind, rain, machinery) is not
+    taken for speech and quiet speech in a quiet place is not dropped.
+
+    The noise floor is a low percentile of the frame energies: of the whole clip
+    when calibrate() is given one, then of the last window_s of the stream. It
+    follows quieter frames at once, but only rises with frames well below the
+    speech threshold (or when even the quietest frames of a window are above
+    it), so the soft ends of words do not raise it.
+
+    Args:
+        frame_ms: Frame length
+        ratio: Energy above the noise floor (as an RMS ratio) counted as speech
+        min_rms: Lowest noise floor, for digital silence
+        percentile: Percentile of the frame energies taken as the noise floor
+        window_s: Stream duration the noise floor is measured over
+
+    Example:
+        >>> rng = np.random.default_rng(0)
+        >>> noise = rng.normal(0, 0.02, SAMPLE_RATE).astype(np.float32)
+        >>> speech = (0.15 * np.sin(np.arange(480) / 3)).astype(np.float32)
+        >>> vad = EnergyVAD()
+        >>> vad.calibrate(noise)
+        >>> vad.is_speech(noise[:480]), vad.is_speech(speech + noise[:480])
+        (False, True)
+        >>> quiet = EnergyVAD()
+        >>> quiet.calibrate(noise / 20)
+        >>> quiet.is_speech(noise[:480] / 20), quiet.is_speech(speech / 20 + noise[:480] / 20)
+        (False, True)
+    """
+
+    def __init__(self, frame_ms: int = 30, ratio: float = 3.0, min_rms: float = 0.0005,
+                 percentile: float = 10.0, window_s: float = 5.0):
+        self.frame_size = SAMPLE_RATE * frame_ms // 1000
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.percentile = percentile
+        self.noise_floor = min_rms
+        self._energies: Deque[float] = deque(maxlen=max(1, int(window_s * 1000 / frame_ms)))
+
+    def frame_energies(self, audio: np.ndarray) -> np.ndarray:
+        """RMS of every complete frame of a clip."""
+        count = len(audio) // self.frame_size
+        frames = np.asarray(audio[:count * self.frame_size], dtype=np.float64).reshape(count, self.frame_size)
+        return np.sqrt(np.mean(np.square(frames), axis=1))
+
+    def calibrate(self, audio: np.ndarray) -> None:
+        """Sets the noise floor from a whole clip (or a stretch of background noise)."""
+        energies = self.frame_energies(audio)
+        if len(energies):
+            self.noise_floor = max(float(np.percentile(energies, self.percentile)), self.min_rms)
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(np.square(frame, dtype=np.float64)))) if len(frame) else 0.0
+        threshold = self.noise_floor * self.ratio
+        speech = rms >= threshold
+        self._energies.append(rms)
+        if rms < self.noise_floor:
+            self.noise_floor = max(0.5 * self.noise_floor + 0.5 * rms, self.min_rms)
+        elif rms < threshold / 2:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        elif len(self._energies) == self._energies.maxlen:
+            # The background got louder: even the quietest frames of the window count as speech
+            quietest = float(np.percentile(self._energies, self.percentile))
+            if quietest >= threshold:
+                self.noise_floor = quietest
+        return speech
+
+
+class StreamingTranscriber:
+    """
+    Cuts a stream of audio into speech chunks and transcribes them in order.
+
+    Args:
+        transcribe: transcribe(audio, **kwargs) returning an object with a .text,
+            e.g. WhisperService.transcribe
+        vad: Voice activity detector, defaults to EnergyVAD()
+        min_silence_s: Pause that ends a chunk
+        min_chunk_s: Shortest chunk, shorter pauses are kept inside the chunk
+        max_chunk_s: Longest chunk, cut even without a pause
+        padding_s: Audio kept before and after the speech of a chunk
+        prompt_chars: Characters of the transcript so far passed as initial_prompt
+        **options: Passed to every transcribe call (e.g. language)
+
+    Example:
+        >>> speech = (0.3 * np.sin(np.arange(SAMPLE_RATE) / 3)).astype(np.float32)
+        >>> pause = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        >>> calls = []
+        >>> def transcribe(audio, **kwargs):
+        ...     calls.append(kwargs['initial_prompt'])
+        ...     return type('Result', (), {'text': f"chunk {len(calls)}"})
+        >>> transcriber = StreamingTranscriber(transcribe)
+        >>> [(p.text, p.final) for p in transcriber.stream([speech, pause, speech, pause[:800]])]
+        [('chunk 1', False), ('chunk 2', True)]
+        >>> calls, transcriber.transcript
+        ([None, 'chunk 1'], 'chunk 1 chunk 2')
+    """
+
+    def __init__(self, transcribe: Callable[..., object], vad: Optional[EnergyVAD] = None,
+                 min_silence_s: float = 0.5, min_chunk_s: float = 1.0, max_chunk_s: float = 15.0,
+                 padding_s: float = 0.2, prompt_chars: int = 200, **options):
+        self.transcribe = transcribe
+        self.vad = vad or EnergyVAD()
+        self.min_silence_s = min_silence_s
+        self.min_chunk_s = min_chunk_s
+        self.max_chunk_s = max_chunk_s
+        self.padding = int(padding_s * SAMPLE_RATE)
+        self.prompt_chars = prompt_chars
+        self.options = options
+        self.texts: List[str] = []
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._frames: List[np.ndarray] = []
+        self._buffered = 0
+        self._position = 0
+        self._chunk_start: Optional[int] = None
+        self._last_speech = 0
+        self._silence = 0
+        self._futures: Deque[Future] = deque()
+        # One worker: chunks are transcribed in order, each with the text of the previous ones
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcribe")
+        self._chunks = 0
+
+    @property
+    def transcript(self) -> str:
+        return " ".join(text for text in self.texts if text)
+
+    def feed(self, samples: np.ndarray) -> None:
+        """Adds 16 kHz mono float32 samples; complete chunks start transcribing."""
+        self._pending = np.concatenate([self._pending, np.asarray(samples, dtype=np.float32)])
+        size = self.vad.frame_size
+        count = len(self._pending) // size
+        for index in range(count):
+            self._frame(self._pending[index * size:(index + 1) * size])
+        self._pending = self._pending[count * size:]
+
+    def finish(self) -> None:
+        """Ends the stream: the remaining speech becomes the last chunk."""
+        if len(self._pending):
+            self._frame(self._pending)
+            self._pending = np.zeros(0, dtype=np.float32)
+        self._cut(final=True)
+
+    def poll(self, wait: bool = False) -> Iterator[Partial]:
+        """Partials of the chunks transcribed so far, in order; with wait, of every submitted chunk."""
+        while self._futures and (wait or self._futures[0].done()):
+            yield self._futures.popleft().result()
+
+    def stream(self, blocks: Iterable[np.ndarray]) -> Iterator[Partial]:
+        """
+        Feeds blocks of audio and yields partials as soon as their chunk is
+        transcribed, in the caller's thread (so it may update the UI).
+        """
+        for block in blocks:
+            self.feed(block)
+            yield from self.poll()
+        self.finish()
+        yield from self.poll(wait=True)
+        self._executor.shutdown(wait=False)
+
+    def _frame(self, frame: np.ndarray) -> None:
+        speech = self.vad.is_speech(frame)
+        start = self._position
+        self._position += len(frame)
+        self._frames.append(frame)
+        self._buffered += len(frame)
+        if speech:
+            if self._chunk_start is None:
+                self._chunk_start = max(0, start - self.padding)
+            self._last_speech = self._position
+            self._silence = 0
+        elif self._chunk_start is None:
+            # Before speech, keep only the padding
+            while len(self._frames) > 1 and self._buffered - len(self._frames[0]) >= self.padding:
+                self._buffered -= len(self._frames.pop(0))
+            return
+        else:
+            self._silence += len(frame)
+        length = self._position - self._chunk_start
+        if (self._silence >= self.min_silence_s * SAMPLE_RATE and length >= self.min_chunk_s * SAMPLE_RATE) \
+                or length >= self.max_chunk_s * SAMPLE_RATE:
+            self._cut()
+
+    def _cut(self, final: bool = False) -> None:
+        if self._chunk_start is None:
+            return
+        audio = np.concatenate(self._frames) if self._frames else np.zeros(0, dtype=np.float32)
+        offset = self._position - self._buffered
+        begin = max(0, self._chunk_start - offset)
+        end = min(len(audio), self._last_speech + self.padding - offset)
+        chunk = audio[begin:end]
+        start_s, end_s = (offset + begin) / SAMPLE_RATE, (offset + end) / SAMPLE_RATE
+        self._frames, self._buffered, self._chunk_start, self._silence = [], 0, None, 0
+        index, self._chunks = self._chunks, self._chunks + 1
+        self._futures.append(self._executor.submit(self._transcribe, index, chunk, start_s, end_s, final))
+
+    def _transcribe(self, index: int, chunk: np.ndarray, start_s: float, end_s: float, final: bool) -> Partial:
+        context = self.transcript[-self.prompt_chars:] or None
+        try:
+            text = self.transcribe(chunk, initial_prompt=context, **self.options).text.strip()
+        except Exception as e:
+            logger.error(f"Error transcribing chunk {index}: {e}")
+            text = ""
+        self.texts.append(text)
+        return Partial(index, text, self.transcript, start_s, end_s, final)
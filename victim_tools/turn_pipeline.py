@@ -0,0 +1,146 @@
+"""
+Concurrent Turn Pipeline
+========================
+Runs the independent stages of a victim turn (text-to-speech, JSON extraction,
+Firebase sync) in worker threads once the reply is available, so the turn takes
+as long as its slowest stage rather than the sum of all stages.
+
+Every stage has its own timeout. A stage can depend on another one and then
+receives its result, e.g. the sync stage uploads what the extraction stage
+produced. Worker threads carry the Streamlit script context so stages may read
+st.session_state, but rendering should stay on the script thread.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 20.0
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # streamlit < 1.28 or used outside of streamlit
+    add_script_run_ctx = get_script_run_ctx = None
+
+
+@dataclass
+class StageResult:
+    """
+    Outcome of one pipeline stage.
+
+    Attributes:
+        name: Stage name
+        value: Return value of the stage, None if it failed or timed out
+        error: Exception raised by the stage (or by the stage it depends on)
+        elapsed: Seconds from the start of the turn until the stage finished or timed out
+        timed_out: Whether the stage missed its deadline
+    """
+    name: str
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out
+
+
+class TurnPipeline:
+    """
+    Runs the stages of one turn concurrently with per-stage timeouts.
+
+    Args:
+        max_workers: Number of stages that may run at the same time
+        default_timeout: Timeout in seconds of stages submitted without one
+
+    Example:
+        >>> pipeline = TurnPipeline()
+        >>> pipeline.submit("extract", lambda text: {"age": int(text)}, "34")
+        >>> pipeline.submit("sync", lambda info: f"synced {info}", after="extract")
+        >>> pipeline.submit("tts", lambda: b"audio")
+        >>> results = pipeline.results()
+        >>> results["sync"].value, results["tts"].ok
+        ("synced {'age': 34}", True)
+    """
+
+    def __init__(self, max_workers: int = 4, default_timeout: float = DEFAULT_TIMEOUT):
+        self.default_timeout = default_timeout
+        self._ctx = get_script_run_ctx() if get_script_run_ctx else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="turn",
+                                            initializer=self._attach_context)
+        self._futures: Dict[str, Future] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, timeout: Optional[float] = None,
+               after: Optional[str] = None, **kwargs) -> None:
+        """
+        Starts a stage.
+
+        Args:
+            name: Stage name, used as key of results()
+            fn: Callable running the stage
+            timeout: Seconds the stage may take, defaults to default_timeout. For a
+                dependent stage the deadline starts when its dependency's deadline ends
+            after: Name of a stage whose result is passed to fn as first argument.
+                The stage fails if its dependency fails
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        if after is None:
+            self._deadlines[name] = time.perf_counter() + timeout
+            self._futures[name] = self._executor.submit(fn, *args, **kwargs)
+            return
+
+        upstream = self._futures[after]
+        self._deadlines[name] = self._deadlines[after] + timeout
+
+        def run_after():
+            # Waits in the worker so the script thread never blocks on the chain
+            try:
+                value = upstream.result(timeout=max(0.0, self._deadlines[after] - time.perf_counter()))
+            except TimeoutError:
+                raise RuntimeError(f"Stage {after} timed out") from None
+            return fn(value, *args, **kwargs)
+
+        self._futures[name] = self._executor.submit(run_after)
+
+    def results(self) -> Dict[str, StageResult]:
+        """
+        Waits for every stage until its deadline.
+
+        Stages still running at their deadline are reported as timed out and left
+        to finish in the background; their results are discarded.
+
+        Returns:
+            Dict[str, StageResult]: Outcome of every stage, by name
+        """
+        results = {}
+        for name, future in self._futures.items():
+            result = StageResult(name)
+            try:
+                result.value = future.result(timeout=max(0.0, self._deadlines[name] - time.perf_counter()))
+            except TimeoutError as e:
+                result.timed_out = not future.done()
+                result.error = None if result.timed_out else e
+            except Exception as e:
+                result.error = e
+            result.elapsed = time.perf_counter() - self._start
+            if result.timed_out:
+                logger.warning(f"Stage {name} timed out after {result.elapsed:.2f}s")
+            elif result.error is not None:
+                logger.error(f"Stage {name} failed: {result.error}")
+            results[name] = result
+        self._executor.shutdown(wait=False)
+        logger.info("Turn stages: " + ", ".join(
+            f"{name} {result.elapsed:.2f}s" for name, result in results.items()))
+        return results
+
+    def _attach_context(self) -> None:
+        if self._ctx is not None:
+            add_script_run_ctx(threading.current_thread(), self._ctx)
@@ -0,0 +1,326 @@
+"""
+Victim Information Merge Engine
+===============================
+Merges model output into the victim document instead of replacing it. Patches
+may be RFC 6902 JSON Patch operation lists, RFC 7386 merge patches or partial
+documents (nested or with dotted keys). Every changed field goes through a rule:
+blank values never overwrite information, emergency_status only escalates and
+list fields (injuries, needs, hazards...) keep the union of their items.
+
+Each merge also returns the minimal JSON Patch between the old and new
+document, so only changed fields are synced to the rescue team database.
+"""
+
+import copy
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from victim_tools.victim_schema import EMERGENCY_STATUSES
+
+Path = Tuple[Union[str, int], ...]
+Rule = Callable[[Any, Any], Any]
+
+_MISSING = object()
+# EMERGENCY_STATUSES runs from most to least urgent; a higher rank is more urgent
+EMERGENCY_RANK = {status: rank for rank, status in enumerate(reversed(EMERGENCY_STATUSES))}
+
+
+class PatchError(ValueError):
+    """A patch operation is malformed or its test failed."""
+
+
+@dataclass
+class MergeResult:
+    """
+    Attributes:
+        document: The merged document (a new object, the input is not modified)
+        patch: Minimal RFC 6902 operations turning the old document into the new one
+    """
+    document: Dict[str, Any]
+    patch: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.patch)
+
+
+def is_blank(value) -> bool:
+    """
+    True for values holding no information: None, '' and lists or objects of
+    blanks. 0 and False are answers (no dependents, not trapped); telling them
+    apart from template defaults needs the filled fields, see vital_data.record_filled.
+
+    Example:
+        >>> is_blank(''), is_blank(['', None]), is_blank({'name': '', 'phone': None}), is_blank(0), is_blank(False)
+        (True, True, True, False, False)
+    """
+    if isinstance(value, list):
+        return all(is_blank(item) for item in value)
+    if isinstance(value, dict):
+        return all(is_blank(item) for item in value.values())
+    return value is None or value == ''
+
+
+def keep_informative(old, new):
+    """Takes the new value unless it is blank: blanks only fill missing fields."""
+    if is_blank(new) and old is not _MISSING:
+        return old
+    return new
+
+
+def escalate(old, new):
+    """
+    Keeps the most urgent emergency status.
+
+    Example:
+        >>> escalate('urgent', 'stable'), escalate('urgent', 'critical'), escalate('', 'stable')
+        ('urgent', 'critical', 'stable')
+    """
+    new_rank = EMERGENCY_RANK.get(new)
+    if new_rank is None:
+        return new if old is _MISSING else old
+    old_rank = EMERGENCY_RANK.get(old, -1)
+    return new if new_rank > old_rank else old
+
+
+def union(old, new):
+    """
+    Old items followed by the new ones not already present; blank items are dropped.
+
+    Example:
+        >>> union([''], ['broken leg']), union(['broken leg'], ['cut', 'broken leg'])
+        (['broken leg'], ['broken leg', 'cut'])
+    """
+    items = [item for item in (old if isinstance(old, list) else []) if not is_blank(item)]
+    for item in new if isinstance(new, list) else [new]:
+        if not is_blank(item) and item not in items:
+            items.append(item)
+    return items if items or old is _MISSING else old
+
+
+# Rules by dotted path; other fields use union for lists and keep_informative otherwise
+RULES: Dict[str, Rule] = {
+    'victim_info.emergency_status': escalate,
+}
+
+
+def merge(document: Dict[str, Any], patch: Union[Dict[str, Any], List[Dict[str, Any]]],
+          rules: Optional[Dict[str, Rule]] = None, force: bool = False) -> MergeResult:
+    """
+    Applies a patch to a copy of a document, field by field.
+
+    Args:
+        document: Current document
+        patch: RFC 6902 operation list, RFC 7386 merge patch or partial document.
+            Dict keys may be dotted paths, e.g. {"victim_info.personal_info.age": 34}
+        rules: Merge rule by dotted path, defaults to RULES
+        force: Apply the patch as is, without rules (blank values and removals included)
+
+    Returns:
+        MergeResult: Merged document and the minimal patch from the old one
+
+    Raises:
+        PatchError: If an operation is malformed or a test operation fails
+
+    Example:
+        >>> old = {'victim_info': {'emergency_status': 'urgent', 'personal_info': {'name': 'Ana', 'age': 0},
+        ...                        'medical_info': {'injuries': ['cut']}}}
+        >>> result = merge(old, {'victim_info': {'emergency_status': 'stable', 'personal_info': {'name': '', 'age': 34},
+        ...                                      'medical_info': {'injuries': ['broken leg']}}})
+        >>> result.document['victim_info']
+        {'emergency_status': 'urgent', 'personal_info': {'name': 'Ana', 'age': 34}, 'medical_info': {'injuries': ['cut', 'broken leg']}}
+        >>> result.patch
+        [{'op': 'replace', 'path': '/victim_info/personal_info/age', 'value': 34}, {'op': 'add', 'path': '/victim_info/medical_info/injuries/1', 'value': 'broken leg'}]
+        >>> merge(old, {'victim_info': {'personal_info': {}}}).patch
+        []
+    """
+    rules = RULES if rules is None else rules
+    merged = copy.deepcopy(document)
+    for op, path, value in _operations(patch, merged):
+        if op == 'test':
+            if _get(merged, path) != value:
+                raise PatchError(f"Test failed at {to_pointer(path)}")
+            continue
+        if force or _in_list(merged, path):
+            # Operations on list items are explicit edits, applied as is
+            _apply(merged, op, path, value)
+            continue
+        if op == 'remove':
+            # Removals (and nulls of merge patches) would blank the field
+            continue
+        old = _get(merged, path)
+        rule = rules.get('.'.join(path))
+        if rule is None:
+            rule = union if isinstance(value, list) or isinstance(old, list) else keep_informative
+        result = rule(old, value)
+        if result is not old:
+            _apply(merged, 'replace', path, result)
+    return MergeResult(merged, diff(document, merged))
+
+
+def diff(old: Any, new: Any, path: Path = ()) -> List[Dict[str, Any]]:
+    """
+    Minimal RFC 6902 patch from old to new. Objects are compared key by key and
+    lists that only grew get one add operation per new item.
+
+    Example:
+        >>> diff({'a': 1, 'b': {'c': [1]}}, {'a': 1, 'b': {'c': [1, 2]}, 'd': None})
+        [{'op': 'add', 'path': '/b/c/1', 'value': 2}, {'op': 'add', 'path': '/d', 'value': None}]
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': to_pointer(path + (key,))})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({'op': 'add', 'path': to_pointer(path + (key,)), 'value': copy.deepcopy(value)})
+            else:
+                ops.extend(diff(old[key], value, path + (key,)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(new) >= len(old) and new[:len(old)] == old:
+        return [{'op': 'add', 'path': to_pointer(path + (index,)), 'value': copy.deepcopy(new[index])}
+                for index in range(len(old), len(new))]
+    if old == new and type(old) is type(new):
+        return []
+    return [{'op': 'replace', 'path': to_pointer(path), 'value': copy.deepcopy(new)}]
+
+
+def to_update_paths(patch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Converts a JSON Patch to a Firebase multi-path update ('a/b/c': value,
+    None for removals).
+
+    Example:
+        >>> to_update_paths([{'op': 'replace', 'path': '/victim_info/personal_info/age', 'value': 34}])
+        {'victim_info/personal_info/age': 34}
+    """
+    updates = {}
+    for operation in patch:
+        key = '/'.join(str(part) for part in from_pointer(operation['path']))
+        updates[key] = None if operation['op'] == 'remove' else operation.get('value')
+    return updates
+
+
+def to_pointer(path: Path) -> str:
+    """JSON Pointer (RFC 6901) of a path."""
+    return ''.join('/' + str(key).replace('~', '~0').replace('/', '~1') for key in path)
+
+
+def from_pointer(pointer: str) -> Path:
+    """Path of a JSON Pointer."""
+    if pointer == '':
+        return ()
+    if not pointer.startswith('/'):
+        raise PatchError(f"Invalid JSON pointer {pointer!r}")
+    return tuple(part.replace('~1', '/').replace('~0', '~') for part in pointer[1:].split('/'))
+
+
+def _operations(patch, document) -> Iterator[Tuple[str, Path, Any]]:
+    """Normalizes a patch to (op, path, value) tuples; op is add, replace, remove or test."""
+    if isinstance(patch, dict):
+        for path, value in _leaves(patch):
+            yield ('remove' if value is None else 'add'), path, value
+        return
+    if not isinstance(patch, list):
+        raise PatchError(f"Unsupported patch type {type(patch).__name__}")
+    for operation in patch:
+        if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+            raise PatchError(f"Invalid operation {operation!r}")
+        op, path = operation['op'], from_pointer(operation['path'])
+        if op in ('add', 'replace', 'test'):
+            if 'value' not in operation:
+                raise PatchError(f"Operation {op} without value at {operation['path']}")
+            yield op, path, operation['value']
+        elif op == 'remove':
+            yield 'remove', path, None
+        elif op in ('copy', 'move'):
+            source = from_pointer(operation.get('from', ''))
+            value = _get(document, source)
+            if value is _MISSING:
+                raise PatchError(f"Operation {op} from missing {operation.get('from')}")
+            if op == 'move':
+                yield 'remove', source, None
+            yield 'add', path, copy.deepcopy(value)
+        else:
+            raise PatchError(f"Unknown operation {op!r}")
+
+
+def _leaves(patch: Dict[str, Any], prefix: Path = ()) -> Iterator[Tuple[Path, Any]]:
+    for key, value in patch.items():
+        path = prefix + tuple(str(key).split('.'))
+        if isinstance(value, dict) and value:
+            yield from _leaves(value, path)
+        else:
+            yield path, value
+
+
+def _index(node: list, key, op: str = 'replace') -> int:
+    """List index of a path part ('-' is the end of the list, for add)."""
+    if key == '-' and op == 'add':
+        return len(node)
+    try:
+        index = int(key)
+    except (TypeError, ValueError):
+        raise PatchError(f"Invalid list index {key!r}")
+    if not 0 <= index <= len(node) - (op != 'add'):
+        raise PatchError(f"List index {index} out of range")
+    return index
+
+
+def _get(document, path: Path):
+    node = document
+    for key in path:
+        if isinstance(node, dict) and str(key) in node:
+            node = node[str(key)]
+        elif isinstance(node, list) and str(key).isdigit() and int(key) < len(node):
+            node = node[int(key)]
+        else:
+            return _MISSING
+    return node
+
+
+def _is_index(key) -> bool:
+    return key == '-' or str(key).isdigit()
+
+
+def _in_list(document, path: Path) -> bool:
+    """
+    Whether the path goes through a list of the document, or ends with a list
+    index under a missing (or blank scalar) parent, which _apply creates as a list.
+    """
+    node = document
+    for key in path[:-1]:
+        if isinstance(node, list):
+            return True
+        if not isinstance(node, dict) or key not in node:
+            return not isinstance(node, list) and _is_index(path[-1])
+        node = node[key]
+    return isinstance(node, list) or (not isinstance(node, dict) and _is_index(path[-1]))
+
+
+def _apply(document, op: str, path: Path, value) -> None:
+    if not path:
+        raise PatchError("Operations on the document root are not supported")
+    node = document
+    for position, key in enumerate(path[:-1]):
+        if isinstance(node, list):
+            node = node[_index(node, key)]
+            continue
+        if not isinstance(node.get(key), (dict, list)):
+            # Missing parents are created, as lists when the next part is a list index
+            node[key] = [] if _is_index(path[position + 1]) else {}
+        node = node[key]
+    leaf = path[-1]
+    if isinstance(node, list):
+        index = _index(node, leaf, op)
+        if op == 'remove':
+            del node[index]
+        elif op == 'add':
+            node.insert(index, value)
+        else:
+            node[index] = value
+    elif op == 'remove':
+        node.pop(leaf, None)
+    else:
+        node[leaf] = value
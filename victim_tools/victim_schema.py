@@ -0,0 +1,313 @@
+"""
+Victim Schema
+=============
+Single definition of the victim document. The JSON Schema used for validation
+(llm_utils.schema), the Gemini response schema (llm_utils.victim_info_schema)
+and the blank template (configs/victim_json_template_flat.json) are all
+generated from VICTIM_FIELDS, so they cannot drift apart.
+
+Validators are compiled once per schema and cached. A compiled validator checks
+a document with plain Python type tests (about 50 µs for a victim document,
+against 450 µs for jsonschema) and only falls back to jsonschema to describe
+the errors of an invalid one.
+
+Usage:
+    python -m victim_tools.victim_schema  # rewrites configs/victim_json_template_flat.json
+"""
+
+import json
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from jsonschema import Draft7Validator, ValidationError
+
+EMERGENCY_STATUSES = ('critical', 'very_urgent', 'urgent', 'stable', 'unknown')
+
+# Field name -> type. A string is a JSON type, a list [type] an array of that
+# type, a tuple the allowed values of a string and a dict a nested object.
+VICTIM_FIELDS: Dict[str, Any] = {
+    'id': 'string',
+    'emergency_status': EMERGENCY_STATUSES,
+    'location': {
+        'lat': 'number',
+        'lon': 'number',
+        'details': 'string',
+        'nearest_landmark': 'string',
+    },
+    'personal_info': {
+        'name': 'string',
+        'age': 'integer',
+        'gender': 'string',
+        'language': 'string',
+        'physical_description': 'string',
+    },
+    'medical_info': {
+        'injuries': ['string'],
+        'pain_level': 'integer',
+        'medical_conditions': ['string'],
+        'medications': ['string'],
+        'allergies': ['string'],
+        'blood_type': 'string',
+    },
+    'situation': {
+        'disaster_type': 'string',
+        'immediate_needs': ['string'],
+        'trapped': 'boolean',
+        'mobility': 'string',
+        'nearby_hazards': ['string'],
+    },
+    'contact_info': {
+        'phone': 'string',
+        'email': 'string',
+        'emergency_contact': {
+            'name': 'string',
+            'relationship': 'string',
+            'phone': 'string',
+        },
+    },
+    'resources': {
+        'food_status': 'string',
+        'water_status': 'string',
+        'shelter_status': 'string',
+        'communication_devices': ['string'],
+    },
+    'rescue_info': {
+        'last_contact': 'string',
+        'rescue_team_eta': 'string',
+        'special_rescue_needs': 'string',
+    },
+    'environmental_data': {
+        'temperature': 'number',
+        'humidity': 'number',
+        'air_quality': 'string',
+        'weather': 'string',
+    },
+    'device_data': {
+        'battery_level': 'integer',
+        'network_status': 'string',
+    },
+    'social_info': {
+        'group_size': 'integer',
+        'dependents': 'integer',
+        'nearby_victims_count': 'integer',
+        'can_communicate_verbally': 'boolean',
+    },
+    'psychological_status': {
+        'stress_level': 'string',
+        'special_needs': 'string',
+    },
+}
+
+TEMPLATE_PATH = 'configs/victim_json_template_flat.json'
+
+_BLANK = {'string': '', 'integer': 0, 'number': 0.0, 'boolean': False}
+
+
+def to_json_schema(fields: Dict[str, Any] = VICTIM_FIELDS, root: str = 'victim_info') -> Dict[str, Any]:
+    """
+    JSON Schema of a document {root: fields}. Every field is required.
+
+    Example:
+        >>> to_json_schema({'age': 'integer'})['properties']['victim_info']
+        {'type': 'object', 'properties': {'age': {'type': 'integer'}}, 'required': ['age']}
+    """
+    return {'type': 'object', 'properties': {root: _json_schema(fields)}, 'required': [root]}
+
+
+def _json_schema(spec) -> Dict[str, Any]:
+    if isinstance(spec, dict):
+        return {'type': 'object',
+                'properties': {name: _json_schema(child) for name, child in spec.items()},
+                'required': list(spec)}
+    if isinstance(spec, list):
+        return {'type': 'array', 'items': _json_schema(spec[0])}
+    if isinstance(spec, tuple):
+        return {'type': 'string', 'enum': list(spec)}
+    return {'type': spec}
+
+
+def to_gemini_schema(fields: Dict[str, Any] = VICTIM_FIELDS):
+    """
+    Gemini (genai.protos.Schema) response schema of the fields.
+
+    Allowed values are not passed to Gemini, enum strings are plain strings.
+    """
+    import google.generativeai as genai
+
+    types = {
+        'string': genai.protos.Type.STRING, 'integer': genai.protos.Type.INTEGER,
+        'number': genai.protos.Type.NUMBER, 'boolean': genai.protos.Type.BOOLEAN,
+    }
+
+    def build(spec):
+        if isinstance(spec, dict):
+            return genai.protos.Schema(type=genai.protos.Type.OBJECT,
+                                       properties={name: build(child) for name, child in spec.items()})
+        if isinstance(spec, list):
+            return genai.protos.Schema(type=genai.protos.Type.ARRAY, items=build(spec[0]))
+        if isinstance(spec, tuple):
+            return genai.protos.Schema(type=genai.protos.Type.STRING)
+        return genai.protos.Schema(type=types[spec])
+
+    return build(fields)
+
+
+def to_template(fields: Dict[str, Any] = VICTIM_FIELDS, root: str = 'victim_info') -> Dict[str, Any]:
+    """
+    Blank document of the fields: empty strings, zeros, false and [""] for arrays.
+
+    Example:
+        >>> to_template({'age': 'integer', 'injuries': ['string']})
+        {'victim_info': {'age': 0, 'injuries': ['']}}
+    """
+    def build(spec):
+        if isinstance(spec, dict):
+            return {name: build(child) for name, child in spec.items()}
+        if isinstance(spec, list):
+            return [build(spec[0])]
+        if isinstance(spec, tuple):
+            return ''
+        return _BLANK[spec]
+
+    return {root: build(fields)}
+
+
+class SchemaValidator:
+    """
+    Validator of one JSON Schema, compiled once.
+
+    Schemas using only type, properties, required, enum and items are compiled
+    to nested Python checks; other schemas are validated by jsonschema alone.
+    The jsonschema Draft7Validator is built on first use, to report errors.
+
+    Example:
+        >>> validator = get_validator(to_json_schema({'age': 'integer'}))
+        >>> validator.is_valid({'victim_info': {'age': 34}}), validator.is_valid({'victim_info': {'age': '34'}})
+        (True, False)
+    """
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+        self._check = _compile(schema)
+        self._validator: Optional[Draft7Validator] = None
+
+    @property
+    def validator(self) -> Draft7Validator:
+        if self._validator is None:
+            Draft7Validator.check_schema(self.schema)
+            self._validator = Draft7Validator(self.schema)
+        return self._validator
+
+    def is_valid(self, instance: Any) -> bool:
+        if self._check is not None:
+            return self._check(instance)
+        return self.validator.is_valid(instance)
+
+    def iter_errors(self, instance: Any) -> Iterator[ValidationError]:
+        """Validation errors of an instance (none when it is valid)."""
+        if self.is_valid(instance):
+            return iter(())
+        return self.validator.iter_errors(instance)
+
+    def validate(self, instance: Any) -> None:
+        """
+        Raises:
+            ValidationError: The first error of an invalid instance
+        """
+        if not self.is_valid(instance):
+            self.validator.validate(instance)
+
+
+_validators: Dict[int, SchemaValidator] = {}
+_validators_lock = threading.Lock()
+
+
+def get_validator(schema: Dict[str, Any]) -> SchemaValidator:
+    """
+    Cached validator of a schema. Schemas are cached by identity, so they must
+    not be modified once validated.
+    """
+    validator = _validators.get(id(schema))
+    if validator is None or validator.schema is not schema:
+        with _validators_lock:
+            validator = SchemaValidator(schema)
+            _validators[id(schema)] = validator
+    return validator
+
+
+_COMPILED_KEYWORDS = {'type', 'properties', 'required', 'enum', 'items', 'title', 'description', 'default'}
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    'string': lambda value: isinstance(value, str),
+    'integer': lambda value: (isinstance(value, int) and not isinstance(value, bool))
+                             or (isinstance(value, float) and value.is_integer()),
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'boolean': lambda value: isinstance(value, bool),
+    'array': lambda value: isinstance(value, list),
+    'object': lambda value: isinstance(value, dict),
+    'null': lambda value: value is None,
+}
+
+
+def _compile(node: Dict[str, Any]) -> Optional[Callable[[Any], bool]]:
+    """Compiles a schema to a predicate, or returns None if it uses other keywords."""
+    if not isinstance(node, dict) or set(node) - _COMPILED_KEYWORDS:
+        return None
+    checks: List[Callable[[Any], bool]] = []
+
+    kind = node.get('type')
+    if kind is not None:
+        kinds = [kind] if isinstance(kind, str) else list(kind)
+        if any(kind not in _TYPE_CHECKS for kind in kinds):
+            return None
+        if len(kinds) == 1:
+            checks.append(_TYPE_CHECKS[kinds[0]])
+        else:
+            type_checks = [_TYPE_CHECKS[kind] for kind in kinds]
+            checks.append(lambda value: any(check(value) for check in type_checks))
+
+    if 'enum' in node:
+        allowed = node['enum']
+        checks.append(lambda value: value in allowed)
+
+    required = tuple(node.get('required', ()))
+    properties = {}
+    for name, child in node.get('properties', {}).items():
+        properties[name] = _compile(child)
+        if properties[name] is None:
+            return None
+    if required or properties:
+        property_checks = tuple(properties.items())
+
+        def check_object(value) -> bool:
+            if not isinstance(value, dict):
+                return True
+            for name in required:
+                if name not in value:
+                    return False
+            for name, check in property_checks:
+                if name in value and not check(value[name]):
+                    return False
+            return True
+
+        checks.append(check_object)
+
+    if 'items' in node:
+        item_check = _compile(node['items'])
+        if item_check is None:
+            return None
+        checks.append(lambda value: not isinstance(value, list) or all(item_check(item) for item in value))
+
+    if len(checks) == 1:
+        return checks[0]
+    checks = tuple(checks)
+    return lambda value: all(check(value) for check in checks)
+
+
+def main():
+    with open(TEMPLATE_PATH, 'w') as f:
+        json.dump(to_template(), f, indent=2)
+    print(f"Wrote {TEMPLATE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 from typing import List, Tuple, Optional, Dict, Any
+import functools
 import streamlit as st
 import google.generativeai as genai
 import json
 import os
 import dotenv
 from victim_tools.llm_utils import schema, victim_info_schema
+from victim_tools import json_repair
+from victim_tools.llm_cache import shared_cache
+from victim_tools.llm_metrics import shared_metrics
+from victim_tools.model_router import Backend, ModelRouter, ModelRouterError
+from victim_tools.victim_merge import diff, from_pointer, is_blank, merge
 
 dotenv.load_dotenv()
 
@@ -38,45 +44,390 @@ headers = {
     'Helicone-Target-URL': 'https://api.groq.com',
 }
 
-url = "https://groq.helicone.ai/openai/v1/chat/completions"
+# groq_api_url and gemini_api_endpoint point the clients at another server, e.g. victim_tools.mock_llm_server
+url = os.getenv('groq_api_url', "https://groq.helicone.ai/openai/v1/chat/completions")
+gemini_api_endpoint = os.getenv('gemini_api_endpoint')
+GROQ_MODEL = "llama-3.1-70b-versatile"  # or whichever model you're using
+GROQ_FAST_MODEL = "llama-3.1-8b-instant"
+GEMINI_MODEL = "gemini-1.5-flash-8b-exp-0827"
+# Seconds before a routed extraction request is abandoned
+REQUEST_TIMEOUT = 30
 
-def send_message(message, system_instruction=None):
+def send_message(message, system_instruction=None, json_mode=False, max_tokens=2048, model=GROQ_MODEL,
+                 timeout=None, stage=None, json_schema=None):
     messages = []
     if system_instruction:
         messages.append({"role": "system", "content": system_instruction})
     messages.append({"role": "user", "content": message})
 
     data = {
-        "model": "llama-3.1-70b-versatile",  # or whichever model you're using
-        #"model": "llama-3.1-8b-instant",
+        "model": model,
         "messages": messages,
         "temperature": 0.7,
-        "max_tokens": 2048,
+        "max_tokens": max_tokens,
         "stream": False,
     }
+    if json_mode:
+        data["response_format"] = {"type": "json_object"}
 
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    return response.json()
+    with shared_metrics.track('groq', model, stage, prompt=message) as call:
+        response = requests.post(url, headers=headers, json=data, timeout=timeout)
+        response.raise_for_status()
+        body = response.json()
+        call.set_response_usage(body)
+    return body
 
 
+def send_gemini_message(message, system_instruction=None, json_mode=False, max_tokens=2048, model=GEMINI_MODEL,
+                        stage=None, json_schema=None):
+    """Same interface and response shape as send_message, answered by Gemini."""
+    if gemini_api_endpoint:
+        genai.configure(api_key=gemini_api, transport="rest", client_options={"api_endpoint": gemini_api_endpoint})
+    else:
+        genai.configure(api_key=gemini_api)
+    generation_config = {"temperature": 0.7, "max_output_tokens": max_tokens}
+    if json_mode:
+        generation_config["response_mime_type"] = "application/json"
+    gemini = genai.GenerativeModel(model, system_instruction=system_instruction, generation_config=generation_config)
+    with shared_metrics.track('gemini', model, stage, prompt=message) as call:
+        response = gemini.generate_content(message, request_options={"timeout": REQUEST_TIMEOUT})
+        call.set_response_usage(response)
+    usage = response.usage_metadata
+    return {
+        "choices": [{"message": {"content": response.text}}],
+        "usage": {"prompt_tokens": usage.prompt_token_count, "completion_tokens": usage.candidates_token_count},
+    }
+
+
+# Models answering update_victim_json, in order of preference. 'update' calls
+# carry the whole schema and document, 'extraction' calls are compact patches
+# that the small model handles as well. Each call goes to the fastest healthy
+# model and is hedged on the next one when it is slower than usual.
+extraction_router = ModelRouter([
+    Backend(f"groq/{GROQ_MODEL}", functools.partial(send_message, model=GROQ_MODEL, timeout=REQUEST_TIMEOUT),
+            tasks=('update', 'extraction')),
+    Backend(f"groq/{GROQ_FAST_MODEL}", functools.partial(send_message, model=GROQ_FAST_MODEL, timeout=REQUEST_TIMEOUT),
+            tasks=('extraction',)),
+    Backend(f"gemini/{GEMINI_MODEL}", send_gemini_message, tasks=('update', 'extraction')),
+])
+
+# Quantized model run on the CPU (see victim_tools.local_llm), enabled by local_model_path.
+# victim_extraction_backend: 'auto' adds it to the extraction models, 'local' uses
+# it alone (no network needed, compact prompts only), 'remote' ignores it.
+EXTRACTION_BACKEND = os.getenv('victim_extraction_backend', 'auto')
+if os.getenv('local_model_path') and EXTRACTION_BACKEND != 'remote':
+    from victim_tools.local_llm import get_local_llm, send_local_message
+    local_backend = Backend(f"local/{get_local_llm().name}", send_local_message, tasks=('extraction',))
+    if EXTRACTION_BACKEND == 'local':
+        extraction_router = ModelRouter([local_backend])
+    else:
+        extraction_router.backends.append(local_backend)
+    # Loaded in the background, so the first message does not wait for it
+    get_local_llm().load_async()
+
+
+# Prompt modes of update_victim_json: 'full' resends the schema and the whole
+# victim_info, 'compact' sends only the fields still to fill and asks for a patch
+PROMPT_MODE = os.getenv('victim_prompt_mode', 'compact')
+# Fields whose confidence (st.session_state['field_confidence']) is below this are asked again
+LOW_CONFIDENCE = 0.6
+# Confidence recorded for the fields the extraction model fills
+MODEL_CONFIDENCE = 0.8
+# Fields the model may always revise
+ALWAYS_REQUESTED = ('victim_info.emergency_status',)
+# Fields filled by sensors, geolocation or the rescue team rather than the conversation
+NOT_REQUESTED = ('victim_info.id', 'victim_info.location.lat', 'victim_info.location.lon',
+                 'victim_info.environmental_data.', 'victim_info.device_data.', 'victim_info.rescue_info.')
+
+
+def schema_fields(node: Dict[str, Any] = schema, prefix: str = '') -> Dict[str, str]:
+    """
+    Maps the dotted path of every leaf field of a JSON schema to its type.
+
+    Example:
+        >>> schema_fields()['victim_info.personal_info.age']
+        'integer'
+    """
+    if node.get('type') == 'object' and 'properties' in node:
+        fields = {}
+        for key, child in node['properties'].items():
+            fields.update(schema_fields(child, f"{prefix}.{key}" if prefix else key))
+        return fields
+    if node.get('type') == 'array':
+        return {prefix: f"array of {node.get('items', {}).get('type', 'string')}"}
+    if 'enum' in node:
+        return {prefix: ' | '.join(node['enum'])}
+    return {prefix: node.get('type', 'string')}
+
+
+def get_path(document: Dict[str, Any], path: str, default=None):
+    """Returns the value at a dotted path, or default when any key is missing."""
+    value = document
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return default
+        value = value[key]
+    return value
+
+
+def fields_to_request(victim_info: Dict[str, Any], confidence: Optional[Dict[str, float]] = None,
+                      threshold: float = LOW_CONFIDENCE) -> Dict[str, str]:
+    """
+    Selects the fields a compact prompt asks for: blank fields, fields with a
+    confidence below threshold, and ALWAYS_REQUESTED fields. NOT_REQUESTED
+    fields are never asked for.
+
+    Args:
+        victim_info: Current victim document (with the top-level 'victim_info' key)
+        confidence: Confidence per dotted path of the filled fields (see record_filled).
+            Fields without one hold template defaults (0, False) and are asked for;
+            None considers every non-blank field filled.
+        threshold: Minimum confidence for a filled field to be considered known
+
+    Returns:
+        Dict[str, str]: Type of every requested field, by dotted path
+
+    Example:
+        >>> document = {'victim_info': {'social_info': {'dependents': 0, 'group_size': 0}}}
+        >>> fields = fields_to_request(document, {'victim_info.social_info.dependents': 0.9})
+        >>> 'victim_info.social_info.dependents' in fields, 'victim_info.social_info.group_size' in fields
+        (False, True)
+    """
+    return {
+        path: kind for path, kind in schema_fields().items()
+        if not path.startswith(NOT_REQUESTED) and (
+            path in ALWAYS_REQUESTED
+            or is_blank(get_path(victim_info, path))
+            or (confidence is not None and confidence.get(path, 0.0) < threshold))
+    }
+
+
+def record_filled(confidence: Optional[Dict[str, float]], old: Dict[str, Any], new: Dict[str, Any],
+                  value: float = MODEL_CONFIDENCE) -> Dict[str, float]:
+    """
+    Adds the fields changed from old to new to the field confidences, so fields
+    filled by the extraction model count as known, 0 and False included.
+
+    Example:
+        >>> record_filled({'victim_info.personal_info.age': 0.95},
+        ...               {'victim_info': {'personal_info': {'age': 34}, 'situation': {'trapped': True}}},
+        ...               {'victim_info': {'personal_info': {'age': 34}, 'situation': {'trapped': False}}})
+        {'victim_info.personal_info.age': 0.95, 'victim_info.situation.trapped': 0.8}
+    """
+    confidence = dict(confidence or {})
+    for operation in diff(old, new):
+        if operation['op'] == 'remove':
+            continue
+        path = []
+        # List items count for their list field
+        for key in from_pointer(operation['path']):
+            if str(key).isdigit():
+                break
+            path.append(str(key))
+        path = '.'.join(path)
+        changed = operation['value']
+        for filled in (_flatten(changed, path) if isinstance(changed, dict) else [path]):
+            confidence[filled] = max(confidence.get(filled, 0.0), value)
+    return confidence
+
+
+def build_compact_prompt(new_infos, fields: Dict[str, str]) -> str:
+    """
+    Builds a prompt asking only for the requested fields, answered as a patch.
+
+    The static instructions come first and the message last, so a local model
+    reuses the KV cache of everything before the message across turns.
+    """
+    field_list = "\n".join(f"{path.split('.', 1)[1]}: {kind}" for path, kind in fields.items())
+    return (
+        "Extract rescue information from the victim's latest message.\n"
+        "Return a JSON object mapping field paths to values stated or clearly implied by the "
+        "message, e.g. {\"personal_info.age\": 34, \"medical_info.injuries\": [\"broken leg\"]}. "
+        "Omit fields the message does not mention; never return blank values. "
+        "Set emergency_status only if the message changes it, and keep it low by default.\n\n"
+        f"Fields still needed (path: type):\n{field_list}\n\n"
+        f"Message: {new_infos}"
+    )
+
+
+def patch_schema(fields: Dict[str, str]) -> Dict[str, Any]:
+    """
+    JSON schema of a compact patch: an object whose optional keys are the
+    requested paths (without 'victim_info.'), used to constrain local models.
+
+    Example:
+        >>> patch_schema({'victim_info.personal_info.age': 'integer', 'victim_info.emergency_status': 'critical | stable'})
+        {'type': 'object', 'properties': {'personal_info.age': {'type': 'integer'}, 'emergency_status': {'enum': ['critical', 'stable']}}, 'additionalProperties': False}
+    """
+    properties = {}
+    for path, kind in fields.items():
+        if kind.startswith('array of '):
+            prop = {'type': 'array', 'items': {'type': kind[len('array of '):]}}
+        elif ' | ' in kind:
+            prop = {'enum': kind.split(' | ')}
+        else:
+            prop = {'type': kind}
+        properties[path.split('.', 1)[1]] = prop
+    return {'type': 'object', 'properties': properties, 'additionalProperties': False}
+
+
+def apply_field_patch(victim_info: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merges a patch of dotted paths (or nested objects) into a copy of victim_info.
+
+    Unknown paths and blank values are ignored and values are coerced to the
+    schema type, then merged with the victim_merge rules (list fields keep their
+    existing items, emergency_status only escalates).
+
+    Example:
+        >>> apply_field_patch({'victim_info': {'personal_info': {'age': 0}}},
+        ...                   {'personal_info.age': '34'})
+        {'victim_info': {'personal_info': {'age': 34}}}
+    """
+    fields = schema_fields()
+    coerced = {}
+    for path, value in _flatten(patch).items():
+        if not path.startswith('victim_info.'):
+            path = f"victim_info.{path}"
+        if path not in fields or is_blank(value):
+            continue
+        value = _coerce(value, fields[path])
+        if value is not None:
+            coerced[path] = value
+    return merge(victim_info, coerced).document
+
+
+def _flatten(patch: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    flat = {}
+    for key, value in patch.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        else:
+            flat[path] = value
+    return flat
+
+
+def _coerce(value, kind: str):
+    try:
+        if kind == 'integer':
+            return int(float(value))
+        if kind == 'number':
+            return float(value)
+        if kind == 'boolean':
+            return value if isinstance(value, bool) else str(value).strip().lower() in ('true', 'yes', '1')
+        if kind.startswith('array'):
+            return [str(item) for item in (value if isinstance(value, list) else [value]) if not is_blank(item)]
+        if ' | ' in kind:
+            value = str(value).strip().lower().replace(' ', '_')
+            return value if value in kind.split(' | ') else None
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_token_usage(mode: str, prompt: str, response: Dict[str, Any], latency: float,
+                       model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Appends the token usage of one update_victim_json call to
+    st.session_state['token_usage']. Counts are estimated (4 characters per
+    token) when the API does not report usage.
+    """
+    usage = response.get('usage') or {}
+    entry = {
+        'mode': mode,
+        'model': model,
+        'prompt_chars': len(prompt),
+        'prompt_tokens': usage.get('prompt_tokens', len(prompt) // 4),
+        'completion_tokens': usage.get('completion_tokens'),
+        'latency_s': round(latency, 3),
+    }
+    st.session_state.setdefault('token_usage', []).append(entry)
+    return entry
+
+
+def _cached_answer(task: str, suffix: str, utterance: str, state: Any):
+    """
+    Earlier result for the utterance from any backend of the task, in order of
+    preference. Results are stored under the backend that produced them.
+    """
+    for backend in extraction_router.backends:
+        if task in backend.tasks:
+            cached = shared_cache.get(backend.name + suffix, utterance, state=state)
+            if cached is not None:
+                return cached
+    return None
+
+
+def update_victim_json(new_infos: Optional[Dict[str, Any]], mode: Optional[str] = None):
+    """
+    Updates the victim document with new information through the Groq model.
+
+    Args:
+        new_infos: Latest message or model reply holding new information
+        mode: 'compact' (default, see PROMPT_MODE) or 'full'
+
+    Returns:
+        str: Updated victim document as a JSON string, or None if the call failed
+    """
+    mode = mode or st.session_state.get('prompt_mode', PROMPT_MODE)
+    if mode == 'compact' or EXTRACTION_BACKEND == 'local':
+        return _update_victim_json_compact(new_infos)
 
-def update_victim_json(new_infos: Optional[Dict[str, Any]]):
     json_template = st.session_state.get('json_template', {})
     history_infos = st.session_state.get('victim_info', {})
-    
+
+    cached = _cached_answer('update', '', str(new_infos), history_infos)
+    if cached is not None:
+        return cached
+
     prompt = f"Update the JSON structure: {schema}\n\n with accurate informations based on history: {history_infos}\n\n and new informations: {new_infos}\n\n. Output should be a JSON file. Fit new information in the main structure of the template [{json_template.keys()}]. Leave blank (e.g.""), when there is no information. Do not overwrite existing information provided, unless it's to update it into something more informative. NEVER replace existing information with blank values! Ask follow-up questions to keep filling the json file, but in a natural way and prioritizing the most importants ones for rescue. Always update emergency_status [unknown, stable, urgent, very_urgent, critical], but keep it low by default. Output:"
 
     try:
-        response = send_message(prompt)
+        route = extraction_router.call('update', message=prompt, stage='update')
+        response = route.value
+        record_token_usage('full', prompt, response, route.latency, route.backend)
         content = response['choices'][0]['message']['content']
         
         try:
-            return content.split('```json')[1].split('```')[0]
-        except json.JSONDecodeError:
+            updated = json.dumps(json_repair.loads(content))
+            shared_cache.put(route.backend, str(new_infos), updated, state=history_infos)
+            return updated
+        except json_repair.JSONRepairError:
             print("Failed to parse response as JSON. Raw response:")
             print(content)
             return None
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ModelRouterError) as e:
         print(f"An error occurred: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def _update_victim_json_compact(new_infos) -> Optional[str]:
+    history_infos = st.session_state.get('victim_info') or st.session_state.get('json_template', {})
+    fields = fields_to_request(history_infos, st.session_state.get('field_confidence', {}))
+    # The patch only depends on the message and on the fields asked for
+    cached = _cached_answer('extraction', ':patch', str(new_infos), sorted(fields))
+    if cached is not None:
+        return json.dumps(apply_field_patch(history_infos, cached))
+    prompt = build_compact_prompt(new_infos, fields)
+
+    try:
+        route = extraction_router.call('extraction', message=prompt, json_mode=True, max_tokens=512,
+                                      stage='extraction', json_schema=patch_schema(fields))
+        response = route.value
+        record_token_usage('compact', prompt, response, route.latency, route.backend)
+        content = response['choices'][0]['message']['content']
+    except (requests.exceptions.RequestException, ModelRouterError) as e:
+        print(f"An error occurred: {e}")
+        return None
+
+    try:
+        patch = json_repair.loads(content)
+    except json_repair.JSONRepairError:
+        print("Failed to parse response as JSON. Raw response:")
+        print(content)
+        return None
+    if not isinstance(patch, dict):
+        return None
+    shared_cache.put(f"{route.backend}:patch", str(new_infos), patch, state=sorted(fields))
+    return json.dumps(apply_field_patch(history_infos, patch))
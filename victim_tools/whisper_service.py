@@ -0,0 +1,219 @@
+"""
+Whisper Model Service
+=====================
+One faster-whisper model per process, shared by every session, chosen for the
+hardware it runs on: large-v2 in float16 on CUDA, and on CPU a smaller model
+quantized to int8, sized by cores and memory. The model is preloaded in a
+background thread at server start, so the first voice message does not wait
+for it, and transcriptions go through a bounded pool so concurrent sessions
+cannot oversubscribe the CPU.
+
+Load time and the real-time factor (processing time / audio duration) of every
+transcription are logged and available from stats().
+
+Configuration (environment):
+    whisper_model_size, whisper_device, whisper_compute_type: Override the hardware choice
+    whisper_concurrency: Transcriptions run at once (default 1 on CPU, 2 on CUDA)
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from victim_tools.local_llm import physical_cores
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+GPU_MODEL_SIZE = "large-v2"
+
+
+@dataclass
+class WhisperConfig:
+    size: str
+    device: str
+    compute_type: str
+    concurrency: int
+    cpu_threads: int
+
+
+@dataclass
+class Transcription:
+    """A transcription, with the real-time factor (below 1 is faster than real time)."""
+    text: str
+    segments: List[Any]
+    language: Optional[str]
+    duration: float
+    seconds: float
+
+    @property
+    def rtf(self) -> float:
+        return self.seconds / self.duration if self.duration else 0.0
+
+
+def memory_gb() -> Optional[float]:
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def cpu_model_size(cores: int, memory: Optional[float]) -> str:
+    """
+    Largest model transcribing faster than real time on a CPU, in int8.
+
+    Example:
+        >>> cpu_model_size(8, 16.0), cpu_model_size(4, 8.0), cpu_model_size(2, None)
+        ('medium', 'small', 'base')
+    """
+    memory = memory if memory is not None else 4.0
+    if cores >= 8 and memory >= 8:
+        return "medium"
+    if cores >= 4 and memory >= 4:
+        return "small"
+    return "base"
+
+
+def select_config() -> WhisperConfig:
+    """Model size, device and compute type for this machine, with environment overrides."""
+    import ctranslate2
+
+    device = os.getenv('whisper_device') or ('cuda' if ctranslate2.get_cuda_device_count() > 0 else 'cpu')
+    supported = ctranslate2.get_supported_compute_types(device)
+    if device == 'cuda':
+        size = GPU_MODEL_SIZE
+        compute_type = 'float16' if 'float16' in supported else 'int8_float16'
+        concurrency = 2
+    else:
+        size = cpu_model_size(physical_cores(), memory_gb())
+        compute_type = 'int8' if 'int8' in supported else 'float32'
+        concurrency = 1
+    size = os.getenv('whisper_model_size', size)
+    compute_type = os.getenv('whisper_compute_type', compute_type)
+    concurrency = int(os.getenv('whisper_concurrency', concurrency))
+    # Concurrent transcriptions share the cores rather than each using all of them
+    cpu_threads = max(1, physical_cores() // concurrency)
+    return WhisperConfig(size, device, compute_type, concurrency, cpu_threads)
+
+
+class WhisperService:
+    """
+    Shared faster-whisper model.
+
+    Args:
+        config: Model choice, defaults to select_config()
+
+    Example:
+        whisper = WhisperService()
+        whisper.preload()
+        result = whisper.transcribe(audio_array)
+        print(result.text, result.rtf)
+    """
+
+    def __init__(self, config: Optional[WhisperConfig] = None):
+        self._config = config
+        self.model = None
+        self.load_time: Optional[float] = None
+        self._load_lock = threading.Lock()
+        self._pool: Optional[threading.BoundedSemaphore] = None
+        self._preload: Optional[threading.Thread] = None
+        self._preload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._transcriptions = 0
+        self._audio_seconds = 0.0
+        self._processing_seconds = 0.0
+
+    @property
+    def config(self) -> WhisperConfig:
+        if self._config is None:
+            self._config = select_config()
+        return self._config
+
+    def load(self):
+        """Loads the model once; later calls (and calls during a preload) return the same model."""
+        with self._load_lock:
+            if self.model is not None:
+                return self.model
+            from faster_whisper import WhisperModel
+
+            config = self.config
+            start = time.perf_counter()
+            try:
+                self.model = WhisperModel(config.size, device=config.device, compute_type=config.compute_type,
+                                          cpu_threads=config.cpu_threads, num_workers=config.concurrency)
+            except Exception as e:
+                if config.device == 'cpu':
+                    raise
+                logger.error(f"Error loading Whisper model on {config.device}: {e}")
+                self._config = WhisperConfig(cpu_model_size(physical_cores(), memory_gb()), 'cpu', 'int8', 1,
+                                             physical_cores())
+                config = self._config
+                self.model = WhisperModel(config.size, device='cpu', compute_type='int8',
+                                          cpu_threads=config.cpu_threads, num_workers=1)
+            self._pool = threading.BoundedSemaphore(config.concurrency)
+            self.load_time = time.perf_counter() - start
+            logger.info(f"Loaded Whisper {config.size} on {config.device} ({config.compute_type}, "
+                        f"{config.cpu_threads} threads) in {self.load_time:.1f}s")
+            return self.model
+
+    def preload(self) -> threading.Thread:
+        """Loads the model in a background thread; idempotent, e.g. across Streamlit reruns."""
+        with self._preload_lock:
+            if self._preload is None:
+                def run():
+                    try:
+                        self.load()
+                    except Exception as e:
+                        logger.error(f"Error preloading Whisper model: {e}")
+                self._preload = threading.Thread(target=run, name="whisper-preload", daemon=True)
+                self._preload.start()
+            return self._preload
+
+    def transcribe(self, audio: np.ndarray, **kwargs) -> Transcription:
+        """
+        Transcribes 16 kHz mono float32 audio. Waits for a free slot of the pool.
+
+        Args:
+            audio: Samples in [-1, 1]
+            **kwargs: Passed to WhisperModel.transcribe (language, initial_prompt, vad_filter...)
+        """
+        model = self.load()
+        kwargs.setdefault('beam_size', 1 if self.config.device == 'cpu' else 5)
+        with self._pool:
+            start = time.perf_counter()
+            segments, info = model.transcribe(audio, **kwargs)
+            # Segments are decoded lazily, while they are iterated
+            segments = list(segments)
+            seconds = time.perf_counter() - start
+        result = Transcription(text=' '.join(segment.text.strip() for segment in segments),
+                               segments=segments, language=getattr(info, 'language', None),
+                               duration=len(audio) / SAMPLE_RATE, seconds=seconds)
+        with self._stats_lock:
+            self._transcriptions += 1
+            self._audio_seconds += result.duration
+            self._processing_seconds += seconds
+        logger.info(f"Transcribed {result.duration:.1f}s of audio in {seconds:.2f}s (RTF {result.rtf:.2f})")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            config = self._config
+            return {
+                'model': config.size if config else None,
+                'device': config.device if config else None,
+                'compute_type': config.compute_type if config else None,
+                'loaded': self.model is not None,
+                'load_time_s': self.load_time,
+                'transcriptions': self._transcriptions,
+                'audio_s': round(self._audio_seconds, 2),
+                'rtf': round(self._processing_seconds / self._audio_seconds, 3) if self._audio_seconds else None,
+            }
+
+
+# Model shared by every session of the process
+shared_whisper = WhisperService()